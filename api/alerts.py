@@ -0,0 +1,174 @@
+"""
+Low-stock alerts, emitted on writes and delivered in batches.
+
+``Item.save()`` is the one path every stock change takes (transactions, add
+and remove stock, edits). When a save moves an item between AVAILABLE,
+LOW_STOCK and OUT_OF_STOCK, ``record_status_change`` queues a ``StockAlert``
+in the same database transaction, so an alert exists exactly when the stock
+change committed and nothing has to scan items for low stock on reads.
+
+Two rules keep the volume down:
+
+* an item has at most one PENDING alert: a further change updates it in
+  place, or drops it when the item is back where the alert started;
+* an item does not alert for the same status again within
+  ``STOCK_ALERT_COOLDOWN`` seconds of its previous alert for that status.
+
+``dispatch`` (``manage.py dispatch_stock_alerts``) POSTs pending alerts to
+each company's ``alert_webhook_url``, one request per company per batch.
+Alert ids are stable across retries, so receivers can drop duplicates. A
+failed delivery is retried after ``STOCK_ALERT_RETRY_DELAY`` seconds,
+doubling with each attempt up to ``STOCK_ALERT_RETRY_MAX_DELAY``; until then
+the alerts leave the batch to other companies. The webhook host is checked
+again before every POST (``models.validate_public_url``: it was validated on
+save, but DNS can change) and redirects are not followed.
+"""
+import datetime
+import json
+import logging
+from collections import defaultdict
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import registry
+from .models import StockAlert, validate_public_url
+
+logger = logging.getLogger(__name__)
+
+TRACKED_STATUSES = ('AVAILABLE', 'LOW_STOCK', 'OUT_OF_STOCK')
+
+
+def _cooldown():
+    return datetime.timedelta(seconds=getattr(settings, 'STOCK_ALERT_COOLDOWN', 900))
+
+
+def retry_delay(attempts):
+    """How long to wait after the ``attempts``-th failed delivery."""
+    delay = getattr(settings, 'STOCK_ALERT_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+    return datetime.timedelta(seconds=min(delay, getattr(settings, 'STOCK_ALERT_RETRY_MAX_DELAY', 3600)))
+
+
+def record_status_change(item, previous_status, using='default'):
+    """Queue, merge or suppress an alert for ``item`` having left ``previous_status``."""
+    status = item.status
+    if not getattr(settings, 'STOCK_ALERTS_ENABLED', True):
+        return
+    if status == previous_status or status not in TRACKED_STATUSES or previous_status not in TRACKED_STATUSES:
+        return
+
+    alerts = StockAlert.objects.using(using)
+    pending = alerts.filter(item=item, delivery_state='PENDING').order_by('-id').first()
+    if pending is not None:
+        if pending.previous_status == status:
+            pending.delete()
+            result = 'cancelled'
+        else:
+            pending.status = status
+            pending.stock_quantity = item.stock_quantity
+            pending.minimum_stock = item.minimum_stock
+            pending.save(update_fields=['status', 'stock_quantity', 'minimum_stock', 'updated_at'])
+            result = 'merged'
+    elif alerts.filter(item=item, status=status, created_at__gte=timezone.now() - _cooldown()).exists():
+        result = 'suppressed'
+    else:
+        alerts.create(
+            company_id=item.branch.company_id, item=item,
+            previous_status=previous_status, status=status,
+            stock_quantity=item.stock_quantity, minimum_stock=item.minimum_stock,
+        )
+        result = 'queued'
+    registry.inc('api_stock_alerts_total', (result,))
+    logger.debug('Stock alert for item %s (%s -> %s): %s', item.pk, previous_status, status, result)
+
+
+def alert_payload(alert):
+    item = alert.item
+    return {
+        'id': alert.pk,
+        'item': {'id': item.pk, 'item_id': item.item_id, 'name': item.name},
+        'branch': {'id': item.branch_id, 'name': item.branch.name},
+        'previous_status': alert.previous_status,
+        'status': alert.status,
+        'stock_quantity': alert.stock_quantity,
+        'minimum_stock': alert.minimum_stock,
+        'created_at': alert.created_at,
+    }
+
+
+def dispatch(batch_size=100, max_attempts=5, timeout=5.0, session=None, now=None, using='default'):
+    """
+    Deliver up to ``batch_size`` pending alerts that are due, oldest first.
+    Returns a dict of alert counts by outcome (sent, retry, failed, skipped).
+    Alerts of companies without a webhook are marked SKIPPED; failed
+    deliveries stay PENDING, backing off, until ``max_attempts`` is reached,
+    and a webhook whose host is not public fails them at once. Run a single
+    dispatcher.
+    """
+    session = session or requests.Session()
+    now = now or timezone.now()
+    alerts = list(
+        StockAlert.objects.using(using)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now), delivery_state='PENDING')
+        .select_related('company', 'item__branch')
+        .order_by('id')[:batch_size]
+    )
+    by_company = defaultdict(list)
+    for alert in alerts:
+        by_company[alert.company].append(alert)
+
+    outcome = defaultdict(int)
+    queryset = StockAlert.objects.using(using)
+    for company, company_alerts in by_company.items():
+        ids = [alert.pk for alert in company_alerts]
+        if not company.alert_webhook_url:
+            queryset.filter(pk__in=ids).update(delivery_state='SKIPPED')
+            outcome['skipped'] += len(ids)
+            continue
+
+        try:
+            validate_public_url(company.alert_webhook_url)
+        except ValidationError as exc:
+            logger.warning('Stock alert webhook of company %s refused: %s', company.pk, exc.messages[0])
+            queryset.filter(pk__in=ids).update(last_error=exc.messages[0], delivery_state='FAILED')
+            outcome['failed'] += len(ids)
+            continue
+
+        body = json.dumps({
+            'company': {'id': company.pk, 'name': company.name},
+            'alerts': [alert_payload(alert) for alert in company_alerts],
+        }, cls=JSONEncoder)
+        try:
+            response = session.post(
+                company.alert_webhook_url, data=body, timeout=timeout, allow_redirects=False,
+                headers={'Content-Type': 'application/json'},
+            )
+            response.raise_for_status()
+            if response.is_redirect:
+                raise requests.HTTPError(f'Unexpected redirect ({response.status_code})', response=response)
+        except requests.RequestException as exc:
+            logger.warning('Stock alert delivery to company %s failed: %s', company.pk, exc)
+            error = str(exc)[:1000]
+            retries = defaultdict(list)
+            for alert in company_alerts:
+                retries[alert.attempts + 1].append(alert.pk)
+            for attempts, pks in retries.items():
+                if attempts < max_attempts:
+                    queryset.filter(pk__in=pks).update(
+                        attempts=attempts, last_error=error, next_attempt_at=now + retry_delay(attempts),
+                    )
+                    outcome['retry'] += len(pks)
+                else:
+                    queryset.filter(pk__in=pks).update(attempts=attempts, last_error=error, delivery_state='FAILED')
+                    outcome['failed'] += len(pks)
+            continue
+
+        queryset.filter(pk__in=ids).update(
+            delivery_state='SENT', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+        )
+        outcome['sent'] += len(ids)
+    return dict(outcome)
@@ -0,0 +1,97 @@
+"""
+Time-bucketed transaction series computed in the database.
+
+``timeseries`` truncates timestamps to hour/day/week/month buckets in the
+requested time zone with ``Trunc`` (``date_trunc`` on PostgreSQL) and groups
+by bucket plus an optional dimension, returning a lazy ``values()`` queryset
+that views can stream. Day, week and month buckets whose range is made of
+whole days in ``TIME_ZONE`` are read from ``TransactionDailyRollup``.
+"""
+import datetime
+import zoneinfo
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+from .models import Branch, CompanyMembership, Transaction, TransactionDailyRollup
+
+BUCKETS = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+    'week': datetime.timedelta(weeks=1),
+    'month': datetime.timedelta(days=31),
+}
+# group_by name -> (key path, label path) relative to Transaction.
+DIMENSIONS = {
+    'branch': ('branch', 'branch__name'),
+    'item': ('item', 'item__name'),
+    'category': ('item__category', 'item__category__name'),
+    'user': ('user', 'user__username'),
+    'transaction_type': ('transaction_type', None),
+}
+MAX_BUCKETS = 5000
+
+
+def accessible_branches(user):
+    """Branches whose transactions ``user`` may analyse."""
+    if user.global_user_level == 'DEVELOPER':
+        return Branch.objects.all()
+    managed = CompanyMembership.objects.filter(user=user, role__in=['SUPERVISOR', 'OWNER']).values('company_id')
+    assigned = CompanyMembership.objects.filter(user=user, branch__isnull=False).values('branch_id')
+    return Branch.objects.filter(company_id__in=managed) | Branch.objects.filter(id__in=assigned)
+
+
+def _uses_rollup(bucket, tz, start, end):
+    if bucket == 'hour' or tz.key != settings.TIME_ZONE:
+        return False
+    midnight = datetime.time.min
+    return timezone.localtime(start).time() == midnight and timezone.localtime(end).time() == midnight
+
+
+def timeseries(branches, start, end, bucket='day', tz=None, group_by=None):
+    """
+    Rows of ``{'bucket_start', 'key', 'label', 'transaction_count',
+    'total_quantity'}`` for
+    transactions in ``branches`` with ``start <= timestamp < end``, ordered by
+    bucket then key. ``key`` and ``label`` are only present with
+    ``group_by``; empty buckets are omitted. ``bucket_start`` is a date when
+    the rollup answered, an aware datetime otherwise.
+    """
+    tz = tz or timezone.get_current_timezone()
+    key_path, label_path = DIMENSIONS[group_by] if group_by else (None, None)
+
+    if _uses_rollup(bucket, tz, start, end):
+        rows = TransactionDailyRollup.objects.filter(
+            branch__in=branches,
+            day__gte=timezone.localdate(start),
+            day__lt=timezone.localdate(end),
+        )
+        bucket_expr = Trunc('day', bucket, output_field=rows.model._meta.get_field('day'))
+        count, quantity = Coalesce(Sum('count'), 0), Coalesce(Sum('quantity'), 0)
+    else:
+        rows = Transaction.objects.filter(branch__in=branches, timestamp__gte=start, timestamp__lt=end)
+        bucket_expr = Trunc('timestamp', bucket, tzinfo=tz)
+        count, quantity = Count('id'), Coalesce(Sum('quantity'), 0)
+
+    dimensions = {'bucket_start': bucket_expr}
+    if key_path:
+        dimensions['key'] = F(key_path)
+        if label_path:
+            dimensions['label'] = F(label_path)
+    return rows.order_by().annotate(**dimensions).values(*dimensions).annotate(
+        transaction_count=count, total_quantity=quantity,
+    ).order_by(*dimensions)
+
+
+def parse_time_zone(name):
+    """``ZoneInfo`` for an IANA name; ``ValueError`` if it is unknown."""
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f'Unknown time zone "{name}".')
+
+
+def bucket_count(start, end, bucket):
+    return (end - start) / BUCKETS[bucket]
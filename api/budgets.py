@@ -0,0 +1,80 @@
+"""
+Per-endpoint query budgets.
+
+``QUERY_BUDGETS`` maps URL names from ``api/urls.py`` to the maximum number of
+queries a GET may run, whatever the number of rows it returns. The
+``check_query_budgets`` management command seeds a throwaway database at two
+sizes, calls every GET endpoint and fails if one goes over budget or if its
+query count grows with the data.
+"""
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudget:
+    """Maximum query count for one endpoint."""
+
+    def __init__(self, max_queries, allow_growth=False, reason=''):
+        self.max_queries = max_queries
+        # Known N+1 endpoints awaiting a fix are reported but do not fail the
+        # check; always give a reason.
+        self.allow_growth = allow_growth
+        self.reason = reason
+
+    def __repr__(self):
+        return f'QueryBudget({self.max_queries}, allow_growth={self.allow_growth})'
+
+
+DEFAULT_BUDGET = QueryBudget(8)
+
+QUERY_BUDGETS = {
+    'user-profile': QueryBudget(4),
+    'user-list': QueryBudget(3),
+    'user-detail': QueryBudget(4),
+    'company-list': QueryBudget(2),
+    'company-detail': QueryBudget(3),
+    'branch-list': QueryBudget(3),
+    'branch-detail': QueryBudget(4),
+    'user-branches-list': QueryBudget(4),
+    'company-membership': QueryBudget(3),
+    'company-membership-detail': QueryBudget(8),
+    'item-list': QueryBudget(3),
+    'item-detail': QueryBudget(6),
+    'item-forecast': QueryBudget(3),
+    'item-export': QueryBudget(3),
+    'transaction-list': QueryBudget(4),
+    'transaction-export': QueryBudget(3),
+    'holding-list': QueryBudget(2),
+    'my-holdings': QueryBudget(1),
+    'overdue-holdings': QueryBudget(2),
+    'transaction-receipt': QueryBudget(2),
+    'category-list-create': QueryBudget(3),
+    'category-detail': QueryBudget(2),
+    'all-branches-list': QueryBudget(2),
+    'all-items-list': QueryBudget(2),
+    'branch-statistics': QueryBudget(6),
+    'dashboard': QueryBudget(6),
+    'analytics-timeseries': QueryBudget(2),
+}
+
+
+def get_budget(url_name):
+    return QUERY_BUDGETS.get(url_name, DEFAULT_BUDGET)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, using='default', label='block'):
+    """Fail with ``QueryBudgetExceeded`` if the block runs more than ``max_queries`` queries."""
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > max_queries:
+        statements = '\n'.join(f"  {query['sql']}" for query in captured.captured_queries)
+        raise QueryBudgetExceeded(
+            f'{label} ran {len(captured)} queries (budget {max_queries}):\n{statements}'
+        )
@@ -0,0 +1,123 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+``CompressionMiddleware`` compresses JSON responses of at least
+``COMPRESSION_MIN_SIZE`` bytes with brotli when the client accepts it and the
+``brotli`` package is installed, otherwise with gzip. Smaller bodies are sent
+as-is; compressing them costs more CPU than it saves on the wire.
+"""
+import re
+from gzip import GzipFile
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer, compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+_TOKEN_RE = re.compile(r'\s*([A-Za-z0-9*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """Codings from an ``Accept-Encoding`` header with a non-zero q-value."""
+    accepted = set()
+    for part in header.split(','):
+        match = _TOKEN_RE.match(part)
+        if not match:
+            continue
+        coding, quality = match.group(1).lower(), match.group(2)
+        try:
+            if quality is not None and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding)
+    return accepted
+
+
+def choose_encoding(header, streaming=False):
+    accepted = accepted_encodings(header)
+    # Only gzip has an incremental compressor in Django.
+    if not streaming and brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4))
+    return compress_string(content)
+
+
+async def compress_async_sequence(sequence):
+    """``compress_sequence`` over an async iterator: one gzip stream for every chunk."""
+    buf = StreamingBuffer()
+    with GzipFile(mode='wb', compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        yield buf.read()
+        async for item in sequence:
+            zfile.write(item)
+            data = buf.read()
+            if data:
+                yield data
+    yield buf.read()
+
+
+class CompressionMiddleware:
+    """Compresses large JSON responses with brotli or gzip."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.content_types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', ('application/json',)))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code not in (200, 201):
+            return response
+        if not response.get('Content-Type', '').startswith(self.content_types):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), response.streaming)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The representation changed, so a strong ETag no longer matches it.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,65 @@
+"""
+Conditional GET (ETag / Last-Modified) for list endpoints that clients poll.
+
+``ConditionalListMixin`` computes a validator for the filtered queryset with a
+single aggregate query: the row count plus the newest ``updated_at`` of the
+rows and of the related rows their serializer reads. If the client's
+``If-None-Match`` / ``If-Modified-Since`` still matches, the view answers
+``304 Not Modified`` without fetching or serializing any rows.
+"""
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalListMixin:
+    """
+    List mixin answering unchanged polls with 304. ``validator_fields`` are the
+    timestamp fields (``__`` paths allowed) whose newest value, together with
+    the row count, changes whenever the serialized page would. Deleting a row
+    only changes the count, so ``If-None-Match`` is the reliable check;
+    ``If-Modified-Since`` alone cannot see deletions.
+    """
+    validator_fields = ('updated_at',)
+
+    def get_list_validators(self, queryset):
+        aggregates = {f'max_{i}': Max(field) for i, field in enumerate(self.validator_fields)}
+        state = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+        timestamps = [value for key, value in state.items() if key != 'count' and value is not None]
+        last_modified = max(timestamps) if timestamps else None
+
+        # The same rows render differently per query string (filters, page,
+        # ?fields=) and renderer, so both are part of the tag.
+        request = self.request
+        key = '|'.join([
+            request.get_full_path(),
+            getattr(request.accepted_renderer, 'format', ''),
+            str(state['count']),
+            *(value.isoformat() if value is not None else '' for key, value in sorted(state.items()) if key != 'count'),
+        ])
+        etag = quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+        return etag, last_modified
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_list_validators(queryset)
+        last_modified_ts = timegm(last_modified.utctimetuple()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if response is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+            else:
+                response = Response(self.get_serializer(queryset, many=True).data)
+
+        response.headers['ETag'] = etag
+        if last_modified_ts is not None:
+            response.headers['Last-Modified'] = http_date(last_modified_ts)
+        # Let browsers and proxies keep the body, but always revalidate.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,128 @@
+"""
+WebSocket consumers and their JWT authentication.
+
+Clients connect to ``/ws/live/?token=<access token>`` (browsers cannot set
+an ``Authorization`` header on a WebSocket) and optionally
+``&branch=<id>&company=<id>``. Further subscriptions are JSON messages::
+
+    {"action": "subscribe", "branch": "<id>"}
+    {"action": "unsubscribe", "company": "<id>"}
+
+Company-wide subscriptions need a supervisor/owner membership (or
+developer level); branch subscriptions follow ``analytics.accessible_branches``.
+"""
+import json
+from collections import deque
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from . import analytics, realtime
+from .models import CompanyMembership
+
+# Close code in the application range (4000-4999) for a missing or bad token.
+CLOSE_UNAUTHORIZED = 4401
+
+
+def token_user(raw_token):
+    """The user of a simplejwt access token, ``AnonymousUser`` if it is not valid."""
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return AnonymousUser()
+
+
+user_for_token = database_sync_to_async(token_user)
+
+
+class JWTAuthMiddleware:
+    """Sets ``scope['user']`` from a simplejwt access token in the ``token`` query parameter."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get('query_string', b'').decode())
+        token = params.get('token', [None])[0]
+        scope = dict(scope, user=await user_for_token(token) if token else AnonymousUser())
+        return await self.inner(scope, receive, send)
+
+
+class LiveUpdatesConsumer(AsyncJsonWebsocketConsumer):
+    """Relays ``api.realtime`` events for the branches and companies a client subscribes to."""
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.groups_joined = set()
+        self.recent_events = deque(maxlen=256)
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+        await self.accept()
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        for kind in ('branch', 'company'):
+            for target in params.get(kind, []):
+                await self.subscribe(kind, target)
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'groups_joined', ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        kind = next((kind for kind in ('branch', 'company') if isinstance(content, dict) and content.get(kind)), None)
+        if action not in ('subscribe', 'unsubscribe') or kind is None:
+            await self.send_json({'type': 'error', 'detail': 'Expected {"action": "subscribe"|"unsubscribe", "branch"|"company": id}.'})
+            return
+        if action == 'subscribe':
+            await self.subscribe(kind, content[kind])
+        else:
+            group = self._group(kind, content[kind])
+            self.groups_joined.discard(group)
+            await self.channel_layer.group_discard(group, self.channel_name)
+            await self.send_json({'type': 'unsubscribed', kind: str(content[kind])})
+
+    async def subscribe(self, kind, target):
+        if not await self._allowed(kind, str(target)):
+            await self.send_json({'type': 'error', 'detail': f'No access to {kind} {target}.'})
+            return
+        group = self._group(kind, target)
+        if group not in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.groups_joined.add(group)
+        await self.send_json({'type': 'subscribed', kind: str(target)})
+
+    async def live_event(self, message):
+        event = message['event']
+        if event['id'] in self.recent_events:
+            return
+        self.recent_events.append(event['id'])
+        await self.send_json(event)
+
+    @staticmethod
+    def _group(kind, target):
+        return realtime.branch_group(target) if kind == 'branch' else realtime.company_group(target)
+
+    @database_sync_to_async
+    def _allowed(self, kind, target):
+        try:
+            if kind == 'branch':
+                return analytics.accessible_branches(self.user).filter(pk=target).exists()
+            if self.user.global_user_level == 'DEVELOPER':
+                return True
+            return CompanyMembership.objects.filter(
+                user=self.user, company_id=target, role__in=['SUPERVISOR', 'OWNER'],
+            ).exists()
+        except ValidationError:
+            return False
+
+    @classmethod
+    async def encode_json(cls, content):
+        return json.dumps(content, cls=JSONEncoder)
@@ -0,0 +1,78 @@
+"""
+Company dashboard in one response.
+
+``company_dashboard`` answers what the web dashboard used to fetch from five
+endpoints with four queries over one access scope (a branch subquery, never
+evaluated on its own): branch summaries (``Branch.objects.with_stats()``),
+the lowest-stock items, the latest transactions and the daily per-type
+totals of the last 30 days (``analytics.timeseries``, which reads the daily
+rollup when the company's days match ``TIME_ZONE``).
+"""
+import datetime
+
+from django.db.models import F
+from django.utils import timezone
+
+from . import analytics
+from .models import Branch, Item, Transaction
+
+PERIODS = {'today': 1, 'last_7_days': 7, 'last_30_days': 30}
+TOTAL_FIELDS = {
+    'WITHDRAW': 'withdrawn', 'RETURN': 'returned', 'ADD_STOCK': 'stock_added', 'REMOVE_STOCK': 'stock_removed',
+}
+
+
+def period_totals(branches, tz, now=None):
+    """Transaction count and quantity per type for each of ``PERIODS``, in the ``tz`` calendar."""
+    now = now or timezone.now()
+    today = timezone.localdate(now, tz)
+    end = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    start = end - datetime.timedelta(days=max(PERIODS.values()))
+
+    totals = {
+        period: {'transactions': 0, **{field: 0 for field in TOTAL_FIELDS.values()}}
+        for period in PERIODS
+    }
+    for row in analytics.timeseries(branches, start, end, bucket='day', tz=tz, group_by='transaction_type'):
+        day = row['bucket_start']
+        day = day.date() if isinstance(day, datetime.datetime) else day
+        age = (today - day).days
+        field = TOTAL_FIELDS.get(row['key'])
+        for period, days in PERIODS.items():
+            if age < days:
+                totals[period]['transactions'] += row['transaction_count']
+                if field:
+                    totals[period][field] += row['total_quantity']
+    return totals
+
+
+def company_dashboard(company, branches, transactions=10, low_stock=20, now=None):
+    """The dashboard payload for ``company`` (a dict with ``time_zone``) limited to ``branches``."""
+    tz = analytics.parse_time_zone(company['time_zone'])
+    branch_summaries = list(
+        Branch.objects.with_stats().filter(pk__in=branches).order_by('name')
+        .values('id', 'name', 'is_active', *Branch.STAT_FIELDS)
+    )
+    low_stock_items = list(
+        Item.objects.filter(branch__in=branches, status__in=['LOW_STOCK', 'OUT_OF_STOCK'])
+        .order_by('stock_quantity', 'name')
+        .values(
+            'id', 'item_id', 'name', 'status', 'stock_quantity', 'minimum_stock',
+            'branch_id', branch_name=F('branch__name'),
+        )[:low_stock]
+    )
+    recent = list(
+        Transaction.objects.filter(branch__in=branches).order_by('-timestamp')
+        .values(
+            'id', 'reference_number', 'transaction_type', 'quantity', 'timestamp', 'item_id', 'branch_id',
+            item_name=F('item__name'), branch_name=F('branch__name'), username=F('user__username'),
+        )[:transactions]
+    )
+    return {
+        'company': company,
+        'generated_at': now or timezone.now(),
+        'branches': branch_summaries,
+        'low_stock': low_stock_items,
+        'recent_transactions': recent,
+        'totals': period_totals(branches, tz, now),
+    }
@@ -0,0 +1,286 @@
+"""
+Streaming CSV and XLSX exports.
+
+``StreamingExportMixin`` turns a list view into an export of the same
+filtered queryset: rows are read with ``values_list`` over
+``iterator(chunk_size=...)`` (a server-side cursor on PostgreSQL) and
+written out as they arrive, so memory stays flat however many rows match
+and the first bytes leave after the first chunk. Under ASGI, Django would
+read a sync iterator to the end before sending anything, so the blocks are
+handed over as an async iterator that produces each one in the request's
+sync thread.
+
+XLSX is written directly as SpreadsheetML into a zip stream: a workbook is
+a zip of XML parts, and ``zipfile`` can write to a non-seekable sink one
+deflated entry at a time. Exports longer than an Excel sheet continue on
+further sheets.
+"""
+import csv
+import datetime
+import decimal
+import itertools
+import re
+import uuid
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from .renderers import FastJSONRenderer
+
+XLSX_MAX_ROWS = 1048576
+FLUSH_EVERY = 500
+
+TRANSACTION_COLUMNS = [
+    ('Reference', 'reference_number'),
+    ('Timestamp', 'timestamp'),
+    ('Type', 'transaction_type'),
+    ('Item ID', 'item__item_id'),
+    ('Item', 'item__name'),
+    ('Branch', 'branch__name'),
+    ('Company', 'branch__company__name'),
+    ('User', 'user__username'),
+    ('Quantity', 'quantity'),
+    ('Notes', 'notes'),
+]
+ITEM_COLUMNS = [
+    ('Item ID', 'item_id'),
+    ('Name', 'name'),
+    ('Branch', 'branch__name'),
+    ('Category', 'category__name'),
+    ('Status', 'status'),
+    ('Stock', 'stock_quantity'),
+    ('Original stock', 'original_stock_quantity'),
+    ('Minimum stock', 'minimum_stock'),
+    ('Barcode', 'barcode_number'),
+    ('Description', 'description'),
+    ('Created', 'created_at'),
+    ('Updated', 'updated_at'),
+]
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, (datetime.date, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def _csv_value(value):
+    value = _text(value)
+    # Spreadsheet apps run text starting with these as a formula.
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose ``write`` hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(header, rows):
+    """CSV text for ``header`` and ``rows``, yielded in blocks of ``FLUSH_EVERY`` rows."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    block = []
+    for row in rows:
+        block.append(writer.writerow([_csv_value(value) for value in row]))
+        if len(block) >= FLUSH_EVERY:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+# Characters XML 1.0 cannot contain at all, even escaped.
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+).encode()
+_SHEET_END = b'</sheetData></worksheet>'
+
+
+def _cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return f'<c><v>{value}</v></c>'
+    text = _INVALID_XML.sub('', str(_text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _row(values):
+    return ('<row>' + ''.join(_cell(value) for value in values) + '</row>').encode()
+
+
+def _workbook_parts(sheet_names):
+    sheets = ''.join(
+        f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(sheet_names, 1)
+    )
+    sheet_rels = ''.join(
+        f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"'
+        f' Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(sheet_names) + 1)
+    )
+    sheet_types = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml"'
+        ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(sheet_names) + 1)
+    )
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml"'
+            ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{sheet_types}</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"'
+            ' Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+            ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets}</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}</Relationships>'
+        ),
+    }
+
+
+class _Sink:
+    """Write-only, non-seekable buffer that ``zipfile`` streams into."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def xlsx_stream(header, rows, sheet_name='Sheet'):
+    """An XLSX workbook for ``header`` and ``rows``, yielded as it is compressed."""
+    sink = _Sink()
+    rows = iter(rows)
+    sheet_names = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        while True:
+            sheet_names.append(sheet_name if not sheet_names else f'{sheet_name} {len(sheet_names) + 1}'[:31])
+            written = 0
+            with archive.open(f'xl/worksheets/sheet{len(sheet_names)}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write(_SHEET_START)
+                sheet.write(_row(header))
+                for row in itertools.islice(rows, XLSX_MAX_ROWS - 1):
+                    sheet.write(_row(row))
+                    written += 1
+                    if written % FLUSH_EVERY == 0:
+                        yield sink.drain()
+                sheet.write(_SHEET_END)
+            yield sink.drain()
+            if written < XLSX_MAX_ROWS - 1:
+                break
+        for name, content in _workbook_parts(sheet_names).items():
+            archive.writestr(name, content)
+    yield sink.drain()
+
+
+async def async_blocks(blocks):
+    """``blocks`` as an async iterator; each block (and its queries) is produced in the sync thread."""
+    blocks = iter(blocks)
+    next_block = sync_to_async(next)
+    done = object()
+    while (block := await next_block(blocks, done)) is not done:
+        yield block
+
+
+def _tabulate(data):
+    rows = data if isinstance(data, list) else [data]
+    header = list(rows[0]) if rows and isinstance(rows[0], dict) else []
+    return header, ([row.get(name) for name in header] for row in rows)
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV for a list of flat objects; export views stream rows themselves."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(csv_stream(*_tabulate(data))).encode()
+
+
+class XLSXRenderer(BaseRenderer):
+    """XLSX for a list of flat objects; export views stream rows themselves."""
+    media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    format = 'xlsx'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(xlsx_stream(*_tabulate(data)))
+
+
+class StreamingExportMixin:
+    """
+    Serves a list view's filtered queryset as a CSV or XLSX download
+    (``?format=csv|xlsx`` or the ``Accept`` header; CSV by default).
+    ``export_columns`` are ``(title, values path)`` pairs. Errors are still
+    answered in JSON.
+    """
+    export_columns = ()
+    export_name = 'export'
+    chunk_size = 2000
+    renderer_classes = [CSVRenderer, XLSXRenderer]
+    http_method_names = ['get', 'head', 'options']
+
+    def handle_exception(self, exc):
+        self.request.accepted_renderer = FastJSONRenderer()
+        self.request.accepted_media_type = FastJSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        header = [title for title, _ in self.export_columns]
+        rows = queryset.values_list(*(path for _, path in self.export_columns)).iterator(chunk_size=self.chunk_size)
+
+        renderer = request.accepted_renderer
+        if renderer.format == 'xlsx':
+            content = xlsx_stream(header, rows, sheet_name=self.export_name.title())
+        else:
+            content = (block.encode() for block in csv_stream(header, rows))
+        if isinstance(request._request, ASGIRequest):
+            content = async_blocks(content)
+        content_type = f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f'{self.export_name}-{timezone.localdate():%Y%m%d}.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
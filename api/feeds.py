@@ -0,0 +1,299 @@
+"""
+Server-Sent Events feed of new transactions, for clients that cannot use
+the WebSocket endpoint.
+
+``GET /api/transactions/stream/?branch=<id>`` (the branch is optional; the
+caller's whole scope by default) answers ``text/event-stream``. Every
+transaction is one ``transaction`` event whose ``id`` is its
+``(timestamp, id)`` keyset position; ``EventSource`` sends the last one back
+as ``Last-Event-ID`` when it reconnects and the feed resumes right after it.
+Comment frames are sent as heartbeats while nothing happens, so proxies keep
+the connection open.
+
+Under ASGI ``backend.asgi`` serves the path with ``TransactionStreamConsumer``,
+which only awaits between queries: an idle connection costs a coroutine, not
+a worker thread or a database connection. Queries run on the event loop's
+shared executor and each closes its connection when it is done. A stream
+queries the database when ``api.realtime`` announces a change in one of the
+caller's companies, and otherwise every ``SSE_FALLBACK_INTERVAL`` seconds in
+case an announcement was lost. An in-memory channel layer only
+hears about writes made by its own process, so with it (or without channels)
+the feed polls every ``SSE_POLL_INTERVAL`` seconds instead. Under WSGI the
+response is sent once nothing is left to catch up on and the client
+reconnects after ``retry``, which degrades the feed to long polling.
+
+``timestamp`` is set before the row commits, so a transaction can become
+visible after a later one was sent. Rows up to ``SSE_COMMIT_SLACK`` seconds
+behind the newest one sent are still picked up on a live connection; a
+resumed connection starts strictly after ``Last-Event-ID``. Clients should
+ignore an event whose ``data.id`` they have already seen.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.db.models import F, Q
+from django.http import HttpResponseBadRequest, HttpResponseNotFound, JsonResponse, QueryDict, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.datastructures import CaseInsensitiveMapping
+from django.utils.dateparse import parse_datetime
+from django.views import View
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import analytics, realtime
+from .consumers import token_user
+from .models import Transaction
+
+try:
+    from channels.layers import InMemoryChannelLayer, get_channel_layer
+except ImportError:  # pragma: no cover - optional dependency
+    InMemoryChannelLayer = get_channel_layer = None
+
+logger = logging.getLogger(__name__)
+
+EVENT_FIELDS = ['id', 'reference_number', 'transaction_type', 'quantity', 'timestamp', 'item_id', 'branch_id', 'user_id']
+EVENT_NAMES = {'item_name': F('item__name'), 'branch_name': F('branch__name'), 'username': F('user__username')}
+
+
+def encode_cursor(cursor):
+    timestamp, pk = cursor
+    return f'{timestamp.isoformat()}/{pk}'
+
+
+def decode_cursor(value):
+    """
+    ``(timestamp, id)`` from a ``Last-Event-ID``; the id is empty for a
+    position between events. ``ValueError`` if it is not one of ours.
+    """
+    timestamp, _, pk = (value or '').partition('/')
+    timestamp = parse_datetime(timestamp)
+    if timestamp is None:
+        raise ValueError(f'Invalid event id "{value}".')
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, datetime.timezone.utc)
+    try:
+        return timestamp, str(uuid.UUID(pk)) if pk else ''
+    except ValueError:
+        raise ValueError(f'Invalid event id "{value}".') from None
+
+
+def after(cursor):
+    """Rows strictly after a ``(timestamp, id)`` keyset position."""
+    timestamp, pk = cursor
+    if not pk:
+        return Q(timestamp__gt=timestamp)
+    return Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+
+
+def fetch(branch_ids, since, window_start=None, exclude=(), limit=100):
+    """
+    Up to ``limit`` event rows after ``since`` in ``(timestamp, id)`` order;
+    with ``window_start``, only rows from then on that are not in ``exclude``.
+    """
+    rows = Transaction.objects.filter(after(since), branch_id__in=branch_ids)
+    if window_start is not None:
+        rows = rows.filter(timestamp__gte=window_start).exclude(id__in=exclude)
+    return list(rows.order_by('timestamp', 'id').values(*EVENT_FIELDS, **EVENT_NAMES)[:limit])
+
+
+def released(func):
+    """
+    ``func`` as a coroutine run on the shared executor that closes its
+    database connection afterwards, so an open stream holds neither a thread
+    nor a connection between queries.
+    """
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if not connection.in_atomic_block:
+                connection.close()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+STREAM_HEADERS = [
+    ('Cache-Control', 'no-cache'),
+    ('X-Accel-Buffering', 'no'),  # nginx: do not buffer the stream
+]
+
+
+def frame(row):
+    data = json.dumps(row, cls=JSONEncoder, separators=(',', ':'))
+    cursor = encode_cursor((row['timestamp'], row['id']))
+    return f'id: {cursor}\nevent: transaction\ndata: {data}\n\n'.encode()
+
+
+def _scope(user, branch):
+    branches = analytics.accessible_branches(user)
+    if branch is not None:
+        branches = branches.filter(pk=branch)
+    scope = list(branches.values_list('id', 'company_id'))
+    return [branch_id for branch_id, _ in scope], {company_id for _, company_id in scope}
+
+
+async def transaction_events(branch_ids, company_ids, cursor, once=False):
+    """Event-stream bytes for new transactions in ``branch_ids``, from ``cursor`` on."""
+    poll = getattr(settings, 'SSE_POLL_INTERVAL', 2.0)
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT', 15.0)
+    slack = getattr(settings, 'SSE_COMMIT_SLACK', 5.0)
+    batch = getattr(settings, 'SSE_BATCH_SIZE', 100)
+    fetch_rows = released(fetch)
+
+    layer = get_channel_layer() if get_channel_layer and not once else None
+    shared = layer is not None and not isinstance(layer, InMemoryChannelLayer)
+    fallback = getattr(settings, 'SSE_FALLBACK_INTERVAL', 30.0) if shared else poll
+    channel = await layer.new_channel() if layer else None
+    groups = [realtime.company_group(company_id) for company_id in company_ids]
+    for group in groups if layer else ():
+        await layer.group_add(group, channel)
+
+    # An id without data moves the client's Last-Event-ID without an event,
+    # so reconnecting before the first event does not skip anything.
+    yield f'retry: {int(poll * 1000)}\nid: {encode_cursor(cursor)}\n\n'.encode()
+    floor = cursor
+    sent = {}  # id -> timestamp of rows sent inside the slack window
+    last_write = time.monotonic()
+    try:
+        while True:
+            last_query = time.monotonic()
+            if sent:
+                window_start = cursor[0] - datetime.timedelta(seconds=slack)
+                sent = {pk: ts for pk, ts in sent.items() if ts >= window_start}
+                rows = await fetch_rows(branch_ids, floor, window_start, list(sent), batch)
+            else:
+                rows = await fetch_rows(branch_ids, cursor, limit=batch)
+            for row in rows:
+                sent[row['id']] = row['timestamp']
+                cursor = max(cursor, (row['timestamp'], str(row['id'])))
+                yield frame(row)
+            if rows:
+                last_write = time.monotonic()
+            if len(rows) == batch:
+                continue
+            if once:
+                yield f'id: {encode_cursor(cursor)}\n\n'.encode()
+                return
+
+            # Wait for an announcement or the fallback poll, whichever comes
+            # first, sending heartbeats meanwhile.
+            while True:
+                now = time.monotonic()
+                if now - last_write >= heartbeat:
+                    yield b': heartbeat\n\n'
+                    last_write = now
+                if now - last_query >= fallback:
+                    break
+                timeout = min(fallback - (now - last_query), heartbeat - (now - last_write))
+                try:
+                    if layer:
+                        await asyncio.wait_for(layer.receive(channel), timeout)
+                        break
+                    await asyncio.sleep(timeout)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        for group in groups if layer else ():
+            await layer.group_discard(group, channel)
+
+
+class StreamRefused(Exception):
+    """A stream request answered with ``status`` and ``message`` instead."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def open_stream(headers, params, once=False):
+    """
+    ``transaction_events`` for a request's ``headers`` and query ``params``.
+    Takes a simplejwt access token as ``Authorization: Bearer`` or, since
+    ``EventSource`` cannot set headers, as ``?token=``.
+    """
+    header = headers.get('Authorization', '')
+    token = header[7:] if header.startswith('Bearer ') else params.get('token')
+    user = await released(token_user)(token) if token else None
+    if user is None or not user.is_authenticated:
+        raise StreamRefused(401, 'Authentication credentials were not provided.')
+
+    last_event_id = headers.get('Last-Event-ID') or params.get('last_event_id')
+    try:
+        cursor = decode_cursor(last_event_id) if last_event_id else (timezone.now(), '')
+        branch_ids, company_ids = await released(_scope)(user, params.get('branch'))
+    except (ValueError, ValidationError) as exc:
+        raise StreamRefused(400, str(exc.messages[0] if hasattr(exc, 'messages') else exc)) from None
+    if not branch_ids:
+        raise StreamRefused(404, 'No accessible branch.')
+    return transaction_events(branch_ids, company_ids, cursor, once=once)
+
+
+class TransactionStreamView(View):
+    """
+    ``text/event-stream`` of new transactions in the caller's scope. The ASGI
+    application routes the path to ``TransactionStreamConsumer``; this view
+    serves it under WSGI, and under ASGI when Django is mounted alone.
+    """
+    http_method_names = ['get']
+
+    async def get(self, request):
+        try:
+            events = await open_stream(request.headers, request.GET, once=not isinstance(request, ASGIRequest))
+        except StreamRefused as exc:
+            if exc.status == 401:
+                return JsonResponse({'detail': str(exc)}, status=401)
+            return (HttpResponseNotFound if exc.status == 404 else HttpResponseBadRequest)(str(exc))
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        for header, value in STREAM_HEADERS:
+            response[header] = value
+        return response
+
+
+class TransactionStreamConsumer(AsyncHttpConsumer):
+    """
+    The stream as a Channels HTTP consumer. Django's ASGI handler keeps a
+    thread per request for its synchronous signal receivers until the
+    response ends; a consumer holds none, so an idle stream is a coroutine.
+    """
+
+    async def http_request(self, message):
+        self.body.append(message.get('body', b''))
+        if message.get('more_body'):
+            return
+        headers = CaseInsensitiveMapping({
+            name.decode('latin1'): value.decode('latin1') for name, value in self.scope['headers']
+        })
+        params = QueryDict(self.scope.get('query_string', b''))
+        try:
+            events = await open_stream(headers, params)
+        except StreamRefused as exc:
+            body = json.dumps({'detail': str(exc)}) if exc.status == 401 else str(exc)
+            content_type = 'application/json' if exc.status == 401 else 'text/plain; charset=utf-8'
+            await self.send_response(exc.status, body.encode(), headers=[(b'Content-Type', content_type.encode())])
+            raise StopConsumer()
+        await self.send_headers(headers=[(b'Content-Type', b'text/event-stream')] + [
+            (header.encode(), value.encode()) for header, value in STREAM_HEADERS
+        ])
+        self.streaming = asyncio.ensure_future(self.stream(events))
+
+    async def stream(self, events):
+        try:
+            async for chunk in events:
+                await self.send_body(chunk, more_body=True)
+        except Exception:
+            logger.exception('Transaction stream failed')
+        await self.send_body(b'')
+
+    async def disconnect(self):
+        streaming = getattr(self, 'streaming', None)
+        if streaming is not None:
+            streaming.cancel()
@@ -0,0 +1,76 @@
+"""
+Sparse fieldsets for list endpoints.
+
+``?fields=a,b`` keeps only the named serializer fields and ``?omit=a,b`` drops
+them. Serializers declare which ``select_related`` paths each field reads in
+``Meta.field_relations`` so the view only joins what the payload needs.
+"""
+from rest_framework import serializers
+from rest_framework.serializers import ListSerializer
+
+
+def parse_field_list(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+class SparseFieldsetSerializerMixin:
+    """Trims ``fields`` to the fieldset the view put in the serializer context."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        # Only the top-level (or list-child) serializer is trimmed, never nested ones.
+        is_root = self.parent is None or (isinstance(self.parent, ListSerializer) and self.parent.parent is None)
+        if fieldset is None or not is_root:
+            return fields
+        return {name: field for name, field in fields.items() if name in fieldset}
+
+
+class SparseFieldsetMixin:
+    """
+    View mixin for list endpoints whose serializer uses
+    ``SparseFieldsetSerializerMixin``. Call ``select_related_for_fieldset``
+    from ``get_queryset`` instead of a hard-coded ``select_related``.
+    """
+    fields_param = 'fields'
+    omit_param = 'omit'
+
+    def get_fieldset(self):
+        """Return the set of field names to render, or None for all of them."""
+        if getattr(self, '_fieldset_resolved', False):
+            return self._fieldset
+        self._fieldset_resolved = True
+        self._fieldset = None
+        request = self.request
+        if request is None or request.method != 'GET':
+            return None
+        requested = parse_field_list(request.query_params.get(self.fields_param))
+        omitted = parse_field_list(request.query_params.get(self.omit_param))
+        if not requested and not omitted:
+            return None
+
+        readable = {
+            name for name, field in self.get_serializer_class()().fields.items() if not field.write_only
+        }
+        unknown = (requested | omitted) - readable
+        if unknown:
+            raise serializers.ValidationError({
+                self.fields_param if unknown & requested else self.omit_param:
+                    f"Unknown field(s): {', '.join(sorted(unknown))}"
+            })
+        self._fieldset = (requested or readable) - omitted
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def select_related_for_fieldset(self, queryset):
+        relations = getattr(self.get_serializer_class().Meta, 'field_relations', {})
+        fieldset = self.get_fieldset()
+        paths = set()
+        for name, related in relations.items():
+            if fieldset is None or name in fieldset:
+                paths.update(related)
+        return queryset.select_related(*sorted(paths)) if paths else queryset
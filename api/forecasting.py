@@ -0,0 +1,128 @@
+"""
+Per-item consumption forecasts, computed for a whole company at once.
+
+``forecast_company`` loads net daily withdrawals (WITHDRAW minus RETURN,
+summed per item and day by the database) with ``values_list`` into an
+items x days NumPy matrix. It then computes, for every item in one
+vectorized pass:
+
+* the exponentially weighted mean and standard deviation of daily
+  consumption (``half_life`` days), ignoring days before the item existed;
+* days until the current stock runs out at that rate;
+* a reorder point covering ``lead_time`` days of demand plus safety stock
+  of ``service_z`` standard deviations, never below ``minimum_stock``.
+
+Results are upserted into ``ItemForecast``, which ``/api/items/forecast/``
+reads. Run ``manage.py forecast_items`` daily.
+"""
+import datetime
+import math
+
+import numpy as np
+from django.db.models import Case, F, IntegerField, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Company, Item, ItemForecast, Transaction
+
+FORECAST_FIELDS = [
+    'daily_consumption', 'daily_consumption_std', 'stock_quantity', 'days_until_stockout',
+    'reorder_point', 'history_days', 'computed_at',
+]
+
+
+def daily_net_withdrawals(company_id, since, until, using='default'):
+    """``(item_id, day, net quantity)`` rows for the company's items, one per item and day."""
+    signed_quantity = Case(
+        When(transaction_type='RETURN', then=-F('quantity')),
+        default=F('quantity'),
+        output_field=IntegerField(),
+    )
+    return (
+        Transaction.objects.using(using)
+        .filter(
+            item__branch__company_id=company_id,
+            transaction_type__in=('WITHDRAW', 'RETURN'),
+            timestamp__gte=since, timestamp__lt=until,
+        )
+        .annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('item_id', 'day')
+        .annotate(net=Sum(signed_quantity))
+        .order_by()
+        .values_list('item_id', 'day', 'net')
+    )
+
+
+def forecast_company(company_id, history_days=90, half_life=14.0, lead_time=7.0, service_z=1.65,
+                     now=None, using='default'):
+    """Recompute and store forecasts for every item of one company; returns the item count."""
+    now = now or timezone.now()
+    # Whole days only: the last ``history_days`` days, ending yesterday.
+    today = timezone.localdate(now)
+    first_day = today - datetime.timedelta(days=history_days)
+    since = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min))
+    until = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+
+    items = list(
+        Item.objects.using(using).filter(branch__company_id=company_id)
+        .values_list('id', 'stock_quantity', 'minimum_stock', 'created_at')
+    )
+    if not items:
+        return 0
+    item_ids, stock, minimum, created_at = zip(*items)
+    stock = np.array(stock, dtype=float)
+    minimum = np.array(minimum, dtype=float)
+    position = {item_id: i for i, item_id in enumerate(item_ids)}
+
+    usage = np.zeros((len(item_ids), history_days))
+    rows = [row for row in daily_net_withdrawals(company_id, since, until, using) if row[0] in position]
+    if rows:
+        row_item_ids, days, net = zip(*rows)
+        rows_at = np.array([position[item_id] for item_id in row_item_ids], dtype=np.intp)
+        days_at = np.array([(day - first_day).days for day in days], dtype=np.intp)
+        usage[rows_at, days_at] = np.array(net, dtype=float)
+
+    # Weight 1 for yesterday, halving every ``half_life`` days back; days
+    # before an item was created do not count as zero consumption.
+    ages = np.arange(history_days - 1, -1, -1)
+    weights = 0.5 ** (ages / half_life)
+    first_active = np.array([(timezone.localdate(value) - first_day).days for value in created_at])
+    weights = weights[np.newaxis, :] * (np.arange(history_days)[np.newaxis, :] >= first_active[:, np.newaxis])
+    total_weight = weights.sum(axis=1)
+    has_history = total_weight > 0
+
+    mean = np.divide((weights * usage).sum(axis=1), total_weight, out=np.zeros_like(total_weight), where=has_history)
+    variance = np.divide(
+        (weights * (usage - mean[:, np.newaxis]) ** 2).sum(axis=1), total_weight,
+        out=np.zeros_like(total_weight), where=has_history,
+    )
+    rate = np.clip(mean, 0, None)  # Net returns are not negative consumption.
+    std = np.sqrt(variance)
+    days_left = np.divide(stock, rate, out=np.full_like(rate, np.nan), where=rate > 0)
+    reorder_point = np.maximum(np.ceil(rate * lead_time + service_z * std * math.sqrt(lead_time)), minimum)
+
+    forecasts = [
+        ItemForecast(
+            item_id=item_id,
+            daily_consumption=float(rate[i]),
+            daily_consumption_std=float(std[i]),
+            stock_quantity=int(stock[i]),
+            days_until_stockout=None if np.isnan(days_left[i]) else float(days_left[i]),
+            reorder_point=int(reorder_point[i]),
+            history_days=history_days,
+            computed_at=now,
+        )
+        for i, item_id in enumerate(item_ids)
+    ]
+    ItemForecast.objects.using(using).bulk_create(
+        forecasts, batch_size=1000,
+        update_conflicts=True, unique_fields=['item'], update_fields=FORECAST_FIELDS,
+    )
+    return len(forecasts)
+
+
+def forecast_all(company_ids=None, using='default', **options):
+    """Forecast each company in turn; returns ``{company_id: item count}``."""
+    if company_ids is None:
+        company_ids = Company.objects.using(using).values_list('id', flat=True)
+    return {company_id: forecast_company(company_id, using=using, **options) for company_id in company_ids}
@@ -0,0 +1,80 @@
+"""
+Batch maintenance of ``Holding``.
+
+WITHDRAW and RETURN transactions keep holdings current one at a time (see
+``Transaction.save``). ``rebuild`` replays the whole transaction history in
+time order instead: the repair path after bulk imports that bypassed
+``save()``. Run it when writes are quiet; a transaction committing
+mid-rebuild can be missed.
+"""
+from collections import deque
+
+from django.db import transaction
+from django.db.models import DateTimeField, Value
+
+
+def replay(rows):
+    """
+    Outstanding holdings from ``(user_id, item_id, branch_id, type, quantity,
+    timestamp, due_at)`` rows in time order, as ``{(user_id, item_id):
+    [branch_id, quantity, oldest_withdrawn_at, last_withdrawn_at, due_at]}``.
+    Follows the same rules as ``Holding.record``: returns settle the oldest
+    withdrawals first.
+    """
+    holdings, lots = {}, {}
+    for user_id, item_id, branch_id, transaction_type, quantity, timestamp, due_at in rows:
+        key = (user_id, item_id)
+        held = holdings.get(key)
+        if transaction_type == 'WITHDRAW':
+            if held is None:
+                holdings[key] = [branch_id, quantity, timestamp, timestamp, due_at]
+                lots[key] = deque([[quantity, due_at]])
+            else:
+                held[0], held[1], held[3] = branch_id, held[1] + quantity, max(held[3], timestamp)
+                lots[key].append([quantity, due_at])
+                if due_at is not None:
+                    held[4] = due_at if held[4] is None else min(held[4], due_at)
+        elif transaction_type == 'RETURN' and held is not None:
+            if held[1] > quantity:
+                held[1] -= quantity
+                outstanding = lots[key]
+                while quantity:
+                    settled = min(quantity, outstanding[0][0])
+                    outstanding[0][0] -= settled
+                    quantity -= settled
+                    if not outstanding[0][0]:
+                        outstanding.popleft()
+                held[4] = min((due for _, due in outstanding if due is not None), default=None)
+            else:
+                del holdings[key], lots[key]
+    return holdings
+
+
+def rebuild(transaction_model, holding_model, batch_size=2000, using='default'):
+    """
+    Replace every holding with one replayed from ``transaction_model``,
+    atomically. Takes the models as arguments so migrations can pass their
+    historical versions. Returns the holding count.
+    """
+    fields = ['user_id', 'item_id', 'branch_id', 'transaction_type', 'quantity', 'timestamp', 'due_at']
+    # Migrations older than loan periods pass a Transaction without due_at.
+    if not any(field.name == 'due_at' for field in transaction_model._meta.get_fields()):
+        fields[-1] = Value(None, output_field=DateTimeField())
+    rows = (
+        transaction_model.objects.using(using)
+        .filter(transaction_type__in=('WITHDRAW', 'RETURN'))
+        .order_by('timestamp')
+        .values_list(*fields)
+        .iterator(chunk_size=batch_size)
+    )
+    holdings = [
+        holding_model(
+            user_id=user_id, item_id=item_id, branch_id=branch_id, quantity=quantity,
+            oldest_withdrawn_at=oldest, last_withdrawn_at=last, due_at=due_at,
+        )
+        for (user_id, item_id), (branch_id, quantity, oldest, last, due_at) in replay(rows).items()
+    ]
+    with transaction.atomic(using=using):
+        holding_model.objects.using(using).all().delete()
+        holding_model.objects.using(using).bulk_create(holdings, batch_size=batch_size)
+    return len(holdings)
@@ -0,0 +1,59 @@
+"""
+Loan periods and the overdue sweep.
+
+A WITHDRAW of an item with a loan period (its own ``loan_period_days``, else
+its category's) gets ``due_at`` when it is written, and the user's
+``Holding`` takes the earliest due date of what they still hold. Reads of
+overdue loans are then a range scan on the ``due_at`` index.
+
+``sweep`` (``manage.py sweep_overdue``) walks that index in batches, stamps
+``overdue_at`` on newly overdue holdings and sends ``holdings_overdue`` once
+per batch, so each holding is reported once however often the sweep runs.
+``api/signals.py`` turns it into a ``holding.overdue`` event per holding for
+the outbox and the live-update groups.
+"""
+import logging
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Holding
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``holdings`` (a list of Holding) inside each batch's transaction,
+# after ``overdue_at`` is stamped; receivers defer side effects to on_commit.
+holdings_overdue = Signal()
+
+
+def overdue_holdings(now=None, using='default'):
+    """Holdings past their due date, earliest first."""
+    return Holding.objects.using(using).filter(due_at__lt=now or timezone.now()).order_by('due_at', 'id')
+
+
+def sweep(now=None, batch_size=500, using='default'):
+    """Flag holdings that became overdue since the last sweep; returns how many."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                overdue_holdings(now, using).filter(overdue_at__isnull=True)
+                .select_related('user', 'item', 'branch')[:batch_size]
+            )
+            if not batch:
+                break
+            Holding.objects.using(using).filter(pk__in=[holding.pk for holding in batch]).update(overdue_at=now)
+            for holding in batch:
+                holding.overdue_at = now
+            holdings_overdue.send(sender=Holding, holdings=batch, using=using)
+        for holding in batch:
+            logger.info('Holding %s overdue: %s x %s held by %s since %s (due %s)',
+                        holding.pk, holding.quantity, holding.item_id, holding.user_id,
+                        holding.oldest_withdrawn_at, holding.due_at,
+                        extra={'holding': holding.pk, 'item': str(holding.item_id), 'user': str(holding.user_id)})
+        total += len(batch)
+        if len(batch) < batch_size:
+            break
+    return total
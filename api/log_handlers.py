@@ -0,0 +1,101 @@
+"""
+Logging handlers that keep formatting and file I/O off the request thread.
+
+``QueueListenerHandler`` is the only handler loggers attach to. It puts
+records on an in-memory queue and a ``QueueListener`` thread hands them to
+the real handlers (console, rotating file). Records are not pre-formatted,
+so a message whose level is enabled is still only rendered once, on the
+listener thread.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came from ``extra=``. Django's
+# own extras (SQL logging, request logging) are already part of the message.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    'message', 'asctime', 'taskName',
+    'duration', 'sql', 'params', 'alias', 'request', 'status_code', 'server_time',
+}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Appends ``extra=`` fields to the message as ``key=value`` pairs."""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+        if fields:
+            text = f"{text} {' '.join(f'{key}={value!r}' for key, value in sorted(fields.items()))}"
+        return text
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Queues records for a background ``QueueListener``.
+
+    ``handlers`` is a list of ``cfg://handlers.<name>`` references in
+    ``LOGGING``; dictConfig builds handlers in name order, so the targets'
+    names must sort before this handler's. When the queue is full, records
+    are dropped rather than blocking the request, and counted in ``dropped``
+    and the ``api_log_records_dropped_total`` metric.
+    """
+
+    def __init__(self, handlers, queue_size=10000, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        # Index rather than iterate: dictConfig only resolves cfg:// on item access.
+        self.targets = [self._resolve(handlers[i]) for i in range(len(handlers))]
+        self.respect_handler_level = respect_handler_level
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @staticmethod
+    def _resolve(handler):
+        if isinstance(handler, logging.Handler):
+            return handler
+        raise ValueError(f'Queue target {handler!r} is not a configured handler')
+
+    def _ensure_listener(self):
+        # Threads do not survive fork(), so a preloaded gunicorn worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = QueueListener(
+                self.queue, *self.targets, respect_handler_level=self.respect_handler_level
+            )
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._stop_listener)
+
+    def _stop_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+
+    def prepare(self, record):
+        # The queue is in-process, so the record can travel as-is; formatting
+        # happens on the listener thread.
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            # Imported here: this module is loaded by dictConfig during setup.
+            from .metrics import registry
+            registry.inc('api_log_records_dropped_total', ())
+
+    def close(self):
+        self._stop_listener()
+        super().close()
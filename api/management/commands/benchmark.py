@@ -0,0 +1,244 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks for request-path infrastructure (run one target at a time)'
+
+    targets = ('metrics', 'logging', 'renderers', 'scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=self.targets, help='What to benchmark')
+        parser.add_argument('--iterations', type=int, default=20000, help='Iterations per measurement')
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0:
+            raise CommandError('--iterations must be positive')
+        getattr(self, f"bench_{options['target']}")(options['iterations'])
+
+    def timed(self, label, func, iterations):
+        """Run ``func`` ``iterations`` times and report the mean cost per call."""
+        func()  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        per_call = (time.perf_counter() - start) / iterations
+        self.stdout.write(f'{label:<40} {per_call * 1e6:10.2f} us/call')
+        return per_call
+
+    def latencies(self, label, samples):
+        """Report p50/p99 of per-call ``samples`` (seconds); returns them in microseconds."""
+        samples = sorted(samples)
+        p50 = samples[len(samples) // 2] * 1e6
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6
+        self.stdout.write(f'{label:<40} p50 {p50:10.2f} us   p99 {p99:10.2f} us')
+        return p50, p99
+
+    def bench_metrics(self, iterations):
+        from django.urls import resolve
+        from api.metrics import MetricsMiddleware
+
+        request = RequestFactory().get('/api/items/')
+        request.resolver_match = resolve('/api/items/')
+        response = HttpResponse(b'{}' * 512, content_type='application/json')
+
+        def view(request):
+            return response
+
+        middleware = MetricsMiddleware(view)
+        bare = self.timed('bare view', lambda: view(request), iterations)
+        wrapped = self.timed('view + MetricsMiddleware', lambda: middleware(request), iterations)
+        self.stdout.write(self.style.SUCCESS(f'Metrics overhead: {(wrapped - bare) * 1e6:.2f} us/request'))
+
+    def bench_logging(self, iterations):
+        import logging
+        import os
+        import tempfile
+        from api.log_handlers import QueueListenerHandler, StructuredFormatter
+
+        formatter = StructuredFormatter('{levelname} {asctime} {name} {process:d} {thread:d} {message}', style='{')
+        stock = {'item': 'Hammer', 'quantity': 2, 'stock': 40}
+
+        with tempfile.TemporaryDirectory() as directory:
+            sync_handler = logging.FileHandler(os.path.join(directory, 'sync.log'))
+            sync_handler.setFormatter(formatter)
+            sync_logger = logging.getLogger('benchmark.sync')
+            sync_logger.handlers, sync_logger.propagate = [sync_handler], False
+            sync_logger.setLevel(logging.DEBUG)
+
+            file_handler = logging.FileHandler(os.path.join(directory, 'queued.log'))
+            file_handler.setFormatter(formatter)
+            queue_handler = QueueListenerHandler([file_handler], queue_size=iterations + 1)
+            queued_logger = logging.getLogger('benchmark.queued')
+            queued_logger.handlers, queued_logger.propagate = [queue_handler], False
+            queued_logger.setLevel(logging.INFO)
+
+            try:
+                sync = self.timed(
+                    'sync FileHandler, f-string',
+                    lambda: sync_logger.debug(f"Withdrawing {stock['quantity']} from {stock['item']}: {stock}"),
+                    iterations,
+                )
+                queued = self.timed(
+                    'QueueListenerHandler, lazy args',
+                    lambda: queued_logger.info('Withdrawing %s from %s', 2, 'Hammer', extra=stock),
+                    iterations,
+                )
+                disabled = self.timed(
+                    'disabled level, lazy args',
+                    lambda: queued_logger.debug('Withdrawing %s from %s', 2, 'Hammer', extra=stock),
+                    iterations,
+                )
+            finally:
+                queue_handler.close()
+                sync_handler.close()
+                file_handler.close()
+
+        self.stdout.write(f'Records dropped by the queue: {queue_handler.dropped}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Request-thread cost: {sync * 1e6:.2f} -> {queued * 1e6:.2f} us/record '
+            f'({disabled * 1e6:.2f} us when the level is disabled)'
+        ))
+
+    def bench_renderers(self, iterations, rows=10000):
+        import uuid
+        from django.utils import timezone
+        from django.utils.text import compress_string
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.utils.serializer_helpers import ReturnList
+        from api import compression
+        from api.renderers import FastJSONRenderer, orjson
+
+        # Shaped like TransactionSerializer output for a full page of rows.
+        now = timezone.now()
+        branch = uuid.uuid4()
+        data = ReturnList([
+            {
+                'id': str(uuid.uuid4()), 'user_name': f'user{i % 50}', 'user_full_name': f'User {i % 50}',
+                'user_id_number': f'{100000 + i % 50}', 'user_department': 'Maintenance', 'user_level': 'MEMBER',
+                'item_name': f'Hammer {i % 400}', 'item_id': f'MAIN-20250628-{i % 400:04d}', 'item_category': 'Tools',
+                'item_status': 'AVAILABLE', 'item_stock_quantity': i % 37, 'branch': branch, 'branch_name': 'Main',
+                'company_name': 'Acme', 'company_contact_info': '555-0100', 'company_email': 'ops@acme.test',
+                'company_location': 'Springfield', 'company_logo': None,
+                'transaction_type': 'WITHDRAW' if i % 2 else 'RETURN', 'quantity': 1 + i % 3,
+                'timestamp': (now - timezone.timedelta(minutes=i)).isoformat().replace('+00:00', 'Z'),
+                'notes': '', 'reference_number': None,
+            }
+            for i in range(rows)
+        ], serializer=None)
+        # Whole-payload encodes are slow; a few runs give a stable mean.
+        runs = min(iterations, 20)
+
+        stdlib = self.timed(f'JSONRenderer ({rows} rows)', lambda: JSONRenderer().render(data), runs)
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer falls back to JSONRenderer'))
+        fast = self.timed(f'FastJSONRenderer ({rows} rows)', lambda: FastJSONRenderer().render(data), runs)
+        body = FastJSONRenderer().render(data)
+        if body != JSONRenderer().render(data):
+            raise CommandError('FastJSONRenderer output differs from JSONRenderer')
+
+        self.stdout.write(f"{'identity':<40} {len(body):10d} bytes")
+        self.timed('gzip', lambda: compress_string(body), runs)
+        self.stdout.write(f"{'gzip':<40} {len(compress_string(body)):10d} bytes")
+        if compression.brotli is not None:
+            self.timed('brotli', lambda: compression.compress(body, 'br'), runs)
+            self.stdout.write(f"{'brotli':<40} {len(compression.compress(body, 'br')):10d} bytes")
+        else:
+            self.stdout.write(self.style.WARNING('brotli is not installed; only gzip is negotiated'))
+        self.stdout.write(self.style.SUCCESS(f'Encode speed-up: {stdlib / fast:.1f}x'))
+
+    def bench_scan(self, iterations, items=2000):
+        import json
+        from asgiref.sync import async_to_sync
+        from django.db import connection, reset_queries, transaction
+        from django.test.utils import CaptureQueriesContext, override_settings
+        from rest_framework_simplejwt.tokens import AccessToken
+        from api import scan_index
+        from api.models import Branch, Company, CompanyMembership, CustomUser, Item
+        from api.scanning import ItemScanView
+        from api.views import ItemScanCodeView
+
+        iterations = min(iterations, 2000)
+        with transaction.atomic():
+            owner = CustomUser.objects.create_user(username='bench-scan-owner', password='x', id_number='bench-1')
+            member = CustomUser.objects.create_user(username='bench-scan-member', password='x', id_number='bench-2')
+            company = Company.objects.create(name='Bench Scan', owner=owner)
+            branch = Branch.objects.create(company=company, name='Bench')
+            CompanyMembership.objects.create(user=member, company=company, role='USER', branch=branch)
+            Item.objects.bulk_create([
+                Item(branch=branch, name=f'Bench item {i}', item_id=f'BENCH-SCAN-{i:05d}', barcode_number=f'BS{i:08d}',
+                     stock_quantity=10, original_stock_quantity=10, minimum_stock=2)
+                for i in range(items)
+            ])
+            codes = list(Item.objects.filter(branch=branch).values_list('barcode_number', flat=True))
+            factory = RequestFactory()
+            auth = f'Bearer {AccessToken.for_user(member)}'
+
+            def request(i, path='/api/items/scan/'):
+                body = json.dumps({'type': 'barcode', 'value': codes[i % len(codes)]})
+                return factory.post(path, body, content_type='application/json', HTTP_AUTHORIZATION=auth)
+
+            legacy_view, scan_view = ItemScanCodeView.as_view(), ItemScanView.as_view()
+            variants = [
+                # label, view, is async, path, index enabled
+                ('items/scan_code/ (sync, no index)', legacy_view, False, '/api/items/scan_code/', False),
+                ('items/scan/ (async, no index)', scan_view, True, '/api/items/scan/', False),
+                ('items/scan_code/ (sync, index)', legacy_view, False, '/api/items/scan_code/', True),
+                ('items/scan/ (async, index)', scan_view, True, '/api/items/scan/', True),
+                ('items/scan/?slim=1 (async, index)', scan_view, True, '/api/items/scan/?slim=1', True),
+            ]
+
+            def call(view, is_async, path, i):
+                if is_async:
+                    return async_to_sync(view)(request(i, path))
+                return view(request(i, path)).render()
+
+            def run_sync(view, path):
+                samples = []
+                for i in range(iterations):
+                    start = time.perf_counter()
+                    view(request(i, path)).render()
+                    samples.append(time.perf_counter() - start)
+                return samples
+
+            async def run_async(view, path):
+                # Awaited in one event loop, as an ASGI worker would.
+                samples = []
+                for i in range(iterations):
+                    start = time.perf_counter()
+                    await view(request(i, path))
+                    samples.append(time.perf_counter() - start)
+                return samples
+
+            results = {}
+            try:
+                for label, view, is_async, path, indexed in variants:
+                    with override_settings(SCAN_INDEX_ENABLED=indexed):
+                        response = call(view, is_async, path, 0)  # also loads the index
+                        if response.status_code != 200:
+                            raise CommandError(f'{label} answered {response.status_code}')
+                        reset_queries()  # the query log is capped; with DEBUG on every run fills it
+                        with CaptureQueriesContext(connection) as queries:
+                            call(view, is_async, path, 1)
+                        self.stdout.write(f"{label:<40} {len(queries):>3} queries, "
+                                          f"{len(call(view, is_async, path, 2).content):>5} bytes")
+                        # Async runs share the main thread's connection (and its transaction).
+                        samples = async_to_sync(run_async)(view, path) if is_async else run_sync(view, path)
+                        results[label] = self.latencies(label, samples)
+                for held in scan_index.stats():
+                    self.stdout.write(f"{'index memory (' + str(held['codes']) + ' codes)':<40} "
+                                      f"{held['bytes'] / 1024:10.1f} KiB, {held['bytes'] / items:.0f} B/item")
+            finally:
+                # The index holds rows that are about to be rolled back.
+                scan_index.clear()
+                transaction.set_rollback(True)
+
+        legacy = results[variants[0][0]]
+        for label, *_ in variants[1:]:
+            fast = results[label]
+            self.stdout.write(self.style.SUCCESS(
+                f'{label:<40} p50 {legacy[0] / fast[0]:.1f}x, p99 {legacy[1] / fast[1]:.1f}x faster than items/scan_code/'
+            ))
@@ -0,0 +1,178 @@
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils.http import urlencode
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from api.budgets import get_budget
+from api.models import Branch, Category, Company, CompanyMembership, CustomUser, Item, Transaction
+
+# Builds the URL kwargs for endpoints that need them from the seeded objects.
+URL_KWARGS = {
+    'user-detail': lambda seed: {'pk': seed['member'].pk},
+    'company-detail': lambda seed: {'pk': seed['company'].pk},
+    'branch-list': lambda seed: {'company_id': seed['company'].pk},
+    'branch-detail': lambda seed: {'company_id': seed['company'].pk, 'pk': seed['branch'].pk},
+    'company-membership': lambda seed: {'company_id': seed['company'].pk},
+    'company-membership-detail': lambda seed: {
+        'company_id': seed['company'].pk, 'membership_id': seed['membership'].pk,
+    },
+    'item-detail': lambda seed: {'pk': seed['item'].pk},
+    'transaction-receipt': lambda seed: {'id': seed['transaction'].pk},
+    'category-detail': lambda seed: {'pk': seed['category'].pk},
+}
+# A private cache, so clearing it between requests never touches a shared one.
+MEASURE_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-budgets'}}
+# Query strings for endpoints that need one.
+URL_QUERIES = {
+    'dashboard': lambda seed: {'company': seed['company'].pk},
+}
+
+
+async def _drain(content):
+    async for _ in content:
+        pass
+
+
+def consume(response):
+    """Read a streamed body to the end and close the response, running the queries both issue."""
+    if response.streaming:
+        if response.is_async:
+            async_to_sync(_drain)(response.streaming_content)
+        else:
+            for _ in response.streaming_content:
+                pass
+    response.close()
+
+
+class Command(BaseCommand):
+    help = 'Seed a test database and fail if any API GET endpoint exceeds its query budget or scales with row count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--small', type=int, default=2, help='Branches/items/users per level for the first run')
+        parser.add_argument('--large', type=int, default=5, help='Branches/items/users per level for the second run')
+        parser.add_argument('--endpoint', action='append', help='Only check this URL name (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['large'] <= options['small']:
+            raise CommandError('--large must be greater than --small')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root, CACHES=MEASURE_CACHES):
+                seed = self.seed(options['small'])
+                small = self.measure(seed, options['endpoint'])
+                seed = self.seed(options['large'], seed)
+                large = self.measure(seed, options['endpoint'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        failures = self.report(small, large)
+        if failures:
+            raise CommandError(f'{failures} endpoint check(s) over budget or scaling with row count.')
+        self.stdout.write(self.style.SUCCESS('All endpoints are within their query budgets.'))
+
+    def seed(self, scale, seed=None):
+        """Grow the dataset to ``scale`` branches, items per branch and users per branch."""
+        if seed is None:
+            owner = CustomUser.objects.create_user(
+                username='budget-owner', password='budget', id_number='900000001', global_user_level='DEVELOPER'
+            )
+            company = Company.objects.create(name='Budget Co', owner=owner)
+            CompanyMembership.objects.create(user=owner, company=company, role='OWNER')
+            category = Category.objects.create(name='Budget', company=company)
+            seed = {'owner': owner, 'company': company, 'category': category}
+        company = seed['company']
+
+        for c in range(1, scale):
+            Company.objects.get_or_create(name=f'Budget Co {c}', defaults={'owner': seed['owner']})
+
+        for b in range(scale):
+            branch, _ = Branch.objects.get_or_create(company=company, name=f'Branch {b}')
+            for u in range(scale):
+                username = f'budget-{b}-{u}'
+                if CustomUser.objects.filter(username=username).exists():
+                    continue
+                user = CustomUser.objects.create_user(
+                    username=username, password='budget', id_number=f'91{b:03d}{u:03d}'
+                )
+                role = 'BRANCH_MANAGER' if u == 0 else 'USER'
+                membership = CompanyMembership.objects.create(user=user, company=company, role=role, branch=branch)
+                seed.setdefault('member', user)
+                seed.setdefault('membership', membership)
+            member = CustomUser.objects.get(username=f'budget-{b}-0')
+            for i in range(scale):
+                name = f'Item {b}-{i}'
+                if Item.objects.filter(branch=branch, name=name).exists():
+                    continue
+                item = Item.objects.create(
+                    branch=branch, name=name, category=seed['category'], created_by=seed['owner'],
+                    stock_quantity=10, original_stock_quantity=10, minimum_stock=2,
+                )
+                withdrawal = Transaction.objects.create(
+                    branch=branch, item=item, user=member, transaction_type='WITHDRAW', quantity=1
+                )
+                seed.setdefault('item', item)
+                seed.setdefault('transaction', withdrawal)
+            seed.setdefault('branch', branch)
+        return seed
+
+    def measure(self, seed, only=None):
+        personas = {'owner': seed['owner'], 'member': seed['member']}
+        counts = {}
+        for pattern in api_urls.urlpatterns:
+            name = pattern.name
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if not name or view_class is None or not hasattr(view_class, 'get'):
+                continue
+            if only and name not in only:
+                continue
+            url = reverse(name, kwargs=URL_KWARGS.get(name, lambda seed: {})(seed))
+            if name in URL_QUERIES:
+                url = f'{url}?{urlencode(URL_QUERIES[name](seed))}'
+            for persona, user in personas.items():
+                client = APIClient()
+                client.force_authenticate(user)
+                # Measure the uncached path of views using the response cache.
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(url)
+                    # Streamed bodies (exports) run their row queries as they are consumed.
+                    consume(response)
+                if 200 <= response.status_code < 300:
+                    counts[(name, persona)] = len(captured)
+        return counts
+
+    def report(self, small, large):
+        failures = 0
+        self.stdout.write(f"{'endpoint':<28} {'persona':<8} {'small':>5} {'large':>5} {'budget':>6}  result")
+        for key in sorted(small):
+            name, persona = key
+            budget = get_budget(name)
+            before, after = small[key], large.get(key, small[key])
+            problems = []
+            if max(before, after) > budget.max_queries:
+                problems.append('over budget')
+            if after > before:
+                problems.append('grows with rows')
+            if problems and budget.allow_growth:
+                result = self.style.WARNING(f"{', '.join(problems)} (known: {budget.reason})")
+            elif problems:
+                failures += 1
+                result = self.style.ERROR(', '.join(problems))
+            else:
+                result = self.style.SUCCESS('ok')
+            self.stdout.write(f'{name:<28} {persona:<8} {before:>5} {after:>5} {budget.max_queries:>6}  {result}')
+        return failures
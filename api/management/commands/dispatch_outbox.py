@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox events to the configured sinks (OUTBOX_SINKS), in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', action='append', dest='sinks', help='Only this sink (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Events per sink per batch (default 500)')
+        parser.add_argument('--max-attempts', type=int, default=10, help='Skip a batch after N failed deliveries')
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling for new events')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when idle with --loop')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        try:
+            sinks = outbox.load_sinks(options['sinks'])
+        except (ValueError, ImportError) as exc:
+            raise CommandError(exc)
+        while True:
+            outcome = outbox.dispatch(
+                sinks, batch_size=options['batch_size'], max_attempts=options['max_attempts'],
+                using=options['database'],
+            )
+            busy = {name: result for name, result in outcome.items() if result[1]}
+            if busy:
+                summary = ', '.join(f'{name} {result} {count}' for name, (result, count) in sorted(busy.items()))
+                self.stdout.write(f'Outbox: {summary}.')
+            # A full batch handled means more may be waiting; retries wait.
+            if any(result != 'retry' and count >= options['batch_size'] for result, count in outcome.values()):
+                continue
+            # Prune by every configured sink, not just the ones served here.
+            pruned = outbox.prune(list(getattr(settings, 'OUTBOX_SINKS', {})), using=options['database'])
+            if pruned:
+                self.stdout.write(f'Outbox: pruned {pruned} delivered events.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import alerts
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending low-stock alerts to company webhooks, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Alerts per batch (default 100)')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Give up on an alert after N failed deliveries')
+        parser.add_argument('--timeout', type=float, default=5.0, help='Webhook request timeout in seconds')
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling for new alerts')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds to wait when idle with --loop')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        while True:
+            outcome = alerts.dispatch(
+                batch_size=options['batch_size'], max_attempts=options['max_attempts'],
+                timeout=options['timeout'], using=options['database'],
+            )
+            if outcome:
+                summary = ', '.join(f'{count} {result}' for result, count in sorted(outcome.items()))
+                self.stdout.write(f'Stock alerts: {summary}.')
+            if not options['loop']:
+                break
+            # A full batch means more may be waiting.
+            if sum(outcome.values()) < options['batch_size']:
+                time.sleep(options['interval'])
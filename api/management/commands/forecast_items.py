@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import forecasting
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-item consumption rates, days until stockout and reorder points'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', action='append', dest='companies', help='Company id (repeatable; default all)')
+        parser.add_argument('--history-days', type=int, default=90, help='Days of transactions to use (default 90)')
+        parser.add_argument('--half-life', type=float, default=14.0, help='Days after which a day counts half (default 14)')
+        parser.add_argument('--lead-time', type=float, default=7.0, help='Days between reordering and restock (default 7)')
+        parser.add_argument('--service-z', type=float, default=1.65, help='Safety stock in standard deviations (default 1.65, ~95%%)')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        if options['history_days'] < 1 or options['half_life'] <= 0:
+            raise CommandError('--history-days and --half-life must be positive')
+        counts = forecasting.forecast_all(
+            company_ids=options['companies'], using=options['database'],
+            history_days=options['history_days'], half_life=options['half_life'],
+            lead_time=options['lead_time'], service_z=options['service_z'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Forecast {sum(counts.values())} items across {len(counts)} companies.'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import holdings
+from api.models import Holding, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Recompute who holds which items by replaying every WITHDRAW and RETURN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per read and INSERT batch')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        total = holdings.rebuild(
+            Transaction, Holding, batch_size=options['batch_size'], using=options['database'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} holdings.'))
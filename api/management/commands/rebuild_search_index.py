@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from api import search
+from api.models import Item
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 item search table (PostgreSQL indexes need no rebuild)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if connections[using].vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING('Search indexes on this database are maintained by the database itself.'))
+            return
+
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+            total = 0
+            for item in Item.objects.using(using).only('id', 'name', 'item_id', 'description').iterator(chunk_size=2000):
+                search.SQLiteItemSearch.index(item, using)
+                total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} items.'))
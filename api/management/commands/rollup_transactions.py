@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import rollups
+from api.models import Transaction, TransactionDailyRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily transaction rollups: recent days (catch-up) or everything (--rebuild)'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--days', type=int, default=2, help='Recompute today and the previous N-1 days (default 2)')
+        group.add_argument('--since', type=datetime.date.fromisoformat, help='Recompute from this day (YYYY-MM-DD) onward')
+        group.add_argument('--rebuild', action='store_true', help='Recompute every day')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT batch')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            since = None
+        elif options['since']:
+            since = options['since']
+        else:
+            if options['days'] < 1:
+                raise CommandError('--days must be at least 1')
+            since = timezone.localdate() - datetime.timedelta(days=options['days'] - 1)
+
+        total = rollups.rebuild(
+            Transaction, TransactionDailyRollup, since=since,
+            batch_size=options['batch_size'], using=options['database'],
+        )
+        scope = 'all days' if since is None else f'days from {since}'
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} rollup rows for {scope}.'))
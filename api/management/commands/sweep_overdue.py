@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import loans
+
+
+class Command(BaseCommand):
+    help = 'Flag holdings past their due date and send overdue events, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Holdings per batch (default 500)')
+        parser.add_argument('--loop', action='store_true', help='Keep running, sweeping every --interval seconds')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between sweeps with --loop')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        while True:
+            flagged = loans.sweep(batch_size=options['batch_size'], using=options['database'])
+            if flagged or not options['loop']:
+                self.stdout.write(f'Flagged {flagged} overdue holdings.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,347 @@
+"""
+In-process request metrics with a Prometheus text endpoint.
+
+``MetricsMiddleware`` records, per URL name, request latency, DB query count
+and DB time, response size and status code. Each process aggregates in
+memory; when ``METRICS_DIR`` is set (one directory shared by all gunicorn
+workers) every process periodically writes its totals to
+``metrics-<pid>.json`` and the endpoint sums all of those files, deleting
+the ones left behind by workers that have exited.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'api_request_duration_seconds': ('Request latency by view.', LATENCY_BUCKETS),
+    'api_db_queries_per_request': ('DB queries per request by view.', QUERY_COUNT_BUCKETS),
+    'api_response_size_bytes': ('Response body size by view.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'api_requests_total': 'Requests by view, method and status code.',
+    'api_db_queries_total': 'DB queries by view.',
+    'api_db_query_seconds_total': 'Time spent in DB queries by view.',
+    'api_response_cache_total': 'Response cache lookups by view and result (hit/miss).',
+    'api_stock_alerts_total': 'Stock status changes by alert outcome (queued/merged/cancelled/suppressed).',
+    'api_outbox_events_total': 'Outbox events handled by sink and result (delivered/retry/dropped).',
+    'api_log_records_dropped_total': 'Log records dropped because the logging queue was full.',
+}
+# Summed over processes, like everything else here.
+GAUGES = {
+    'api_scan_index_bytes': 'Estimated memory of the in-process scan indexes by company.',
+    'api_scan_index_codes': 'Scan codes held by the in-process scan indexes by company.',
+}
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and fixed-bucket histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._inc(name, labels, amount)
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self._observe(name, labels, value)
+
+    def set_gauge(self, name, labels, value):
+        """Set a gauge; ``None`` removes it."""
+        with self._lock:
+            if value is None:
+                self.gauges.pop((name, labels), None)
+            else:
+                self.gauges[(name, labels)] = value
+
+    def record_request(self, view, method, status, seconds, queries, query_seconds, size):
+        """Record one request under a single lock acquisition."""
+        with self._lock:
+            self._inc('api_requests_total', (view, method, status))
+            self._observe('api_request_duration_seconds', (view, method), seconds)
+            self._observe('api_db_queries_per_request', (view,), queries)
+            self._inc('api_db_queries_total', (view,), queries)
+            self._inc('api_db_query_seconds_total', (view,), query_seconds)
+            if size is not None:
+                self._observe('api_response_size_bytes', (view,), size)
+
+    def _inc(self, name, labels, amount=1):
+        self.counters[(name, labels)] += amount
+
+    def _observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        state = self.histograms.get((name, labels))
+        if state is None:
+            # One slot per bucket, then +Inf, then the running sum.
+            state = self.histograms[(name, labels)] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(buckets)] += 1
+        state[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, list(labels), list(state)] for (name, labels), state in self.histograms.items()],
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                self.counters[(name, tuple(labels))] += value
+            for name, labels, value in snapshot.get('gauges', []):
+                key = (name, tuple(labels))
+                self.gauges[key] = self.gauges.get(key, 0) + value
+            for name, labels, state in snapshot['histograms']:
+                key = (name, tuple(labels))
+                current = self.histograms.get(key)
+                if current is None:
+                    self.histograms[key] = list(state)
+                else:
+                    self.histograms[key] = [a + b for a, b in zip(current, state)]
+
+
+registry = MetricsRegistry()
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def flush(force=False):
+    """Write this process's totals to ``METRICS_DIR`` at most every ``METRICS_FLUSH_INTERVAL`` seconds."""
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    # Requests skip the flush while another thread is writing; forced flushes wait.
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        now = time.monotonic()
+        if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        _last_flush = now
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(tmp, 'w') as fh:
+                json.dump(registry.snapshot(), fh)
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception('Could not write metrics snapshot to %s', path)
+    finally:
+        _flush_lock.release()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _stale(directory, name):
+    """
+    Whether a snapshot belongs to a process that is gone: its PID no longer
+    exists, or it has not been rewritten for ``METRICS_STALE_AFTER`` seconds
+    (PIDs from another host or container sharing the directory).
+    """
+    try:
+        pid = int(name[len('metrics-'):-len('.json')])
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return False
+    if not _pid_alive(pid):
+        return True
+    stale_after = getattr(settings, 'METRICS_STALE_AFTER', 3600)
+    try:
+        return bool(stale_after) and time.time() - os.path.getmtime(os.path.join(directory, name)) > stale_after
+    except OSError:
+        return False
+
+
+def collect():
+    """Return a registry holding the totals of every live process, pruning stale snapshots."""
+    directory = _metrics_dir()
+    if not directory:
+        return registry
+    flush(force=True)
+    combined = MetricsRegistry()
+    try:
+        names = [name for name in os.listdir(directory) if name.startswith('metrics-') and name.endswith('.json')]
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        if _stale(directory, name):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+            continue
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                combined.merge(json.load(fh))
+        except (OSError, ValueError):
+            logger.warning('Skipping unreadable metrics snapshot %s', name)
+    return combined
+
+
+def _format_labels(label_names, labels, extra=''):
+    pairs = [f'{key}="{value}"' for key, value in zip(label_names, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+COUNTER_LABELS = {
+    'api_requests_total': ('view', 'method', 'status'),
+    'api_response_cache_total': ('view', 'result'),
+    'api_stock_alerts_total': ('result',),
+    'api_outbox_events_total': ('sink', 'result'),
+    'api_log_records_dropped_total': (),
+}
+GAUGE_LABELS = {
+    'api_scan_index_bytes': ('company',),
+    'api_scan_index_codes': ('company',),
+}
+DEFAULT_LABELS = ('view',)
+HISTOGRAM_LABELS = {'api_request_duration_seconds': ('view', 'method')}
+
+
+def render(source):
+    lines = []
+    counters, histograms = source.counters, source.histograms
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        label_names = COUNTER_LABELS.get(name, DEFAULT_LABELS)
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(label_names, labels)} {value:g}')
+    for name, help_text in GAUGES.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        for (metric, labels), value in sorted(source.gauges.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(GAUGE_LABELS[name], labels)} {value:g}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        label_names = HISTOGRAM_LABELS.get(name, DEFAULT_LABELS)
+        for (metric, labels), state in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), state):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{name}_bucket{_format_labels(label_names, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(label_names, labels)} {state[-1]:g}')
+            lines.append(f'{name}_count{_format_labels(label_names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryTimer:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def _timing(timer):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(timer))
+    return stack
+
+
+class MetricsMiddleware:
+    """Records per-view request metrics. Place it first in ``MIDDLEWARE``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        with _timing(timer):
+            response = self.get_response(request)
+        return self.record(request, response, timer, start)
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        # Queries run in sync_to_async threads on this context's connections.
+        with _timing(timer):
+            response = await self.get_response(request)
+        return self.record(request, response, timer, start)
+
+    def record(self, request, response, timer, start):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        registry.record_request(
+            view, request.method, str(response.status_code), elapsed, timer.count, timer.seconds,
+            None if response.streaming else len(response.content),
+        )
+        flush()
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition. Requires ``Authorization: Bearer <METRICS_TOKEN>``
+    when ``METRICS_TOKEN`` is set, otherwise it is only served with DEBUG on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponseForbidden('Invalid metrics token.')
+    elif not settings.DEBUG:
+        return HttpResponseForbidden('Set METRICS_TOKEN to enable metrics.')
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -53,7 +53,7 @@ class RegionValidationMiddleware:
             if hasattr(request, 'region') and request.region:
                 # Check if user can access this region
                 if not request.user.can_access_region(request.region):
-                    logger.warning(f"User {request.user.id_number} denied access to region {request.region.name}")
+                    logger.warning('User %s denied access to region %s', request.user.id_number, request.region.name)
                     return JsonResponse({
                         'error': 'Access denied to this region'
                     }, status=403)
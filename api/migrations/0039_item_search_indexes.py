@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    Item = apps.get_model('api', 'Item')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex, OpClass
+        from django.contrib.postgres.search import SearchVector
+        from django.db.models.functions import Upper
+
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # Must match api.search.item_search_vector() so the planner can use it.
+        vector = (
+            SearchVector('name', config='simple', weight='A')
+            + SearchVector('item_id', config='simple', weight='A')
+            + SearchVector('description', config='simple', weight='B')
+        )
+        schema_editor.add_index(Item, GinIndex(vector, name='api_item_search_vector_gin'))
+        schema_editor.add_index(Item, GinIndex(OpClass('name', name='gin_trgm_ops'), name='api_item_name_trgm'))
+        schema_editor.add_index(
+            Item, GinIndex(OpClass(Upper('item_id'), name='gin_trgm_ops'), name='api_item_item_id_trgm')
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_item_fts USING fts5("
+            "item_pk UNINDEXED, name, item_id, description, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            "INSERT INTO api_item_fts (item_pk, name, item_id, description) "
+            "SELECT id, name, COALESCE(item_id, ''), description FROM api_item"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for name in ('api_item_search_vector_gin', 'api_item_name_trgm', 'api_item_item_id_trgm'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS api_item_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_remove_transaction_region_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
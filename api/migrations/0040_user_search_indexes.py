@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Columns UserListView searches. SearchFilter matches with icontains, which
+# PostgreSQL compiles to UPPER(col::text) LIKE UPPER(%s), so the trigram
+# indexes are on the same expression.
+USER_SEARCH_COLUMNS = ('username', 'email', 'first_name', 'last_name', 'id_number')
+
+
+def create_user_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        # SQLite cannot use an index for '%term%' matches; nothing to add.
+        return
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.db.models.functions import Upper
+
+    CustomUser = apps.get_model('api', 'CustomUser')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in USER_SEARCH_COLUMNS:
+        schema_editor.add_index(
+            CustomUser,
+            GinIndex(OpClass(Upper(column), name='gin_trgm_ops'), name=f'api_user_{column}_trgm'),
+        )
+
+
+def drop_user_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in USER_SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS api_user_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_item_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_search_indexes, drop_user_search_indexes),
+    ]
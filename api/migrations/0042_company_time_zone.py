@@ -0,0 +1,17 @@
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0041_transactiondailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='time_zone',
+            field=models.CharField(default='UTC', help_text="IANA time zone used for this company's reports, e.g. Europe/Berlin.", max_length=64, validators=[api.models.validate_time_zone]),
+        ),
+    ]
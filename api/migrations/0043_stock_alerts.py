@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0042_company_time_zone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='alert_webhook_url',
+            field=models.URLField(blank=True, help_text='Receives low-stock alerts as JSON POSTs; leave blank to disable.', max_length=500),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_status', models.CharField(choices=[('AVAILABLE', 'Available'), ('LOW_STOCK', 'Low Stock'), ('OUT_OF_STOCK', 'Out of Stock'), ('MAINTENANCE', 'Under Maintenance'), ('RETIRED', 'Retired')], max_length=20)),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Available'), ('LOW_STOCK', 'Low Stock'), ('OUT_OF_STOCK', 'Out of Stock'), ('MAINTENANCE', 'Under Maintenance'), ('RETIRED', 'Retired')], max_length=20)),
+                ('stock_quantity', models.PositiveIntegerField()),
+                ('minimum_stock', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('delivery_state', models.CharField(choices=[('PENDING', 'Pending'), ('SENT', 'Sent'), ('FAILED', 'Failed'), ('SKIPPED', 'Skipped')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='api.company')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='api.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['delivery_state', 'id'], name='api_alert_state'), models.Index(fields=['item', 'status', 'created_at'], name='api_alert_item_status')],
+            },
+        ),
+    ]
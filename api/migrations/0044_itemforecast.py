@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0043_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('daily_consumption', models.FloatField(help_text='Exponentially weighted mean of net units withdrawn per day')),
+                ('daily_consumption_std', models.FloatField()),
+                ('stock_quantity', models.PositiveIntegerField(help_text='Stock when the forecast was computed')),
+                ('days_until_stockout', models.FloatField(blank=True, help_text='Empty when the item is not being consumed', null=True)),
+                ('reorder_point', models.PositiveIntegerField(help_text='Stock level at which to reorder; never below minimum_stock')),
+                ('history_days', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='api.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['days_until_stockout'], name='api_forecast_stockout')],
+            },
+        ),
+    ]
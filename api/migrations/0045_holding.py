@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_holdings(apps, schema_editor):
+    from api import holdings
+
+    holdings.rebuild(
+        apps.get_model('api', 'Transaction'),
+        apps.get_model('api', 'Holding'),
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0044_itemforecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('oldest_withdrawn_at', models.DateTimeField()),
+                ('last_withdrawn_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='api.branch')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='api.item')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'oldest_withdrawn_at'], name='api_holding_branch'), models.Index(fields=['item', 'oldest_withdrawn_at'], name='api_holding_item')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'item'), name='api_holding_user_item')],
+            },
+        ),
+        migrations.RunPython(populate_holdings, migrations.RunPython.noop),
+    ]
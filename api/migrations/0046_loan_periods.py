@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0045_holding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='loan_period_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Days a withdrawal may be kept before it is overdue; empty for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='loan_period_days',
+            field=models.PositiveIntegerField(blank=True, help_text="Days a withdrawal may be kept before it is overdue; empty to use the category's.", null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='due_at',
+            field=models.DateTimeField(blank=True, help_text='When a WITHDRAW should be returned by, from the loan period', null=True),
+        ),
+        migrations.AddField(
+            model_name='holding',
+            name='due_at',
+            field=models.DateTimeField(blank=True, help_text='Earliest due date of the outstanding withdrawals', null=True),
+        ),
+        migrations.AddField(
+            model_name='holding',
+            name='overdue_at',
+            field=models.DateTimeField(blank=True, help_text='When the overdue sweeper flagged this holding', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='holding',
+            index=models.Index(fields=['due_at'], name='api_holding_due'),
+        ),
+    ]
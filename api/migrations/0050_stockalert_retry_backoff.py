@@ -0,0 +1,22 @@
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0049_item_barcode_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='alert_webhook_url',
+            field=models.URLField(blank=True, help_text='Receives low-stock alerts as JSON POSTs; leave blank to disable.', max_length=500, validators=[api.models.validate_public_url]),
+        ),
+        migrations.AddField(
+            model_name='stockalert',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='Earliest retry after a failed delivery', null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, IntegrityError, transaction as db_transaction
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.conf import settings
 import qrcode
 from io import BytesIO
@@ -11,6 +12,43 @@ from django.utils import timezone
 import barcode
 from barcode.writer import ImageWriter
 from django.utils.text import slugify
+import datetime
+import ipaddress
+import logging
+import socket
+import zoneinfo
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+def validate_time_zone(value):
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f'"{value}" is not a known time zone.')
+
+
+def validate_public_url(value):
+    """
+    Reject a URL whose host is, or resolves to, an address that is not
+    public (loopback, private, link-local, reserved or multicast), so
+    tenant-set webhooks cannot reach internal services.
+    """
+    host = urlsplit(value).hostname
+    if not host:
+        raise ValidationError('Enter a URL with a host name.')
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise ValidationError(f'"{host}" could not be resolved.')
+    for address in addresses:
+        address = ipaddress.ip_address(address.split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValidationError(f'"{host}" is not a public address.')
+
 
 class Company(models.Model):
     """Represents a company, the top-level entity in the hierarchy."""
@@ -27,6 +65,14 @@ class Company(models.Model):
     contact_info = models.CharField(max_length=200, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     location = models.CharField(max_length=200, blank=True, null=True)
+    time_zone = models.CharField(
+        max_length=64, default='UTC', validators=[validate_time_zone],
+        help_text="IANA time zone used for this company's reports, e.g. Europe/Berlin."
+    )
+    alert_webhook_url = models.URLField(
+        max_length=500, blank=True, validators=[validate_public_url],
+        help_text="Receives low-stock alerts as JSON POSTs; leave blank to disable."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -38,6 +84,37 @@ class Company(models.Model):
     def __str__(self):
         return self.name
 
+def _count_subquery(queryset, outer_field):
+    """Correlated ``COUNT(*)`` of ``queryset`` grouped on ``outer_field``, 0 when there are no rows."""
+    counted = queryset.order_by().values(outer_field).annotate(count=models.Count('*')).values('count')
+    return Coalesce(models.Subquery(counted, output_field=models.IntegerField()), 0)
+
+
+class BranchQuerySet(models.QuerySet):
+    def with_stats(self):
+        """
+        Annotate the figures branch lists show, each as a correlated subquery
+        so the whole list is one statement: ``manager_username``,
+        ``item_count``, ``low_stock_count``, ``out_of_stock_count`` and
+        ``active_member_count``. Also joins the company.
+        """
+        branch = models.OuterRef('pk')
+        items = Item.objects.filter(branch=branch)
+        memberships = CompanyMembership.objects.filter(branch=branch)
+        return self.select_related('company').annotate(
+            manager_username=models.Subquery(
+                memberships.filter(role='BRANCH_MANAGER').order_by('pk').values('user__username')[:1]
+            ),
+            item_count=_count_subquery(items, 'branch'),
+            # Same conditions as Item.is_low_stock() / Item.is_out_of_stock().
+            low_stock_count=_count_subquery(
+                items.filter(stock_quantity__lte=models.F('minimum_stock'), stock_quantity__gt=0), 'branch'
+            ),
+            out_of_stock_count=_count_subquery(items.filter(stock_quantity=0), 'branch'),
+            active_member_count=_count_subquery(memberships.filter(user__is_active=True), 'branch'),
+        )
+
+
 class Branch(models.Model):
     """Represents a branch or location within a company."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -48,6 +125,11 @@ class Branch(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BranchQuerySet.as_manager()
+
+    # Attributes set by BranchQuerySet.with_stats().
+    STAT_FIELDS = ('manager_username', 'item_count', 'low_stock_count', 'out_of_stock_count', 'active_member_count')
+
     class Meta:
         verbose_name = "Branch"
         verbose_name_plural = "Branches"
@@ -133,7 +215,9 @@ class CompanyMembership(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        # post_save receivers write the outbox; keep them in the same transaction.
+        with db_transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.user.username} in {self.company.name} as {self.get_role_display()}'
@@ -144,6 +228,10 @@ class Category(models.Model):
     name = models.CharField(max_length=50)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='categories')
     branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='categories')
+    loan_period_days = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Days a withdrawal may be kept before it is overdue; empty for no limit."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -173,12 +261,18 @@ class Item(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     original_stock_quantity = models.PositiveIntegerField(default=0, help_text="Original stock quantity when item was created")
     minimum_stock = models.PositiveIntegerField(default=0)
+    loan_period_days = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Days a withdrawal may be kept before it is overdue; empty to use the category's."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='created_items')
 
     class Meta:
         unique_together = [['branch', 'barcode_number']]
+        # Scans look barcodes up across the caller's branches (api.scanning).
+        indexes = [models.Index(fields=['barcode_number'], name='api_item_barcode')]
 
     def __str__(self):
         return f"{self.name} ({self.item_id}) @ {self.branch.name}"
@@ -202,32 +296,42 @@ class Item(models.Model):
     def is_available(self): return self.stock_quantity > 0
     def can_withdraw(self, quantity=1): return self.stock_quantity >= quantity and self.status not in ['MAINTENANCE', 'RETIRED']
     
+    def get_loan_period(self):
+        """The item's loan period, else its category's, as a timedelta; None if unlimited."""
+        days = self.loan_period_days
+        if days is None and self.category_id:
+            days = self.category.loan_period_days
+        return datetime.timedelta(days=days) if days is not None else None
+
     def update_status_based_on_stock(self):
         if self.is_out_of_stock(): self.status = 'OUT_OF_STOCK'
         elif self.is_low_stock(): self.status = 'LOW_STOCK'
         else: self.status = 'AVAILABLE'
 
     def withdraw_stock(self, quantity=1):
-        print(f"[DEBUG] Withdrawing {quantity} from item '{self.name}' (before: {self.stock_quantity})")
         if self.can_withdraw(quantity):
             self.stock_quantity -= quantity
             self.update_status_based_on_stock()
-            print(f"[DEBUG] Withdraw successful. New stock: {self.stock_quantity}")
+            logger.debug('Withdrew %s from item %s, stock now %s', quantity, self.pk, self.stock_quantity,
+                         extra={'item': str(self.pk), 'quantity': quantity, 'stock': self.stock_quantity})
             return True
-        print(f"[DEBUG] Withdraw failed. Not enough stock or item not available.")
+        logger.debug('Withdraw of %s from item %s refused (stock %s, status %s)',
+                     quantity, self.pk, self.stock_quantity, self.status,
+                     extra={'item': str(self.pk), 'quantity': quantity, 'stock': self.stock_quantity})
         return False
 
     def return_stock(self, quantity=1):
-        print(f"[DEBUG] Returning {quantity} to item '{self.name}' (current stock: {self.stock_quantity}, original: {self.original_stock_quantity})")
-        
         # Check if returning would exceed original stock quantity
         if self.stock_quantity + quantity > self.original_stock_quantity:
-            print(f"[DEBUG] Return failed. Would exceed original stock quantity of {self.original_stock_quantity}")
+            logger.debug('Return of %s to item %s refused: would exceed original stock %s',
+                         quantity, self.pk, self.original_stock_quantity,
+                         extra={'item': str(self.pk), 'quantity': quantity, 'stock': self.stock_quantity})
             return False
         
         self.stock_quantity += quantity
         self.update_status_based_on_stock()
-        print(f"[DEBUG] Return successful. New stock: {self.stock_quantity}")
+        logger.debug('Returned %s to item %s, stock now %s', quantity, self.pk, self.stock_quantity,
+                     extra={'item': str(self.pk), 'quantity': quantity, 'stock': self.stock_quantity})
         return True
 
     def generate_qr(self):
@@ -264,13 +368,29 @@ class Item(models.Model):
             # If stock_quantity > 0, set original_stock_quantity to stock_quantity
             self.original_stock_quantity = self.stock_quantity
             if self.stock_quantity == 0:
-                print(f"[WARNING] Item '{self.name}' created with 0 stock. Returns will not be possible until stock is added.")
+                logger.warning("Item '%s' created with 0 stock. Returns will not be possible until stock is added.", self.name)
         
         self.update_status_based_on_stock()
         if not self.qr_code:
             self.generate_qr()
         self.generate_barcode()
-        super().save(*args, **kwargs)
+        # post_save receivers queue alerts and outbox events; commit them together.
+        with db_transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+        # post_save receivers compare against these (see api/alerts.py, api/scan_index.py).
+        self._saved_status = self.status
+        self._saved_scan_codes = self.scan_codes()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')
+        instance._saved_scan_codes = tuple(instance.__dict__.get(name) for name in ('item_id', 'barcode_number', 'branch_id'))
+        return instance
+
+    def scan_codes(self):
+        """What ``api.scan_index`` holds for this item, besides its id."""
+        return self.item_id, self.barcode_number, self.branch_id
 
 class Transaction(models.Model):
     TRANSACTION_TYPES = [('WITHDRAW', 'Withdraw'), ('RETURN', 'Return')]
@@ -284,32 +404,274 @@ class Transaction(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
     reference_number = models.CharField(max_length=20, unique=True, blank=True, null=True, help_text="Unique reference number for this transaction")
+    due_at = models.DateTimeField(null=True, blank=True, help_text="When a WITHDRAW should be returned by, from the loan period")
 
     class Meta:
         ordering = ['-timestamp']
+        # Keyset reads of a branch's feed (api.feeds).
+        indexes = [models.Index(fields=['branch', 'timestamp', 'id'], name='api_txn_branch_ts')]
 
     def __str__(self):
         return f"{self.transaction_type} - {self.item.name} by {self.user.username}"
 
     def save(self, *args, **kwargs):
-        print(f"[DEBUG] Transaction.save called: type={self.transaction_type}, item={self.item}, quantity={self.quantity}")
         if not self.reference_number:
             # Generate a unique reference number (e.g., TRX20240601-UUID4-short)
             import uuid, datetime
             date_str = datetime.datetime.now().strftime('%Y%m%d')
             unique_part = str(uuid.uuid4())[:8]
             self.reference_number = f"TRX{date_str}-{unique_part}"
-        if self._state.adding:  # Use Django's internal flag for new objects
-            if self.transaction_type == 'WITHDRAW':
-                print(f"[DEBUG] Processing withdrawal for item {self.item} (current stock: {self.item.stock_quantity})")
-                if not self.item.withdraw_stock(self.quantity):
-                    print(f"[DEBUG] Withdrawal failed for item {self.item}")
-                    raise ValueError(f"Cannot withdraw {self.quantity} of {self.item.name}. Insufficient stock or item not available.")
-            elif self.transaction_type == 'RETURN':
-                print(f"[DEBUG] Processing return for item {self.item} (current stock: {self.item.stock_quantity})")
-                if not self.item.return_stock(self.quantity):
-                    print(f"[DEBUG] Return failed for item {self.item}")
-                    raise ValueError(f"Cannot return {self.quantity} of {self.item.name}. Would exceed original stock quantity of {self.item.original_stock_quantity}.")
-                print(f"[DEBUG] Return processed successfully for item {self.item}")
-            self.item.save()
-        super().save(*args, **kwargs)
+        adding = self._state.adding  # Use Django's internal flag for new objects
+        if adding and self.transaction_type == 'WITHDRAW' and self.due_at is None:
+            loan_period = self.item.get_loan_period()
+            if loan_period is not None:
+                self.due_at = timezone.now() + loan_period
+        with db_transaction.atomic():
+            if adding:
+                if self.transaction_type == 'WITHDRAW':
+                    if not self.item.withdraw_stock(self.quantity):
+                        raise ValueError(f"Cannot withdraw {self.quantity} of {self.item.name}. Insufficient stock or item not available.")
+                elif self.transaction_type == 'RETURN':
+                    if not self.item.return_stock(self.quantity):
+                        raise ValueError(f"Cannot return {self.quantity} of {self.item.name}. Would exceed original stock quantity of {self.item.original_stock_quantity}.")
+                self.item.save()
+            super().save(*args, **kwargs)
+            if adding and getattr(settings, 'TRANSACTION_ROLLUP_INLINE', True):
+                TransactionDailyRollup.record(self)
+            if adding:
+                Holding.record(self)
+        logger.debug('Saved %s transaction %s for item %s (quantity %s)',
+                     self.transaction_type, self.reference_number, self.item_id, self.quantity,
+                     extra={'transaction': self.reference_number, 'item': str(self.item_id), 'quantity': self.quantity})
+
+
+class TransactionDailyRollup(models.Model):
+    """
+    Transaction counts and quantities per (branch, item, user, day, type).
+
+    Kept current inside the same database transaction as each Transaction
+    insert (``TRANSACTION_ROLLUP_INLINE``), or rebuilt by
+    ``manage.py rollup_transactions``. Days are in ``TIME_ZONE``.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='daily_rollups')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='daily_rollups')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    transaction_type = models.CharField(max_length=10)
+    count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('branch', 'item', 'user', 'day', 'transaction_type')
+        indexes = [models.Index(fields=['branch', 'day'], name='api_rollup_branch_day')]
+
+    def __str__(self):
+        return f"{self.day} {self.transaction_type} x{self.count} - {self.item_id} by {self.user_id}"
+
+    @classmethod
+    def record(cls, txn, sign=1):
+        """Add (or with ``sign=-1`` remove) one transaction; call inside its database transaction."""
+        key = {
+            'branch_id': txn.branch_id, 'item_id': txn.item_id, 'user_id': txn.user_id,
+            'day': timezone.localdate(txn.timestamp), 'transaction_type': txn.transaction_type,
+        }
+        changes = {'count': models.F('count') + sign, 'quantity': models.F('quantity') + sign * txn.quantity}
+        if sign < 0:
+            cls.objects.filter(**key).update(**changes)
+            cls.objects.filter(**key, count__lte=0).delete()
+            return
+        if cls.objects.filter(**key).update(**changes):
+            return
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(**key, count=1, quantity=txn.quantity)
+        except IntegrityError:
+            # A concurrent insert created the row first.
+            cls.objects.filter(**key).update(**changes)
+
+
+class Holding(models.Model):
+    """
+    Units of an item a user has withdrawn and not yet returned.
+
+    Kept current inside the same database transaction as each WITHDRAW and
+    RETURN (see ``Transaction.save``); ``manage.py rebuild_holdings`` replays
+    the transaction history from scratch. A row exists only while the
+    quantity is positive. ``oldest_withdrawn_at`` is the first withdrawal
+    since the user last held none of the item; ``due_at`` is the earliest
+    due date among the withdrawals still outstanding, returns settling the
+    oldest first (see ``api/loans.py``).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='holdings')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='holdings')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='holdings')
+    quantity = models.PositiveIntegerField()
+    oldest_withdrawn_at = models.DateTimeField()
+    last_withdrawn_at = models.DateTimeField()
+    due_at = models.DateTimeField(null=True, blank=True, help_text="Earliest due date of the outstanding withdrawals")
+    overdue_at = models.DateTimeField(null=True, blank=True, help_text="When the overdue sweeper flagged this holding")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'item'], name='api_holding_user_item')]
+        indexes = [
+            models.Index(fields=['branch', 'oldest_withdrawn_at'], name='api_holding_branch'),
+            models.Index(fields=['item', 'oldest_withdrawn_at'], name='api_holding_item'),
+            models.Index(fields=['due_at'], name='api_holding_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} holds {self.quantity} x {self.item_id}"
+
+    @staticmethod
+    def delta(txn):
+        """Units ``txn`` moves into (positive) or out of (negative) its user's hands."""
+        return {'WITHDRAW': txn.quantity, 'RETURN': -txn.quantity}.get(txn.transaction_type, 0)
+
+    @classmethod
+    def record(cls, txn, sign=1):
+        """Apply (or with ``sign=-1`` undo) one transaction; call inside its database transaction."""
+        delta = sign * cls.delta(txn)
+        holdings = cls.objects.filter(user_id=txn.user_id, item_id=txn.item_id)
+        if delta < 0:
+            # Returning more than the user holds (someone else's units) clears the holding.
+            if not holdings.filter(quantity__gt=-delta).update(quantity=models.F('quantity') + delta):
+                holdings.delete()
+                return
+        elif delta > 0:
+            cls._add(holdings, txn, delta)
+        if delta < 0 or (delta > 0 and txn.transaction_type == 'RETURN'):
+            cls.refresh_due(txn.user_id, txn.item_id)
+
+    @classmethod
+    def _add(cls, holdings, txn, delta):
+        changes = {
+            'quantity': models.F('quantity') + delta, 'branch_id': txn.branch_id,
+            'last_withdrawn_at': Greatest('last_withdrawn_at', models.Value(txn.timestamp)),
+            'oldest_withdrawn_at': Least('oldest_withdrawn_at', models.Value(txn.timestamp)),
+        }
+        if txn.due_at is not None:
+            # A new withdrawal is the newest outstanding one: the holding is due at the earlier date.
+            due_at = models.Value(txn.due_at)
+            changes['due_at'] = Least(Coalesce('due_at', due_at), due_at)
+        if holdings.update(**changes):
+            return
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(
+                    user_id=txn.user_id, item_id=txn.item_id, branch_id=txn.branch_id, quantity=delta,
+                    oldest_withdrawn_at=txn.timestamp, last_withdrawn_at=txn.timestamp, due_at=txn.due_at,
+                )
+        except IntegrityError:
+            # A concurrent withdrawal created the row first.
+            cls._add(holdings, txn, delta)
+
+    @classmethod
+    def refresh_due(cls, user_id, item_id):
+        """
+        Recompute ``due_at`` after units came back or a return was undone:
+        returns settle the oldest withdrawals first, so the holding is due when
+        the earliest of the newest withdrawals covering its quantity is. Clears
+        ``overdue_at`` unless that is still in the past.
+        """
+        holdings = cls.objects.filter(user_id=user_id, item_id=item_id)
+        quantity = holdings.values_list('quantity', flat=True).first()
+        if quantity is None:
+            return
+        withdrawals = Transaction.objects.filter(
+            user_id=user_id, item_id=item_id, transaction_type='WITHDRAW',
+        ).order_by('-timestamp', '-id').values_list('quantity', 'due_at')
+        due_dates, outstanding = [], 0
+        for withdrawn, due_at in withdrawals.iterator():
+            if due_at is not None:
+                due_dates.append(due_at)
+            outstanding += withdrawn
+            if outstanding >= quantity:
+                break
+        due_at = min(due_dates, default=None)
+        changes = {'due_at': due_at}
+        if due_at is None or due_at > timezone.now():
+            changes['overdue_at'] = None
+        holdings.update(**changes)
+
+
+class StockAlert(models.Model):
+    """
+    An item moving between AVAILABLE, LOW_STOCK and OUT_OF_STOCK, queued for
+    delivery to the company's ``alert_webhook_url`` (see ``api/alerts.py``).
+    """
+    DELIVERY_STATES = [('PENDING', 'Pending'), ('SENT', 'Sent'), ('FAILED', 'Failed'), ('SKIPPED', 'Skipped')]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_alerts')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='stock_alerts')
+    previous_status = models.CharField(max_length=20, choices=Item.STATUS_CHOICES)
+    status = models.CharField(max_length=20, choices=Item.STATUS_CHOICES)
+    stock_quantity = models.PositiveIntegerField()
+    minimum_stock = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    delivery_state = models.CharField(max_length=10, choices=DELIVERY_STATES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="Earliest retry after a failed delivery")
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['delivery_state', 'id'], name='api_alert_state'),
+            models.Index(fields=['item', 'status', 'created_at'], name='api_alert_item_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.previous_status} -> {self.status} ({self.delivery_state})"
+
+
+class ItemForecast(models.Model):
+    """
+    Consumption forecast for one item, recomputed for a whole company at a
+    time by ``manage.py forecast_items`` (see ``api/forecasting.py``).
+    """
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, related_name='forecast')
+    daily_consumption = models.FloatField(help_text="Exponentially weighted mean of net units withdrawn per day")
+    daily_consumption_std = models.FloatField()
+    stock_quantity = models.PositiveIntegerField(help_text="Stock when the forecast was computed")
+    days_until_stockout = models.FloatField(null=True, blank=True, help_text="Empty when the item is not being consumed")
+    reorder_point = models.PositiveIntegerField(help_text="Stock level at which to reorder; never below minimum_stock")
+    history_days = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['days_until_stockout'], name='api_forecast_stockout')]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.daily_consumption:.2f}/day"
+
+
+class OutboxEvent(models.Model):
+    """
+    A committed change waiting for the outbox sinks (see ``api/outbox.py``).
+    Written by model signals in the same database transaction as the
+    change; ``id`` orders the log. Company and branch are plain ids so an
+    event survives the deletion it describes.
+    """
+    event_type = models.CharField(max_length=50)
+    company_id = models.UUIDField(null=True, blank=True)
+    branch_id = models.UUIDField(null=True, blank=True)
+    object_id = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"#{self.pk} {self.event_type} {self.object_id}"
+
+
+class OutboxOffset(models.Model):
+    """How far one outbox sink has delivered the log (the id of its last event)."""
+    sink = models.CharField(max_length=50, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.sink} at #{self.position}"
@@ -0,0 +1,245 @@
+"""
+Transactional outbox for change events.
+
+Model signals call ``record`` while the change is still inside its database
+transaction (``Item``, ``Transaction`` and ``CompanyMembership`` saves and
+deletes are atomic), so an ``OutboxEvent`` exists exactly when the change
+committed, and nothing is delivered from the request itself.
+
+``dispatch`` (``manage.py dispatch_outbox``) then feeds the log to every
+sink in ``OUTBOX_SINKS``, in id order and in batches. Each sink has an
+``OutboxOffset`` row holding the id of the last event it handled; the
+dispatcher locks it with ``SELECT ... FOR UPDATE SKIP LOCKED`` while it
+delivers, so several dispatchers share the sinks without delivering a batch
+twice (on SQLite there is no row locking: run one). A sink that raises keeps
+its offset and gets the same batch again on the next pass, so delivery is at
+least once; event ids are stable for receivers to drop repeats.
+
+Ids are allocated at insert but become visible at commit, so a slow
+transaction can commit an id below one already read. A gap in the ids is
+therefore only skipped once the event after it is ``OUTBOX_COMMIT_GRACE``
+seconds old (ids of rolled-back inserts never fill in).
+
+A sink is a class whose ``deliver(events)`` raises on failure, with an
+optional ``event_types`` tuple of the event type prefixes it wants; three
+are built in below.
+"""
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import realtime, response_cache
+from .metrics import registry
+from .models import OutboxEvent, OutboxOffset
+
+try:
+    from channels.layers import InMemoryChannelLayer, get_channel_layer
+except ImportError:  # pragma: no cover - optional dependency
+    InMemoryChannelLayer = get_channel_layer = None
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return getattr(settings, 'OUTBOX_ENABLED', False)
+
+
+def delivers_live():
+    """Whether a configured sink publishes live updates, so writes must not publish them too."""
+    return enabled() and any(
+        issubclass(import_string(path), ChannelLayerSink) for path in getattr(settings, 'OUTBOX_SINKS', {}).values()
+    )
+
+
+def record(event_type, obj, payload, company_id=None, branch_id=None, using='default'):
+    """Append an event for ``obj``; call inside the transaction that changed it."""
+    OutboxEvent.objects.using(using).create(
+        event_type=event_type, object_id=str(obj.pk), payload=payload,
+        company_id=company_id, branch_id=branch_id,
+    )
+
+
+def event_data(event):
+    return {
+        'id': event.pk,
+        'type': event.event_type,
+        'at': event.created_at,
+        'company': event.company_id,
+        'branch': event.branch_id,
+        'object_id': event.object_id,
+        'data': event.payload,
+    }
+
+
+class Sink:
+    """Base sink: receives every event type unless ``event_types`` is set."""
+    event_types = None
+
+    def accepts(self, event):
+        return self.event_types is None or event.event_type.startswith(self.event_types)
+
+    def deliver(self, events):
+        raise NotImplementedError
+
+
+class ChannelLayerSink(Sink):
+    """
+    Publishes item, transaction and holding events to the live-update groups
+    (``api.realtime``). The dispatcher is a process of its own, so the
+    channel layer has to be shared with the ASGI servers.
+    """
+    event_types = ('item.', 'transaction.', 'holding.')
+
+    def __init__(self):
+        layer = get_channel_layer() if get_channel_layer else None
+        if layer is None or isinstance(layer, InMemoryChannelLayer):
+            raise ImproperlyConfigured(
+                'ChannelLayerSink needs a channel layer shared between processes (set REDIS_URL); '
+                'without one, leave it out of OUTBOX_SINKS and writes publish live updates themselves.'
+            )
+
+    def deliver(self, events):
+        for event in events:
+            message = realtime.make_event(
+                event.event_type, event.payload, event.branch_id, event_id=f'outbox-{event.pk}', at=event.created_at,
+            )
+            realtime.send(realtime.groups(event.branch_id, event.company_id), message)
+
+
+class CacheInvalidationSink(Sink):
+    """
+    Bumps response cache scope versions. Writes already bump them from
+    ``on_commit`` for read-your-writes; this repeats it from the log, which
+    still happens if the writing process died between commit and callback.
+    """
+
+    def deliver(self, events):
+        for company_id in {event.company_id for event in events if event.company_id}:
+            response_cache.bump_company(company_id)
+        for user_id in {event.payload.get('user') for event in events if event.event_type.startswith('membership.')}:
+            if user_id:
+                response_cache.bump_user(user_id)
+
+
+class WebhookSink(Sink):
+    """
+    POSTs each batch as ``{"events": [...]}`` to ``OUTBOX_WEBHOOK_URL``. With
+    ``OUTBOX_WEBHOOK_SECRET`` set, ``X-Outbox-Signature`` carries the
+    hex HMAC-SHA256 of the body.
+    """
+
+    def __init__(self, url=None, secret=None, timeout=None, session=None):
+        self.url = url or getattr(settings, 'OUTBOX_WEBHOOK_URL', '')
+        self.secret = secret if secret is not None else getattr(settings, 'OUTBOX_WEBHOOK_SECRET', '')
+        self.timeout = timeout or getattr(settings, 'OUTBOX_WEBHOOK_TIMEOUT', 5.0)
+        self.session = session or requests.Session()
+
+    def deliver(self, events):
+        body = json.dumps({'events': [event_data(event) for event in events]}, cls=JSONEncoder).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.secret:
+            headers['X-Outbox-Signature'] = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def load_sinks(names=None):
+    """``{name: sink}`` for ``OUTBOX_SINKS`` (``{name: dotted class path}``), optionally only ``names``."""
+    configured = getattr(settings, 'OUTBOX_SINKS', {})
+    unknown = set(names or ()) - set(configured)
+    if unknown:
+        raise ValueError(f'Unknown outbox sink(s): {", ".join(sorted(unknown))}.')
+    return {name: import_string(path)() for name, path in configured.items() if not names or name in names}
+
+
+def ready_events(position, batch_size, grace, now, using='default'):
+    """Events after ``position`` in id order, stopping at a gap that may still be filled."""
+    events = list(OutboxEvent.objects.using(using).filter(id__gt=position).order_by('id')[:batch_size])
+    cutoff = now - grace
+    ready, expected = [], position + 1
+    for event in events:
+        if event.pk != expected and event.created_at > cutoff:
+            break
+        ready.append(event)
+        expected = event.pk + 1
+    return ready
+
+
+def _deliver(name, sink, batch_size, max_attempts, grace, now, using):
+    offsets = OutboxOffset.objects.using(using)
+    offset = offsets.select_for_update(skip_locked=True).filter(sink=name).first()
+    if offset is None:
+        return 'locked', 0
+    events = ready_events(offset.position, batch_size, grace, now, using)
+    if not events:
+        return 'idle', 0
+
+    wanted = [event for event in events if sink.accepts(event)]
+    try:
+        if wanted:
+            sink.deliver(wanted)
+        result = 'delivered'
+    except Exception as exc:
+        offset.attempts += 1
+        offset.last_error = str(exc)[:1000]
+        if offset.attempts < max_attempts:
+            logger.warning('Outbox sink %s failed on events %s-%s (attempt %s): %s',
+                           name, events[0].pk, events[-1].pk, offset.attempts, exc)
+            offset.save(update_fields=['attempts', 'last_error', 'updated_at'])
+            registry.inc('api_outbox_events_total', (name, 'retry'), len(wanted))
+            return 'retry', len(events)
+        logger.error('Outbox sink %s dropped events %s-%s after %s attempts: %s',
+                     name, events[0].pk, events[-1].pk, offset.attempts, exc)
+        result = 'dropped'
+
+    offset.position = events[-1].pk
+    offset.attempts = 0
+    if result == 'delivered':
+        offset.last_error = ''
+    offset.save(update_fields=['position', 'attempts', 'last_error', 'updated_at'])
+    registry.inc('api_outbox_events_total', (name, result), len(wanted))
+    return result, len(events)
+
+
+def dispatch(sinks, batch_size=500, max_attempts=10, grace=None, now=None, using='default'):
+    """
+    Hand the next batch of the log to each of ``sinks`` (``{name: sink}``).
+    Returns ``{name: (result, event count)}``; the result is ``delivered``,
+    ``retry``, ``dropped`` (after ``max_attempts`` failures), ``idle`` or
+    ``locked`` (another dispatcher holds the sink).
+    """
+    now = now or timezone.now()
+    if grace is None:
+        grace = datetime.timedelta(seconds=getattr(settings, 'OUTBOX_COMMIT_GRACE', 10))
+    offsets = OutboxOffset.objects.using(using)
+    outcome = {}
+    for name, sink in sinks.items():
+        offsets.get_or_create(sink=name)
+        with transaction.atomic(using=using):
+            outcome[name] = _deliver(name, sink, batch_size, max_attempts, grace, now, using)
+    return outcome
+
+
+def prune(sink_names, retention=None, now=None, using='default'):
+    """Delete events every sink in ``sink_names`` has handled and that are older than ``retention``."""
+    if retention is None:
+        retention = datetime.timedelta(seconds=getattr(settings, 'OUTBOX_RETENTION', 86400))
+    offsets = OutboxOffset.objects.using(using).filter(sink__in=sink_names)
+    if offsets.count() < len(set(sink_names)):
+        return 0
+    position = offsets.aggregate(position=Min('position'))['position'] or 0
+    deleted, _ = OutboxEvent.objects.using(using).filter(
+        id__lte=position, created_at__lt=(now or timezone.now()) - retention,
+    ).delete()
+    return deleted
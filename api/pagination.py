@@ -0,0 +1,38 @@
+"""
+Keyset (cursor) pagination.
+
+Unlike page-number pagination, the database seeks straight to the cursor
+position with an indexed ``WHERE`` instead of counting and skipping rows, so
+late pages cost the same as the first one.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Cursor pagination that existing clients opt into: responses are only
+    paginated when the request sends ``cursor`` or ``page_size``, so callers
+    expecting a plain list keep getting one.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class UserCursorPagination(OptionalCursorPagination):
+    # username is unique, so it alone is a stable keyset.
+    ordering = 'username'
+
+
+class HoldingCursorPagination(OptionalCursorPagination):
+    ordering = ('oldest_withdrawn_at', 'id')
+
+
+class OverdueCursorPagination(OptionalCursorPagination):
+    ordering = ('due_at', 'id')
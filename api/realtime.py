@@ -0,0 +1,115 @@
+"""
+Live stock, transaction and overdue loan events over Django Channels.
+
+Events go to the branch group and the company group of the change, never
+before the write committed: when the outbox has a live sink
+(``api.outbox.ChannelLayerSink``, which needs the Redis channel layer) its
+dispatcher sends them, otherwise the ``Item`` and ``Transaction`` signals
+(and the overdue sweep's ``holdings_overdue``) in ``api/signals.py`` call
+``publish``, which sends from
+``transaction.on_commit``. ``api/consumers.py`` subscribes WebSocket
+clients to those groups.
+
+Payloads are plain JSON types so any channel layer can carry them. Each
+event has an ``id``: a client subscribed to both a company and one of its
+branches receives the same event twice and should drop the repeat (the
+consumer does).
+"""
+import logging
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    from channels.layers import get_channel_layer
+except ImportError:  # pragma: no cover - optional dependency
+    get_channel_layer = None
+
+logger = logging.getLogger(__name__)
+
+# Message type routed to LiveUpdatesConsumer.live_event().
+MESSAGE_TYPE = 'live.event'
+
+
+def branch_group(branch_id):
+    return f'branch.{branch_id}'
+
+
+def company_group(company_id):
+    return f'company.{company_id}'
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def groups(branch_id, company_id):
+    return [branch_group(branch_id), company_group(company_id)] if branch_id else [company_group(company_id)]
+
+
+def make_event(event_type, data, branch_id, event_id=None, at=None):
+    return {
+        'id': event_id or uuid.uuid4().hex,
+        'type': event_type,
+        'at': (at or timezone.now()).isoformat(),
+        'branch': str(branch_id) if branch_id else None,
+        'data': data,
+    }
+
+
+def send(groups, event):
+    """Send ``event`` to ``groups`` now; failures are logged, not raised."""
+    layer = get_channel_layer() if get_channel_layer else None
+    if layer is None:
+        return
+    message = {'type': MESSAGE_TYPE, 'event': event}
+    try:
+        for group in groups:
+            async_to_sync(layer.group_send)(group, message)
+    except Exception:
+        # A broken layer must not fail the write that already committed.
+        logger.warning('Could not publish %s event', event['type'], exc_info=True)
+
+
+def publish(event_type, data, branch_id, company_id, using='default'):
+    """Send ``data`` to the branch and company groups after the current transaction commits."""
+    event = make_event(event_type, data, branch_id)
+    targets = groups(branch_id, company_id)
+    transaction.on_commit(lambda: send(targets, event), using=using)
+
+
+def item_data(item):
+    return {
+        'id': str(item.pk),
+        'item_id': item.item_id,
+        'name': item.name,
+        'status': item.status,
+        'stock_quantity': item.stock_quantity,
+        'minimum_stock': item.minimum_stock,
+    }
+
+
+def transaction_data(txn):
+    return {
+        'id': str(txn.pk),
+        'reference_number': txn.reference_number,
+        'transaction_type': txn.transaction_type,
+        'quantity': txn.quantity,
+        'timestamp': _iso(txn.timestamp),
+        'item': str(txn.item_id),
+        'user': str(txn.user_id),
+    }
+
+
+def holding_data(holding):
+    return {
+        'id': str(holding.pk),
+        'item': str(holding.item_id),
+        'user': str(holding.user_id),
+        'quantity': holding.quantity,
+        'oldest_withdrawn_at': _iso(holding.oldest_withdrawn_at),
+        'due_at': _iso(holding.due_at),
+        'overdue_at': _iso(holding.overdue_at),
+    }
@@ -0,0 +1,69 @@
+"""
+JSON renderer backed by orjson, falling back to DRF's stdlib renderer.
+
+``FastJSONRenderer`` follows ``rest_framework``'s ``JSONRenderer`` (compact
+separators, UTF-8, DRF's encoding of datetimes, decimals and lazy strings,
+U+2028/U+2029 escaped) but encodes natively. When orjson is not installed,
+or an indented, non-compact or ASCII-only (``UNICODE_JSON = False``) response
+is requested, it defers to the parent.
+
+One difference remains: orjson writes NaN and +/-Infinity as ``null`` where
+the parent, with ``STRICT_JSON`` on, raises ``ValueError``. Detecting them
+would mean walking every payload in Python, which costs as much as the stdlib
+encoder, so non-finite floats must be kept out of serializer output instead.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# JSON allows these raw, JavaScript string literals do not; DRF escapes them.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+# Datetimes and subclasses of builtins go through DRF's encoder so the output
+# matches JSONRenderer (e.g. 'Z' rather than '+00:00' for UTC).
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` that uses orjson when it is available."""
+
+    _default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if (self.get_indent(accepted_media_type, renderer_context or {})
+                or not self.compact or self.ensure_ascii):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=self._default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # Integers beyond 64 bits and other types orjson refuses outright.
+            return super().render(data, accepted_media_type, renderer_context)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in content:
+                content = content.replace(raw, escaped)
+        return content
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """
+    Newline-delimited JSON (``application/x-ndjson``). Views that support it
+    stream one object per line themselves; this renders anything else (errors,
+    single objects) as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        content = super().render(data, accepted_media_type, renderer_context)
+        return content + b'\n' if content else content
@@ -0,0 +1,160 @@
+"""
+Response cache for read-heavy GET endpoints, keyed by access scope.
+
+A cached JSON response is stored under the view name, query string, caller
+and the caller's *scope version*: a version number for the user and
+for every company they belong to (developers, who see every company, use a
+global version instead). Model signals bump the versions of the scope a
+change belongs to once the write commits, so old entries are never read
+again and expire on their own. Versions and responses live in the
+``default`` cache; with more than one worker it must be shared (Redis), or
+each process only sees its own invalidations.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .metrics import registry
+
+GLOBAL_VERSION_KEY = 'scope:v:global'
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+def _company_key(company_id):
+    return f'scope:v:company:{company_id}'
+
+
+def _user_key(user_id):
+    return f'scope:v:user:{user_id}'
+
+
+def _user_companies_key(user_id):
+    return f'scope:companies:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def bump_versions(*keys):
+    """Move each version key in the default cache to a value it never had before."""
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Missing (never set or evicted): start from a fresh value so a
+            # reset can never line up with a version that was used before.
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_company(company_id):
+    """Bump a company's scope version (and the global one) now."""
+    bump_versions(_company_key(company_id), GLOBAL_VERSION_KEY)
+
+
+def bump_user(user_id):
+    """Bump a user's scope version and forget their cached company list now."""
+    cache.delete(_user_companies_key(user_id))
+    bump_versions(_user_key(user_id), GLOBAL_VERSION_KEY)
+
+
+def invalidate_company(company_id, using='default'):
+    """``bump_company`` after the current transaction commits."""
+    if company_id is not None:
+        transaction.on_commit(lambda: bump_company(company_id), using=using)
+
+
+def invalidate_user(user_id, using='default'):
+    """``bump_user`` after the current transaction commits."""
+    transaction.on_commit(lambda: bump_user(user_id), using=using)
+
+
+def _user_company_ids(user):
+    key = _user_companies_key(user.pk)
+    company_ids = cache.get(key)
+    if company_ids is None:
+        company_ids = sorted(str(pk) for pk in user.company_memberships.values_list('company_id', flat=True).distinct())
+        cache.set(key, company_ids, None)
+    return company_ids
+
+
+def read_versions(keys):
+    """The current values of version ``keys`` as strings, initialising missing ones."""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, time.time_ns(), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [str(versions.get(key)) for key in keys]
+
+
+def scope_version(request):
+    """The caller's scope version: user, then every company they can read."""
+    user = request.user
+    if user.global_user_level == 'DEVELOPER':
+        keys = [_user_key(user.pk), GLOBAL_VERSION_KEY]
+    else:
+        company_ids = _user_company_ids(user)
+        requested = request.query_params.get('company')
+        if requested and requested not in company_ids:
+            company_ids = company_ids + [requested]
+        keys = [_user_key(user.pk)] + [_company_key(company_id) for company_id in company_ids]
+    return ':'.join(read_versions(keys))
+
+
+class CachedResponseMixin:
+    """
+    Serves JSON GET responses from the cache. Add to views whose payload
+    depends only on the caller and models that invalidate their scope in
+    ``api/signals.py``. The lookup runs after authentication and permission
+    checks. ``X-Cache`` reports HIT or MISS; lookups are counted in
+    ``api_response_cache_total``.
+    """
+    cache_timeout = None
+    response_cache_key = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method != 'GET' or request.accepted_renderer.format != 'json':
+            return
+
+        view_name = request.resolver_match.view_name if request.resolver_match else type(self).__name__
+        raw = '|'.join([view_name, request.get_full_path(), str(request.user.pk), scope_version(request)])
+        key = f'response:{hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()}'
+
+        cached = cache.get(key)
+        registry.inc('api_response_cache_total', (view_name, 'miss' if cached is None else 'hit'))
+        if cached is None:
+            self.response_cache_key = key
+            return
+
+        content, content_type, headers = cached
+        response = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers['Last-Modified']) if 'Last-Modified' in headers else None,
+        ) or HttpResponse(content, content_type=content_type)
+        for name, value in headers.items():
+            response[name] = value
+        response['X-Cache'] = 'HIT'
+        # dispatch() looks the handler up after initial(), so this replaces the
+        # view's own get() for this request only.
+        self.get = lambda request, *args, **kwargs: response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.response_cache_key:
+            response['X-Cache'] = 'MISS'
+            if response.status_code == 200 and hasattr(response, 'render'):
+                response.render()
+                headers = {name: response[name] for name in CACHED_HEADERS if name in response}
+                timeout = self.cache_timeout if self.cache_timeout is not None else _timeout()
+                cache.set(self.response_cache_key, (response.content, response['Content-Type'], headers), timeout)
+        return response
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from .consumers import LiveUpdatesConsumer
+from .feeds import TransactionStreamConsumer
+
+http_urlpatterns = [
+    path('api/transactions/stream/', TransactionStreamConsumer.as_asgi()),
+]
+
+websocket_urlpatterns = [
+    path('ws/live/', LiveUpdatesConsumer.as_asgi()),
+]
@@ -0,0 +1,260 @@
+"""
+In-process index of scan codes, one per company.
+
+``resolve`` answers "which item does this scanned code name, and may the
+caller scan it?" from memory. A company's index maps every code one of its
+items can be scanned by to ``(item id, branch id)``:
+
+* its ``barcode_number``, then its ``item_id`` (printed as the barcode when
+  there is no barcode number), then its short code, the first eight hex
+  digits of its UUID when no other item in the company shares them;
+* its UUID, which QR codes carry as ``item:<uuid>`` (``scanning.parse_code``
+  turns both forms into a ``uuid.UUID`` key, so they never collide with the
+  string codes).
+
+Next to the indexes, each user's scope (the ``analytics.accessible_branches``
+rules: managed companies and assigned branches) is kept the same way.
+
+Both are loaded on first use and tagged with version keys in the default
+cache, which ``api/signals.py`` bumps after a commit that changes what they
+hold: item creation and deletion, a change to an item's codes or branch
+(stock changes do not count), any branch save or delete, and a user's or
+their memberships' saves and deletes. Every lookup reads the versions it
+relies on in one cache round trip and reloads whatever is stale, so with a
+shared cache (Redis) every worker sees a change once it commits. Writes that
+skip model signals (``QuerySet.update``, raw SQL) are only picked up once the
+index or scope is ``SCAN_INDEX_MAX_AGE`` seconds old and reloaded anyway. As a
+per-process cache never sees another worker's bumps, ``SCAN_INDEX_ENABLED``
+defaults to off unless ``REDIS_URL`` is set. Developers, whose scope is every
+company, are not indexed: ``resolve`` returns ``UNINDEXED`` for them and
+callers query the database.
+
+At most ``SCAN_INDEX_MAX_COMPANIES`` indexes are kept per process, the least
+recently used one is dropped first. ``api_scan_index_bytes`` and
+``api_scan_index_codes`` report each company's footprint, the bytes estimated
+with ``sys.getsizeof`` over the dict, its keys and values.
+"""
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .metrics import registry
+from .models import CompanyMembership, CustomUser, Item
+from .response_cache import bump_versions, read_versions
+
+GLOBAL_VERSION_KEY = 'scan:v:global'
+UNINDEXED = object()
+SHORT_CODE_LENGTH = 8
+
+_lock = threading.Lock()
+_indexes = OrderedDict()  # (alias, company id) -> CompanyIndex
+_scopes = OrderedDict()  # (alias, user id) -> Scope
+
+
+def _company_key(company_id):
+    return f'scan:v:company:{company_id}'
+
+
+def _user_key(user_id):
+    return f'scan:v:user:{user_id}'
+
+
+def enabled():
+    return getattr(settings, 'SCAN_INDEX_ENABLED', False)
+
+
+def _max_companies():
+    return getattr(settings, 'SCAN_INDEX_MAX_COMPANIES', 1000)
+
+
+def _current(entry, version):
+    """Whether a held index or scope is at ``version`` and younger than ``SCAN_INDEX_MAX_AGE``."""
+    return (entry is not None and entry.version == version
+            and time.monotonic() - entry.loaded_at < getattr(settings, 'SCAN_INDEX_MAX_AGE', 300))
+
+
+def invalidate_company(company_id, using='default'):
+    """Reload ``company_id``'s index after the current transaction commits."""
+    transaction.on_commit(lambda: bump_versions(_company_key(company_id)), using=using)
+
+
+def invalidate_user(user_id, using='default'):
+    """Reload ``user_id``'s scope after the current transaction commits."""
+    transaction.on_commit(lambda: bump_versions(_user_key(user_id)), using=using)
+
+
+def invalidate_all(using='default'):
+    """Reload every index and scope after the current transaction commits."""
+    transaction.on_commit(lambda: bump_versions(GLOBAL_VERSION_KEY), using=using)
+
+
+class CompanyIndex:
+    __slots__ = ('version', 'loaded_at', 'codes', 'nbytes')
+
+    def __init__(self, version, codes):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.codes = codes
+        self.nbytes = _footprint(codes)
+
+
+class Scope:
+    """A user's managed companies and assigned branches; ``branches`` holds (branch, company) pairs."""
+    __slots__ = ('version', 'loaded_at', 'developer', 'managed', 'branches', 'companies')
+
+    def __init__(self, version, developer=False, managed=(), branches=()):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.developer = developer
+        self.managed = frozenset(managed)
+        self.branches = frozenset(branch_id for branch_id, _ in branches)
+        self.companies = sorted(self.managed | {company_id for _, company_id in branches}, key=str)
+
+
+def _sizeof(obj):
+    # A UUID's value is an int held outside the object.
+    return sys.getsizeof(obj) + (sys.getsizeof(obj.int) if isinstance(obj, uuid.UUID) else 0)
+
+
+def _footprint(codes):
+    seen, total = set(), sys.getsizeof(codes)
+    for key, entries in codes.items():
+        for obj in (key, entries, *entries, *(part for entry in entries for part in entry)):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += _sizeof(obj)
+    return total
+
+
+def build(company_id, using='default'):
+    """``{code: ((item id, branch id), ...)}`` for every item of ``company_id``; one query."""
+    rows = Item.objects.using(using).filter(branch__company_id=company_id).values_list(
+        'id', 'branch_id', 'barcode_number', 'item_id',
+    )
+    branches, items = {}, []
+    for pk, branch_id, barcode_number, item_id in rows:
+        # One tuple per item and one UUID per branch, shared by all their keys.
+        entries = ((pk, branches.setdefault(branch_id, branch_id)),)
+        items.append((entries, barcode_number, item_id))
+
+    codes = {entries[0][0]: entries for entries, _, _ in items}
+    for entries, barcode_number, _ in items:
+        if barcode_number:
+            # Unique per branch only: a company can hold several.
+            codes[barcode_number] = codes[barcode_number] + entries if barcode_number in codes else entries
+    for entries, _, item_id in items:
+        if item_id:
+            codes.setdefault(item_id, entries)
+    short_codes = defaultdict(list)
+    for entries, _, _ in items:
+        short_codes[entries[0][0].hex[:SHORT_CODE_LENGTH]].append(entries)
+    for short_code, matches in short_codes.items():
+        if len(matches) == 1:
+            codes.setdefault(short_code, matches[0])
+    return codes
+
+
+def load_scope(user_id, version, using='default'):
+    """``user_id``'s ``Scope``; empty for an inactive or unknown user."""
+    level = CustomUser.objects.using(using).filter(pk=user_id, is_active=True).values_list(
+        'global_user_level', flat=True,
+    ).first()
+    if level is None:
+        return Scope(version)
+    if level == 'DEVELOPER':
+        return Scope(version, developer=True)
+    memberships = list(CompanyMembership.objects.using(using).filter(user_id=user_id).values_list(
+        'company_id', 'role', 'branch_id', 'branch__company_id',
+    ))
+    managed = {company_id for company_id, role, _, _ in memberships if role in ('SUPERVISOR', 'OWNER')}
+    branches = {(branch_id, company_id) for _, _, branch_id, company_id in memberships if branch_id}
+    return Scope(version, managed=managed, branches=branches)
+
+
+def _remember(cache, key, value, limit=None):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        evicted = []
+        while limit is not None and len(cache) > limit:
+            evicted.append(cache.popitem(last=False)[0])
+    return evicted
+
+
+def _report(company_id, index):
+    labels = (str(company_id),)
+    registry.set_gauge('api_scan_index_bytes', labels, index.nbytes if index else None)
+    registry.set_gauge('api_scan_index_codes', labels, len(index.codes) if index else None)
+
+
+def company_index(company_id, version, using='default'):
+    """``company_id``'s index at ``version``, (re)built if this process holds another or an expired one."""
+    key = (using, company_id)
+    with _lock:
+        index = _indexes.get(key)
+        if _current(index, version):
+            _indexes.move_to_end(key)
+            return index
+    index = CompanyIndex(version, build(company_id, using))
+    for _, evicted in _remember(_indexes, key, index, _max_companies()):
+        _report(evicted, None)
+    _report(company_id, index)
+    return index
+
+
+def resolve(user_id, code, using='default'):
+    """
+    ``(item id, branch id)`` for a parsed scan ``code`` (see
+    ``scanning.parse_code``) that ``user_id`` may scan, ``None`` if there is
+    none, or ``UNINDEXED`` when the caller has to ask the database.
+    """
+    if not enabled():
+        return UNINDEXED
+    user_id = uuid.UUID(str(user_id))
+    scope_key = (using, user_id)
+    scope = _scopes.get(scope_key)
+    # Read the versions before loading anything, so a change that commits
+    # while loading leaves a newer version behind.
+    keys = [GLOBAL_VERSION_KEY, _user_key(user_id)]
+    keys += [_company_key(company_id) for company_id in (scope.companies if scope else ())]
+    versions = dict(zip(keys, read_versions(keys)))
+    global_version = versions[GLOBAL_VERSION_KEY]
+    scope_version = (global_version, versions[_user_key(user_id)])
+    if not _current(scope, scope_version):
+        scope = load_scope(user_id, scope_version, using)
+        _remember(_scopes, scope_key, scope, 10 * _max_companies())  # users outnumber companies
+        missing = [_company_key(company_id) for company_id in scope.companies]
+        missing = [key for key in missing if key not in versions]
+        versions.update(zip(missing, read_versions(missing)))
+    if scope.developer:
+        return UNINDEXED
+
+    for company_id in scope.companies:
+        index = company_index(company_id, (global_version, versions[_company_key(company_id)]), using)
+        for pk, branch_id in index.codes.get(code, ()):
+            if company_id in scope.managed or branch_id in scope.branches:
+                return pk, branch_id
+    return None
+
+
+def stats():
+    """``[{'company', 'codes', 'bytes'}]`` for the indexes this process holds."""
+    with _lock:
+        held = list(_indexes.items())
+    return [{'company': company_id, 'codes': len(index.codes), 'bytes': index.nbytes}
+            for (_, company_id), index in held]
+
+
+def clear():
+    """Forget every index and scope held by this process."""
+    with _lock:
+        companies = [company_id for _, company_id in _indexes]
+        _indexes.clear()
+        _scopes.clear()
+    for company_id in companies:
+        _report(company_id, None)
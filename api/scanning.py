@@ -0,0 +1,158 @@
+"""
+Async fast path for item scans.
+
+``POST /api/items/scan/`` takes the same ``{"type": "barcode"|"qr",
+"value": ...}`` body as ``items/scan_code/`` and answers with a slim item
+payload. The whole request is one query: the access token is validated
+without loading the user, and ``scan_queryset`` resolves the code, the
+caller's scope (the ``analytics.accessible_branches`` rules, written
+against the token's user id, which also requires the user to be active) and
+the branch and category names in a single joined ``SELECT``, awaited through
+the async ORM.
+
+A barcode that matches no ``barcode_number`` or ``item_id`` may be a short
+code, the first eight hex digits of an item's UUID; ``find`` then takes a
+second query for the item whose id starts with it, provided no other item
+of its company does (the rule ``scan_index`` applies).
+
+``lookup`` goes through ``api.scan_index`` first, which resolves and
+authorizes the code in memory; only the item row is then read, by primary
+key, and with ``?slim=1`` not even that: the answer is just the item and
+branch ids. Developers are not indexed and take the ``find`` query.
+
+``manage.py benchmark scan`` compares its latency with ``items/scan_code/``.
+"""
+import json
+import re
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.db.models import Exists, F, OuterRef, Q
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import scan_index
+from .models import CompanyMembership, CustomUser, Item
+
+SCAN_FIELDS = ['id', 'item_id', 'name', 'status', 'stock_quantity', 'minimum_stock', 'barcode_number', 'branch_id']
+SCAN_NAMES = {'branch_name': F('branch__name'), 'category_name': F('category__name')}
+SHORT_CODE_RE = re.compile(r'[0-9a-f]{%d}' % scan_index.SHORT_CODE_LENGTH)
+
+
+def parse_code(scan_type, value):
+    """The value to look ``scan_type`` up by; ``None`` if it cannot match any item."""
+    if scan_type == 'barcode':
+        return value
+    # QR codes hold "item:<uuid>" (Item.generate_qr); bare UUIDs are accepted too.
+    try:
+        return uuid.UUID(value.removeprefix('item:'))
+    except ValueError:
+        return None
+
+
+def scope_filter(user_id):
+    """Items ``user_id`` may scan, as one condition over subqueries."""
+    active = CustomUser.objects.filter(pk=user_id, is_active=True)
+    memberships = CompanyMembership.objects.filter(user_id=user_id, user__is_active=True)
+    return (
+        Exists(active.filter(global_user_level='DEVELOPER'))
+        | Q(branch__company_id__in=memberships.filter(role__in=['SUPERVISOR', 'OWNER']).values('company_id'))
+        | Q(branch_id__in=memberships.filter(branch__isnull=False).values('branch_id'))
+    )
+
+
+def scan_queryset(user_id, scan_type, code):
+    """Slim rows of the items in ``user_id``'s scope matching a parsed code."""
+    # Items without a barcode number print their item_id as the barcode.
+    codes = Q(barcode_number=code) | Q(item_id=code) if scan_type == 'barcode' else Q(id=code)
+    return Item.objects.filter(codes, scope_filter(user_id)).values(*SCAN_FIELDS, **SCAN_NAMES)
+
+
+def short_code_queryset(user_id, code):
+    """Slim rows of the items in ``user_id``'s scope a short ``code`` names."""
+    # A UUID range over the primary key index, on both its uuid and char(32) storage.
+    prefix = (code.ljust(32, '0'), code.ljust(32, 'f'))
+    shared = Item.objects.filter(id__range=prefix, branch__company_id=OuterRef('branch__company_id'))
+    return Item.objects.filter(scope_filter(user_id), id__range=prefix).exclude(
+        Exists(shared.exclude(pk=OuterRef('pk'))),
+    ).values(*SCAN_FIELDS, **SCAN_NAMES)
+
+
+def row_queryset(pk):
+    """The slim row of item ``pk``, whatever the caller's scope."""
+    return Item.objects.filter(pk=pk).values(*SCAN_FIELDS, **SCAN_NAMES)
+
+
+def _payload(item):
+    if item is not None:
+        item['branch'] = item.pop('branch_id')
+    return item
+
+
+async def find(user_id, scan_type, code, using='default'):
+    """The first ``scan_queryset`` row as a dict, or ``None``; one query, two for an unknown short code."""
+    item = await scan_queryset(user_id, scan_type, code).using(using).afirst()
+    if item is None and scan_type == 'barcode' and SHORT_CODE_RE.fullmatch(code):
+        item = await short_code_queryset(user_id, code).using(using).afirst()
+    return _payload(item)
+
+
+async def lookup(user_id, scan_type, code, slim=False, using='default'):
+    """
+    ``find`` through ``scan_index``: the code is resolved without a query
+    and the row read by id, or only ``{'id', 'branch'}`` returned if ``slim``.
+    """
+    found = await sync_to_async(scan_index.resolve)(user_id, code, using)
+    if found is scan_index.UNINDEXED:
+        item = await find(user_id, scan_type, code, using)
+        return {'id': item['id'], 'branch': item['branch']} if slim and item else item
+    if found is None or slim:
+        return found and {'id': found[0], 'branch': found[1]}
+    return _payload(await row_queryset(found[0]).using(using).afirst())
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+class ItemScanView(View):
+    """Resolve a scanned barcode or QR code to an item in the caller's scope."""
+    http_method_names = ['post']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Bearer-token API: no cookies, so no CSRF exposure (as DRF views).
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request):
+        header = request.headers.get('Authorization', '').split()
+        if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+            return _error('Authentication credentials were not provided.', 401)
+        try:
+            token = JWTAuthentication().get_validated_token(header[1])
+            user_id = token[jwt_settings.USER_ID_CLAIM]
+        except (InvalidToken, TokenError, KeyError):
+            return _error('Given token not valid for any token type', 401)
+
+        try:
+            body = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        except ValueError:
+            return _error('Request body is not valid JSON.', 400)
+        if not hasattr(body, 'get'):
+            return _error('Both type and value are required', 400)
+        scan_type, value = body.get('type'), body.get('value')
+        if not scan_type or not value or not isinstance(value, str):
+            return _error('Both type and value are required', 400)
+        if scan_type not in ('barcode', 'qr'):
+            return _error('Invalid scan type. Use "barcode" or "qr"', 400)
+
+        code = parse_code(scan_type, value)
+        slim = request.GET.get('slim') in ('1', 'true')
+        item = await lookup(user_id, scan_type, code, slim) if code is not None else None
+        if item is None:
+            return _error(f'Item not found with this {scan_type}', 404)
+        return JsonResponse(item)
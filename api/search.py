@@ -0,0 +1,142 @@
+"""
+Item search backends.
+
+PostgreSQL uses a weighted ``tsvector`` document plus ``pg_trgm`` word
+similarity, both served by the GIN indexes created in migration 0039. The
+``%>`` operator matches at ``pg_trgm.word_similarity_threshold``, which
+``configure_connection`` sets to ``TRIGRAM_THRESHOLD`` on every new
+connection.
+SQLite (local development) uses an FTS5 trigram table kept in sync from the
+``Item`` save/delete signals. Any other database falls back to DRF's
+``icontains`` search.
+"""
+import logging
+
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_item_fts'
+# Minimum word similarity for a typo-tolerant name match (pg_trgm's default is 0.6).
+TRIGRAM_THRESHOLD = 0.3
+
+
+def item_search_vector():
+    """The weighted document indexed by ``api_item_search_vector_gin``."""
+    from django.contrib.postgres.search import SearchVector
+    return (
+        SearchVector('name', config='simple', weight='A')
+        + SearchVector('item_id', config='simple', weight='A')
+        + SearchVector('description', config='simple', weight='B')
+    )
+
+
+class PostgresItemSearch:
+    """Full-text ranking with trigram typo tolerance on the item name."""
+
+    def search(self, queryset, term):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+        query = SearchQuery(term, config='simple', search_type='websearch')
+        queryset = queryset.annotate(
+            search_document=item_search_vector(),
+            search_similarity=TrigramWordSimilarity(term, 'name'),
+        )
+        return queryset.filter(
+            Q(search_document=query)
+            | Q(name__trigram_word_similar=term)
+            | Q(item_id__icontains=term)
+        ).annotate(
+            search_rank=SearchRank(F('search_document'), query) + F('search_similarity'),
+        ).order_by('-search_rank', 'name')
+
+
+class SQLiteItemSearch:
+    """FTS5 trigram search; substrings of three or more characters are indexed."""
+
+    def search(self, queryset, term):
+        words = term.split()
+        match_words = [word for word in words if len(word) >= 3]
+        # Trigram tokens cannot match words shorter than three characters.
+        for word in words:
+            if len(word) < 3:
+                queryset = queryset.filter(
+                    Q(name__icontains=word) | Q(item_id__icontains=word) | Q(description__icontains=word)
+                )
+        if not match_words:
+            return queryset
+        match = ' '.join('"%s"' % word.replace('"', '""') for word in match_words)
+        table = queryset.model._meta.db_table
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT item_pk FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND item_pk = "{table}"."id"',
+                [match],
+            ),
+        ).order_by('-search_rank', 'name')
+
+    @staticmethod
+    def index(item, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE item_pk = %s', [item.pk.hex])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (item_pk, name, item_id, description) VALUES (%s, %s, %s, %s)',
+                [item.pk.hex, item.name, item.item_id or '', item.description or ''],
+            )
+
+    @staticmethod
+    def unindex(item, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE item_pk = %s', [item.pk.hex])
+
+
+def configure_connection(connection):
+    """
+    Apply ``TRIGRAM_THRESHOLD`` to ``%>`` for the session. Search querysets are
+    evaluated lazily, outside any transaction a ``SET LOCAL`` could live in.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(TRIGRAM_THRESHOLD)],
+            )
+
+
+def get_backend(using='default'):
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        return PostgresItemSearch()
+    if vendor == 'sqlite':
+        return SQLiteItemSearch()
+    return None
+
+
+def sync_item(item, using='default', deleted=False):
+    """Keep the SQLite FTS table in step with ``item``; other vendors index in place."""
+    if connections[using].vendor != 'sqlite':
+        return
+    try:
+        if deleted:
+            SQLiteItemSearch.unindex(item, using)
+        else:
+            SQLiteItemSearch.index(item, using)
+    except DatabaseError:
+        logger.exception('Could not update %s for item %s', FTS_TABLE, item.pk)
+
+
+class ItemSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for ``SearchFilter`` on item endpoints. Results are
+    ordered by relevance; ``search_fields`` is only used by the fallback.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').replace('\x00', '').strip()
+        backend = get_backend(queryset.db)
+        if not term or backend is None:
+            return super().filter_queryset(request, queryset, view)
+        return backend.search(queryset, term)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import CustomUser, Item, Transaction, Company, Branch, CompanyMembership, Category
+from django.db.models import Prefetch, prefetch_related_objects
+from .models import CustomUser, Holding, Item, ItemForecast, Transaction, Company, Branch, CompanyMembership, Category
+from .fieldsets import SparseFieldsetSerializerMixin
 import logging
 
 User = get_user_model()
@@ -16,25 +18,51 @@ class CompanySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Company
-        fields = ['id', 'name', 'owner', 'description', 'logo', 'contact_info', 'email', 'location', 'created_at']
+        fields = ['id', 'name', 'owner', 'description', 'logo', 'contact_info', 'email', 'location', 'time_zone', 'alert_webhook_url', 'created_at']
         read_only_fields = ['id', 'owner', 'created_at']
+        # Webhook URLs usually embed a token; never echo them to members.
+        extra_kwargs = {'alert_webhook_url': {'write_only': True}}
 
 class BranchSerializer(serializers.ModelSerializer):
     """Serializer for the Branch model."""
     company = serializers.StringRelatedField()
     company_name = serializers.CharField(source='company.name', read_only=True)
     manager_name = serializers.SerializerMethodField()
+    item_count = serializers.SerializerMethodField()
+    low_stock_count = serializers.SerializerMethodField()
+    out_of_stock_count = serializers.SerializerMethodField()
+    active_member_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Branch
-        fields = ['id', 'name', 'company', 'company_name', 'description', 'is_active', 'manager_name']
+        fields = [
+            'id', 'name', 'company', 'company_name', 'description', 'is_active', 'manager_name',
+            'item_count', 'low_stock_count', 'out_of_stock_count', 'active_member_count',
+        ]
+
+    def _stats(self, obj):
+        # List and detail views load branches through Branch.objects.with_stats();
+        # anything else (e.g. a branch just created) is annotated here, once.
+        if not hasattr(obj, 'item_count'):
+            stats = Branch.objects.with_stats().filter(pk=obj.pk).values(*Branch.STAT_FIELDS).first() or {}
+            for name in Branch.STAT_FIELDS:
+                setattr(obj, name, stats.get(name, 0 if name.endswith('_count') else None))
+        return obj
 
     def get_manager_name(self, obj):
-        manager = CompanyMembership.objects.filter(
-            branch=obj,
-            role='BRANCH_MANAGER'
-        ).first()
-        return manager.user.username if manager else None
+        return self._stats(obj).manager_username
+
+    def get_item_count(self, obj):
+        return self._stats(obj).item_count
+
+    def get_low_stock_count(self, obj):
+        return self._stats(obj).low_stock_count
+
+    def get_out_of_stock_count(self, obj):
+        return self._stats(obj).out_of_stock_count
+
+    def get_active_member_count(self, obj):
+        return self._stats(obj).active_member_count
 
 class CompanyMembershipSerializer(serializers.ModelSerializer):
     """Serializer for assigning users to companies."""
@@ -64,8 +92,8 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
             company = instance.company if instance else None
 
             # Log validation data
-            logger.info(f"Validating data: {data}")
-            logger.info(f"Current instance: {instance.__dict__ if instance else None}")
+            logger.debug('Validating data: %s', data)
+            logger.debug('Current instance: %s', instance.__dict__ if instance else None)
 
             # Validate branch belongs to company if provided
             if 'branch' in data and data['branch']:
@@ -91,12 +119,12 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
 
             return data
         except Exception as e:
-            logger.error(f"Error in validate: {str(e)}")
+            logger.error('Error in validate: %s', e)
             raise
 
     def update(self, instance, validated_data):
         try:
-            logger.info(f"Starting update with validated data: {validated_data}")
+            logger.debug('Starting update with validated data: %s', validated_data)
             
             # Get the new role and branch
             new_role = validated_data.get('role', instance.role)
@@ -104,7 +132,7 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
             
             # If changing to branch manager
             if new_role == 'BRANCH_MANAGER' and new_branch:
-                logger.info(f"Handling branch manager assignment for branch: {new_branch.id}")
+                logger.info('Handling branch manager assignment for branch: %s', new_branch.id)
                 
                 # Find any existing manager for this branch
                 existing_manager = CompanyMembership.objects.filter(
@@ -113,7 +141,7 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
                 ).exclude(id=instance.id).first()
                 
                 if existing_manager:
-                    logger.info(f"Found existing manager: {existing_manager.user.username}")
+                    logger.info('Found existing manager: %s', existing_manager.user.username)
                     existing_manager.role = 'USER'
                     existing_manager.save()
                     logger.info("Demoted existing manager to USER")
@@ -124,13 +152,13 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
             
             # Save the instance
             instance.save()
-            logger.info(f"Successfully updated membership: {instance.id}")
+            logger.info('Successfully updated membership: %s', instance.id)
             
             return instance
         except Exception as e:
-            logger.error(f"Error in update: {str(e)}")
-            logger.error(f"Error type: {type(e)}")
-            logger.error(f"Error args: {e.args}")
+            logger.error('Error in update: %s', e)
+            logger.error('Error type: %s', type(e))
+            logger.error('Error args: %s', e.args)
             raise
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -173,11 +201,26 @@ class AdminUserSerializer(serializers.ModelSerializer):
             'profile_picture', 'qr_code', 'memberships_display', 'memberships'
         ]
 
+    @staticmethod
+    def memberships_prefetch():
+        """Prefetch for list views; both membership fields read from it."""
+        return Prefetch(
+            'company_memberships',
+            queryset=CompanyMembership.objects.select_related('company', 'branch'),
+        )
+
+    def _memberships(self, obj):
+        # Instances loaded without memberships_prefetch() (e.g. the detail
+        # view) are prefetched here, once for both fields.
+        if 'company_memberships' not in getattr(obj, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([obj], self.memberships_prefetch())
+        return obj.company_memberships.all()
+
     def get_memberships_display(self, obj):
         # Return a list of strings like "Company (Role) - Branch"
         return [
             f"{m.company.name} ({m.role})" + (f" - {m.branch.name}" if m.branch else "")
-            for m in obj.company_memberships.select_related('company', 'branch').all()
+            for m in self._memberships(obj)
         ]
 
     def get_memberships(self, obj):
@@ -188,10 +231,10 @@ class AdminUserSerializer(serializers.ModelSerializer):
                 'branch_name': m.branch.name if m.branch else None,
                 'role': m.role
             }
-            for m in obj.company_memberships.select_related('company', 'branch').all()
+            for m in self._memberships(obj)
         ]
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for the Item model."""
     branch_name = serializers.CharField(source='branch.name', read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
@@ -204,10 +247,16 @@ class ItemSerializer(serializers.ModelSerializer):
         model = Item
         fields = [
             'id', 'name', 'item_id', 'branch', 'branch_name', 'description', 'category', 'category_name',
-            'status', 'stock_quantity', 'original_stock_quantity', 'minimum_stock', 'barcode_number',
+            'status', 'stock_quantity', 'original_stock_quantity', 'minimum_stock', 'loan_period_days', 'barcode_number',
             'barcode', 'qr_code', 'photo', 'created_at', 'updated_at', 'created_by', 'created_by_username'
         ]
         read_only_fields = ['id', 'qr_code', 'barcode', 'created_at', 'updated_at', 'status', 'created_by', 'created_by_username', 'category_name', 'original_stock_quantity', 'item_id']
+        # select_related paths each field reads, used to prune joins for ?fields= / ?omit=
+        field_relations = {
+            'branch_name': ['branch'],
+            'category_name': ['category'],
+            'created_by_username': ['created_by'],
+        }
 
     def create(self, validated_data):
         # Set original_stock_quantity to stock_quantity if not provided
@@ -215,7 +264,42 @@ class ItemSerializer(serializers.ModelSerializer):
             validated_data['original_stock_quantity'] = validated_data.get('stock_quantity', 0)
         return super().create(validated_data)
 
-class TransactionSerializer(serializers.ModelSerializer):
+class ItemForecastSerializer(serializers.ModelSerializer):
+    """Stored forecast next to the item's current stock."""
+    item_name = serializers.CharField(source='item.name', read_only=True)
+    item_code = serializers.CharField(source='item.item_id', read_only=True)
+    branch = serializers.UUIDField(source='item.branch_id', read_only=True)
+    branch_name = serializers.CharField(source='item.branch.name', read_only=True)
+    current_stock = serializers.IntegerField(source='item.stock_quantity', read_only=True)
+    minimum_stock = serializers.IntegerField(source='item.minimum_stock', read_only=True)
+    needs_reorder = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ItemForecast
+        fields = [
+            'item', 'item_name', 'item_code', 'branch', 'branch_name', 'current_stock', 'minimum_stock',
+            'daily_consumption', 'daily_consumption_std', 'stock_quantity', 'days_until_stockout',
+            'reorder_point', 'needs_reorder', 'history_days', 'computed_at',
+        ]
+
+    def get_needs_reorder(self, obj):
+        return obj.item.stock_quantity <= obj.reorder_point
+
+class HoldingSerializer(serializers.ModelSerializer):
+    """Outstanding units of an item held by a user."""
+    username = serializers.CharField(source='user.username', read_only=True)
+    item_name = serializers.CharField(source='item.name', read_only=True)
+    item_code = serializers.CharField(source='item.item_id', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+
+    class Meta:
+        model = Holding
+        fields = [
+            'id', 'user', 'username', 'item', 'item_name', 'item_code', 'branch', 'branch_name',
+            'quantity', 'oldest_withdrawn_at', 'last_withdrawn_at', 'due_at', 'overdue_at',
+        ]
+
+class TransactionSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for the Transaction model."""
     user_name = serializers.CharField(source='user.username', read_only=True)
     user_full_name = serializers.SerializerMethodField()
@@ -234,6 +318,7 @@ class TransactionSerializer(serializers.ModelSerializer):
     company_location = serializers.CharField(source='branch.company.location', read_only=True, allow_null=True)
     company_logo = serializers.ImageField(source='branch.company.logo', read_only=True, allow_null=True)
     reference_number = serializers.CharField(read_only=True)
+    due_at = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = Transaction
@@ -241,12 +326,31 @@ class TransactionSerializer(serializers.ModelSerializer):
             'id', 'user_name', 'user_full_name', 'user_id_number', 'user_department', 'user_level',
             'item', 'item_name', 'item_id', 'item_category', 'item_status', 'item_stock_quantity',
             'branch', 'branch_name', 'company_name', 'company_contact_info', 'company_email', 'company_location', 'company_logo',
-            'transaction_type', 'quantity', 'timestamp', 'notes', 'reference_number'
+            'transaction_type', 'quantity', 'timestamp', 'due_at', 'notes', 'reference_number'
         ]
         extra_kwargs = {
             'item': {'write_only': True},
             'branch': {'write_only': True},
         }
+        # select_related paths each field reads, used to prune joins for ?fields= / ?omit=
+        field_relations = {
+            'user_name': ['user'],
+            'user_full_name': ['user'],
+            'user_id_number': ['user'],
+            'user_department': ['user'],
+            'user_level': ['user'],
+            'item_name': ['item'],
+            'item_id': ['item'],
+            'item_category': ['item__category'],
+            'item_status': ['item'],
+            'item_stock_quantity': ['item'],
+            'branch_name': ['branch'],
+            'company_name': ['branch__company'],
+            'company_contact_info': ['branch__company'],
+            'company_email': ['branch__company'],
+            'company_location': ['branch__company'],
+            'company_logo': ['branch__company'],
+        }
 
     def get_user_full_name(self, obj):
         """Get the user's full name or username if full name is not available."""
@@ -275,5 +379,5 @@ class TransactionSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'company', 'branch', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'company', 'branch', 'loan_period_days', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
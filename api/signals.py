@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import alerts, loans, outbox, realtime, response_cache, scan_index, search
+from .models import (
+    Branch, Category, Company, CompanyMembership, CustomUser, Holding, Item, Transaction, TransactionDailyRollup,
+)
+
+
+@receiver(connection_created)
+def configure_search(sender, connection, **kwargs):
+    search.configure_connection(connection)
+
+
+@receiver(post_save, sender=Item)
+def index_item(sender, instance, using, **kwargs):
+    search.sync_item(instance, using=using)
+
+
+@receiver(post_save, sender=Item)
+def alert_on_status_change(sender, instance, created, using, **kwargs):
+    # Item.save() updates _saved_status only after the post_save receivers ran.
+    previous_status = getattr(instance, '_saved_status', None)
+    if not created and previous_status is not None:
+        alerts.record_status_change(instance, previous_status, using=using)
+
+
+@receiver(post_delete, sender=Item)
+def unindex_item(sender, instance, using, **kwargs):
+    search.sync_item(instance, using=using, deleted=True)
+
+
+@receiver(post_save, sender=CompanyMembership)
+@receiver(post_delete, sender=CompanyMembership)
+def touch_company_branches(sender, instance, using, **kwargs):
+    # Branch lists show the branch manager; bump updated_at so their ETags change.
+    Branch.objects.using(using).filter(company_id=instance.company_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_scope(sender, instance, using, **kwargs):
+    response_cache.invalidate_company(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_owning_company_scope(sender, instance, using, **kwargs):
+    response_cache.invalidate_company(instance.company_id, using=using)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_branch_scope(sender, instance, using, **kwargs):
+    # The branch is normally already loaded on the instance.
+    response_cache.invalidate_company(instance.branch.company_id, using=using)
+
+
+@receiver(post_save, sender=CompanyMembership)
+@receiver(post_delete, sender=CompanyMembership)
+def invalidate_membership_scope(sender, instance, using, **kwargs):
+    response_cache.invalidate_company(instance.company_id, using=using)
+    response_cache.invalidate_user(instance.user_id, using=using)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_scope(sender, instance, using, **kwargs):
+    response_cache.invalidate_user(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_scan_codes(sender, instance, using, created=False, **kwargs):
+    # Item.save() updates _saved_scan_codes only after the post_save receivers ran.
+    saved = getattr(instance, '_saved_scan_codes', None)
+    if kwargs['signal'] is post_save and not created and saved == instance.scan_codes():
+        return
+    if saved is not None and saved[2] != instance.branch_id:
+        # Moved branches, maybe into another company.
+        scan_index.invalidate_all(using=using)
+    else:
+        scan_index.invalidate_company(instance.branch.company_id, using=using)
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def invalidate_branch_scan_codes(sender, instance, using, **kwargs):
+    # Indexes and scopes file branches under their company.
+    scan_index.invalidate_all(using=using)
+
+
+@receiver(post_save, sender=CompanyMembership)
+@receiver(post_delete, sender=CompanyMembership)
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_scan_scope(sender, instance, using, **kwargs):
+    scan_index.invalidate_user(instance.user_id if sender is CompanyMembership else instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_rollup(sender, instance, using, **kwargs):
+    # Inserts are rolled up in Transaction.save(), inside its transaction.
+    if getattr(settings, 'TRANSACTION_ROLLUP_INLINE', True):
+        TransactionDailyRollup.record(instance, sign=-1)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_holdings(sender, instance, using, **kwargs):
+    Holding.record(instance, sign=-1)
+
+
+def _publish(event_type, instance, data, using):
+    company_id = instance.branch.company_id
+    if outbox.enabled():
+        outbox.record(event_type, instance, data, company_id=company_id, branch_id=instance.branch_id, using=using)
+    if not outbox.delivers_live():
+        realtime.publish(event_type, data, instance.branch_id, company_id, using=using)
+
+
+@receiver(post_save, sender=Item)
+def publish_item_change(sender, instance, created, using, **kwargs):
+    _publish('item.created' if created else 'item.updated', instance, realtime.item_data(instance), using)
+
+
+@receiver(post_delete, sender=Item)
+def publish_item_deletion(sender, instance, using, **kwargs):
+    _publish('item.deleted', instance, realtime.item_data(instance), using)
+
+
+@receiver(post_save, sender=Transaction)
+def publish_transaction(sender, instance, created, using, **kwargs):
+    if created:
+        _publish('transaction.created', instance, realtime.transaction_data(instance), using)
+
+
+@receiver(post_delete, sender=Transaction)
+def publish_transaction_deletion(sender, instance, using, **kwargs):
+    _publish('transaction.deleted', instance, realtime.transaction_data(instance), using)
+
+
+@receiver(loans.holdings_overdue)
+def publish_overdue_holdings(sender, holdings, using, **kwargs):
+    for holding in holdings:
+        _publish('holding.overdue', holding, realtime.holding_data(holding), using)
+
+
+@receiver(post_save, sender=CompanyMembership)
+@receiver(post_delete, sender=CompanyMembership)
+def record_membership_change(sender, instance, using, **kwargs):
+    if outbox.enabled():
+        event_type = 'membership.deleted' if kwargs['signal'] is post_delete else 'membership.saved'
+        outbox.record(event_type, instance, {
+            'id': str(instance.pk),
+            'user': str(instance.user_id),
+            'company': str(instance.company_id),
+            'role': instance.role,
+            'branch': str(instance.branch_id) if instance.branch_id else None,
+        }, company_id=instance.company_id, branch_id=instance.branch_id, using=using)
@@ -0,0 +1,106 @@
+"""
+Branch transaction statistics computed with a fixed number of grouped queries.
+
+``branch_statistics`` answers for any number of branches with four queries:
+the branches, per-branch counts (conditional ``COUNT(... FILTER ...)``), the
+top items per branch (a ``ROW_NUMBER()`` window over grouped counts) and the
+number of distinct users across all of them.
+
+When the range is made of whole days (``all``, ``month``, ``year``) the
+figures come from ``TransactionDailyRollup``, so the cost follows the number
+of (branch, item, user, day, type) combinations rather than of transactions.
+Ranges that start mid-day are answered from ``Transaction`` rows.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .models import Transaction, TransactionDailyRollup
+
+
+def _rollup_covers(start_date, end_date):
+    """Whether whole days in ``TIME_ZONE`` answer ``[start_date, end_date]`` exactly."""
+    if start_date is None and end_date is None:
+        return True
+    if start_date is None or end_date is None:
+        return False
+    # Nothing is recorded after now, so a range ending today can include all of today.
+    return (
+        timezone.localtime(start_date).time() == datetime.time.min
+        and timezone.localdate(end_date) >= timezone.localdate()
+    )
+
+
+def _source(branches, start_date, end_date):
+    """The rows to aggregate and the expression counting transactions in them."""
+    if _rollup_covers(start_date, end_date):
+        rows = TransactionDailyRollup.objects.filter(branch__in=branches)
+        if start_date is not None:
+            rows = rows.filter(day__gte=timezone.localdate(start_date))
+        return rows, lambda **extra: Coalesce(Sum('count', **extra), 0)
+    rows = Transaction.objects.filter(branch__in=branches)
+    if start_date and end_date:
+        rows = rows.filter(timestamp__range=[start_date, end_date])
+    return rows, lambda **extra: Count('id', **extra)
+
+
+def branch_statistics(branches, start_date=None, end_date=None, top_items=5):
+    """
+    Return ``(stats, summary)`` for ``branches`` (a Branch queryset) over the
+    optional ``[start_date, end_date]`` range. ``stats`` has one dict per branch
+    (including branches without transactions), most transactions first;
+    ``summary`` totals them, counting each user once however many branches
+    they used.
+    """
+    transactions, count = _source(branches, start_date, end_date)
+
+    counts = {
+        row['branch']: row
+        for row in transactions.order_by().values('branch').annotate(
+            total_transactions=count(),
+            withdrawals=count(filter=Q(transaction_type='WITHDRAW')),
+            returns=count(filter=Q(transaction_type='RETURN')),
+            unique_users=Count('user', distinct=True),
+        )
+    }
+
+    top = defaultdict(list)
+    # The window goes in its own annotate(): in the same call as the
+    # aggregate, Django adds it to GROUP BY.
+    ranked = transactions.order_by().values('branch', 'item__name').annotate(
+        transaction_count=count(),
+    ).annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=F('branch'),
+            order_by=(F('transaction_count').desc(), F('item__name').asc()),
+        ),
+    ).filter(rank__lte=top_items).order_by('branch', 'rank')
+    for row in ranked:
+        top[row['branch']].append({'item_name': row['item__name'], 'transaction_count': row['transaction_count']})
+
+    stats = []
+    for branch in branches.order_by('company__name', 'name').values('id', 'name', 'company__name'):
+        row = counts.get(branch['id'], {})
+        stats.append({
+            'branch_id': branch['id'],
+            'branch_name': branch['name'],
+            'company_name': branch['company__name'],
+            'total_transactions': row.get('total_transactions', 0),
+            'withdrawals': row.get('withdrawals', 0),
+            'returns': row.get('returns', 0),
+            'unique_users': row.get('unique_users', 0),
+            'top_items': top.get(branch['id'], []),
+        })
+    stats.sort(key=lambda stat: stat['total_transactions'], reverse=True)
+
+    summary = {
+        'total_transactions': sum(stat['total_transactions'] for stat in stats),
+        'total_withdrawals': sum(stat['withdrawals'] for stat in stats),
+        'total_returns': sum(stat['returns'] for stat in stats),
+        'total_unique_users': transactions.aggregate(users=Count('user', distinct=True))['users'],
+    }
+    return stats, summary
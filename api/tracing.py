@@ -0,0 +1,257 @@
+"""
+Sampled SQL tracing with slow-query capture.
+
+When tracing is enabled, ``SQLTraceMiddleware`` wraps every connection for
+the duration of a request. A ``SQL_TRACE_SAMPLE_RATE`` fraction of requests
+have all of their queries captured; on every other request only queries
+slower than ``SQL_TRACE_SLOW_MS`` are kept. Each captured query records the
+view name and the ``api/`` frames that issued it, and slow ``SELECT``s can
+optionally be ``EXPLAIN``ed.
+
+Both the runtime configuration and the captures live in the default cache,
+so with a shared cache (Redis) ``SQLTraceView`` reconfigures and reads every
+worker at once: the config carries a version that each process re-reads at
+most every ``SQL_TRACE_CONFIG_REFRESH`` seconds, and a request's captures are
+appended to a ring buffer of ``SQL_TRACE_BUFFER_SIZE`` entries whose ids
+come from one cache counter. With a per-process cache both are per process.
+"""
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+API_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# Execute wrappers, not callers.
+_SKIP_FILES = {os.path.join(API_DIR, 'tracing.py'), os.path.join(API_DIR, 'metrics.py')}
+MAX_ORIGIN_FRAMES = 5
+MAX_SQL_LENGTH = 4000
+MAX_PARAMS_LENGTH = 500
+
+CONFIG_KEY = 'sqltrace:config'
+SEQUENCE_KEY = 'sqltrace:seq'
+FLOOR_KEY = 'sqltrace:floor'
+
+
+def _entry_key(entry_id):
+    return f'sqltrace:entry:{entry_id}'
+
+
+class TraceConfig:
+    """
+    Runtime-adjustable tracing settings; starts from the ``SQL_TRACE_*``
+    settings and follows the version stored under ``CONFIG_KEY``.
+    """
+
+    fields = ('enabled', 'sample_rate', 'slow_ms', 'explain')
+
+    def __init__(self):
+        self._checked = float('-inf')
+        self._apply(None)
+
+    def _apply(self, stored):
+        if stored is None:
+            stored = {
+                'enabled': getattr(settings, 'SQL_TRACE_ENABLED', False),
+                'sample_rate': getattr(settings, 'SQL_TRACE_SAMPLE_RATE', 0.0),
+                'slow_ms': getattr(settings, 'SQL_TRACE_SLOW_MS', 100.0),
+                'explain': getattr(settings, 'SQL_TRACE_EXPLAIN', False),
+                'version': 0,
+            }
+        for name in self.fields + ('version',):
+            setattr(self, name, stored[name])
+
+    def stale(self):
+        return time.monotonic() - self._checked >= getattr(settings, 'SQL_TRACE_CONFIG_REFRESH', 1.0)
+
+    def refresh(self, force=False):
+        """Pick up a configuration stored by another process."""
+        if force or self.stale():
+            self._checked = time.monotonic()
+            stored = cache.get(CONFIG_KEY)
+            if (stored or {}).get('version', 0) != self.version:
+                self._apply(stored)
+
+    def update(self, enabled=None, sample_rate=None, slow_ms=None, explain=None):
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError('sample_rate must be between 0 and 1')
+        if slow_ms is not None and slow_ms < 0:
+            raise ValueError('slow_ms must not be negative')
+        self.refresh(force=True)
+        for name, value in (('enabled', enabled), ('sample_rate', sample_rate),
+                            ('slow_ms', slow_ms), ('explain', explain)):
+            if value is not None:
+                setattr(self, name, value)
+        self.version = time.time_ns()
+        cache.set(CONFIG_KEY, {**self.as_dict(), 'version': self.version}, None)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.fields}
+
+
+class TraceBuffer:
+    """Ring buffer of captured queries in the default cache; the oldest entries fall off."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def extend(self, entries):
+        if not entries:
+            return
+        cache.add(SEQUENCE_KEY, 0, None)
+        last = cache.incr(SEQUENCE_KEY, len(entries))
+        first = last - len(entries) + 1
+        for entry_id, entry in enumerate(entries, first):
+            entry['id'] = entry_id
+        cache.set_many({_entry_key(entry['id']): entry for entry in entries}, None)
+        evicted = range(max(first - self.size, 1), last - self.size + 1)
+        if evicted:
+            cache.delete_many([_entry_key(entry_id) for entry_id in evicted])
+
+    def entries(self, since=0, slow_only=False):
+        last = cache.get(SEQUENCE_KEY, 0)
+        ids = range(max(since, cache.get(FLOOR_KEY, 0), last - self.size) + 1, last + 1)
+        found = cache.get_many([_entry_key(entry_id) for entry_id in ids])
+        entries = [found.get(_entry_key(entry_id)) for entry_id in ids]
+        return [entry for entry in entries if entry and (entry['slow'] or not slow_only)]
+
+    def clear(self):
+        cache.set(FLOOR_KEY, cache.get(SEQUENCE_KEY, 0), None)
+
+
+config = TraceConfig()
+buffer = TraceBuffer(getattr(settings, 'SQL_TRACE_BUFFER_SIZE', 500))
+
+
+def _origin(frame):
+    """``file:line in function`` for the innermost ``api/`` frames that are not execute wrappers."""
+    origin = []
+    while frame is not None and len(origin) < MAX_ORIGIN_FRAMES:
+        filename = frame.f_code.co_filename
+        if filename.startswith(API_DIR) and filename not in _SKIP_FILES:
+            origin.append(f'{os.path.relpath(filename, os.path.dirname(API_DIR[:-1]))}:'
+                          f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return origin
+
+
+def _truncate(value, limit):
+    return value if len(value) <= limit else value[:limit] + '...'
+
+
+class _RequestTracer:
+    """``execute_wrapper`` that captures sampled and slow queries for one request."""
+
+    def __init__(self, request, sampled, slow_seconds, explain):
+        self.request = request
+        self.sampled = sampled
+        self.slow_seconds = slow_seconds
+        self.explain = explain
+        self.entries = []
+        self._explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            slow = duration >= self.slow_seconds
+            if slow or self.sampled:
+                self.capture(sql, params, many, context['connection'], duration, slow)
+
+    def capture(self, sql, params, many, connection, duration, slow):
+        match = getattr(self.request, 'resolver_match', None)
+        entry = {
+            'timestamp': timezone.now().isoformat(),
+            'view': (match.view_name if match else None) or 'unmatched',
+            'method': self.request.method,
+            'path': self.request.path,
+            'database': connection.alias,
+            'sql': _truncate(sql, MAX_SQL_LENGTH),
+            'params': _truncate(repr(params), MAX_PARAMS_LENGTH),
+            'many': many,
+            'duration_ms': round(duration * 1000, 3),
+            'slow': slow,
+            'sampled': self.sampled,
+            'origin': _origin(sys._getframe()),
+            'explain': None,
+        }
+        if slow and self.explain and not many and sql.lstrip()[:6].upper() == 'SELECT':
+            entry['explain'] = self.run_explain(connection, sql, params)
+        self.entries.append(entry)
+        if slow:
+            logger.warning('Slow query in %s (%.1f ms)', entry['view'], entry['duration_ms'],
+                           extra={'origin': entry['origin'][:1]})
+
+    def run_explain(self, connection, sql, params):
+        self._explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+        except DatabaseError as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            self._explaining = False
+
+
+class SQLTraceMiddleware:
+    """Attaches a ``_RequestTracer`` to every connection while tracing is enabled."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config.refresh()
+        if not config.enabled:
+            return self.get_response(request)
+        tracer = self.tracer(request)
+        with self.tracing(tracer):
+            response = self.get_response(request)
+        buffer.extend(tracer.entries)
+        return response
+
+    async def __acall__(self, request):
+        if config.stale():
+            await sync_to_async(config.refresh)()
+        if not config.enabled:
+            return await self.get_response(request)
+        tracer = self.tracer(request)
+        with self.tracing(tracer):
+            response = await self.get_response(request)
+        if tracer.entries:
+            await sync_to_async(buffer.extend)(tracer.entries)
+        return response
+
+    def tracer(self, request):
+        return _RequestTracer(
+            request,
+            sampled=random.random() < config.sample_rate,
+            slow_seconds=config.slow_ms / 1000,
+            explain=config.explain,
+        )
+
+    def tracing(self, tracer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(tracer))
+        return stack
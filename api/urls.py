@@ -13,10 +13,16 @@ from .views import (
     ItemListView,
     ItemDetailView,
     ItemScanCodeView,
+    ItemForecastListView,
+    ItemExportView,
     ItemUpdateOriginalStockView,
     AddStockView,
     RemoveStockView,
     TransactionListView,
+    TransactionExportView,
+    HoldingListView,
+    MyHoldingsView,
+    OverdueHoldingListView,
     AllBranchesListView,
     AllItemsListView,
     CreateUserWithMembershipsView,
@@ -26,8 +32,14 @@ from .views import (
     CategoryDetailView,
     UserBranchesListView,
     TransactionReceiptView,
-    BranchStatisticsView
+    BranchStatisticsView,
+    DashboardView,
+    TransactionTimeSeriesView,
+    SQLTraceView
 )
+from .feeds import TransactionStreamView
+from .metrics import metrics_view
+from .scanning import ItemScanView
 
 urlpatterns = [
     # User Management
@@ -52,11 +64,19 @@ urlpatterns = [
     # Inventory & Transactions
     path('items/', ItemListView.as_view(), name='item-list'),
     path('items/scan_code/', ItemScanCodeView.as_view(), name='item-scan-code'),
+    path('items/scan/', ItemScanView.as_view(), name='item-scan'),
+    path('items/forecast/', ItemForecastListView.as_view(), name='item-forecast'),
+    path('items/export/', ItemExportView.as_view(), name='item-export'),
     path('items/<uuid:pk>/', ItemDetailView.as_view(), name='item-detail'),
     path('items/<uuid:item_id>/update-original-stock/', ItemUpdateOriginalStockView.as_view(), name='item-update-original-stock'),
     path('items/<uuid:pk>/add_stock/', AddStockView.as_view(), name='item-add-stock'),
     path('items/<uuid:pk>/remove_stock/', RemoveStockView.as_view(), name='item-remove-stock'),
     path('transactions/', TransactionListView.as_view(), name='transaction-list'),
+    path('transactions/export/', TransactionExportView.as_view(), name='transaction-export'),
+    path('transactions/stream/', TransactionStreamView.as_view(), name='transaction-stream'),
+    path('holdings/', HoldingListView.as_view(), name='holding-list'),
+    path('holdings/mine/', MyHoldingsView.as_view(), name='my-holdings'),
+    path('holdings/overdue/', OverdueHoldingListView.as_view(), name='overdue-holdings'),
     path('transactions/<uuid:id>/receipt/', TransactionReceiptView.as_view(), name='transaction-receipt'),
 
     # Category CRUD
@@ -69,6 +89,14 @@ urlpatterns = [
 
     # Branch Statistics
     path('branch-statistics/', BranchStatisticsView.as_view(), name='branch-statistics'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+
+    # Analytics
+    path('analytics/timeseries/', TransactionTimeSeriesView.as_view(), name='analytics-timeseries'),
 
     path('qr-login/', QRLoginView.as_view(), name='qr-login'),
+
+    # Monitoring
+    path('metrics/', metrics_view, name='metrics'),
+    path('sql-trace/', SQLTraceView.as_view(), name='sql-trace'),
 ]
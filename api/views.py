@@ -2,13 +2,24 @@ from django.contrib.auth import get_user_model
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Item, Transaction, Company, Branch, CompanyMembership, Category
+from .models import Holding, Item, ItemForecast, Transaction, Company, Branch, CompanyMembership, Category
 from .serializers import (
     ItemSerializer, TransactionSerializer, UserProfileSerializer,
     UserRegistrationSerializer, CompanySerializer, BranchSerializer,
-    AdminUserSerializer, CompanyMembershipSerializer, CategorySerializer
+    AdminUserSerializer, CompanyMembershipSerializer, CategorySerializer, ItemForecastSerializer,
+    HoldingSerializer,
 )
 from .permissions import IsBossDeveloper, IsCompanyOwner, IsSupervisor
+from .search import ItemSearchFilter
+from .fieldsets import SparseFieldsetMixin
+from .conditional import ConditionalListMixin
+from .response_cache import CachedResponseMixin
+from .pagination import HoldingCursorPagination, OverdueCursorPagination, UserCursorPagination
+from .exports import ITEM_COLUMNS, TRANSACTION_COLUMNS, StreamingExportMixin
+from .statistics import branch_statistics
+from .renderers import NDJSONRenderer
+from . import analytics, dashboard, scan_index, tracing
+from .scanning import parse_code
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework import serializers
@@ -20,8 +31,14 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from rest_framework.decorators import action
 from rest_framework.generics import RetrieveAPIView
-from django.db.models import Count, Q
+from django.db.models import Count, Exists, F, OuterRef, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 from datetime import datetime, timedelta
 
 User = get_user_model()
@@ -36,7 +53,7 @@ class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
 
-class UserProfileView(generics.RetrieveAPIView):
+class UserProfileView(CachedResponseMixin, generics.RetrieveAPIView):
     """Endpoint to retrieve the profile of the currently authenticated user."""
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -45,20 +62,26 @@ class UserProfileView(generics.RetrieveAPIView):
         return self.request.user
 
 class UserListView(generics.ListAPIView):
-    """Endpoint for admins/developers to list users."""
+    """
+    Endpoint for admins/developers to list users. Send ``page_size`` (or a
+    ``cursor`` from a previous page) for keyset pagination by username.
+    """
     serializer_class = AdminUserSerializer
     permission_classes = [permissions.IsAuthenticated, IsBossDeveloper | IsCompanyOwner]
     filter_backends = [filters.SearchFilter]
+    # Trigram-indexed on PostgreSQL (migration 0040).
     search_fields = ['username', 'email', 'first_name', 'last_name', 'id_number']
+    pagination_class = UserCursorPagination
 
     def get_queryset(self):
         user = self.request.user
+        users = User.objects.prefetch_related(AdminUserSerializer.memberships_prefetch())
         if user.global_user_level == 'DEVELOPER':
-            return User.objects.all()
+            return users
         
         # Company owners can see users in their companies
-        owned_companies = Company.objects.filter(owner=user)
-        return User.objects.filter(company_memberships__company__in=owned_companies).distinct()
+        in_owned_company = CompanyMembership.objects.filter(user=OuterRef('pk'), company__owner=user)
+        return users.filter(Exists(in_owned_company))
 
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
@@ -67,7 +90,7 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # --- Company & Branch Management Views ---
 
-class CompanyListView(generics.ListCreateAPIView):
+class CompanyListView(CachedResponseMixin, generics.ListCreateAPIView):
     """Endpoint for listing companies or creating a new one."""
     serializer_class = CompanySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -75,10 +98,10 @@ class CompanyListView(generics.ListCreateAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.global_user_level == 'DEVELOPER':
-            return Company.objects.all()
+            return Company.objects.select_related('owner')
         
         # Return companies the user is a member of
-        return Company.objects.filter(members__id=user.id)
+        return Company.objects.filter(members__id=user.id).select_related('owner')
 
     def perform_create(self, serializer):
         company = serializer.save(owner=self.request.user)
@@ -102,7 +125,7 @@ class BranchListView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         company_id = self.kwargs['company_id']
-        return Branch.objects.filter(company_id=company_id)
+        return Branch.objects.with_stats().filter(company_id=company_id)
 
     def perform_create(self, serializer):
         company_id = self.kwargs['company_id']
@@ -117,7 +140,7 @@ class BranchDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         company_id = self.kwargs['company_id']
-        return Branch.objects.filter(company_id=company_id)
+        return Branch.objects.with_stats().filter(company_id=company_id)
 
 class AllBranchesListView(generics.ListAPIView):
     """
@@ -125,7 +148,7 @@ class AllBranchesListView(generics.ListAPIView):
     """
     serializer_class = BranchSerializer
     permission_classes = [permissions.IsAuthenticated, IsBossDeveloper]
-    queryset = Branch.objects.select_related('company').all()
+    queryset = Branch.objects.with_stats()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['company'] # Filter by company ID: /api/all-branches/?company=1
     search_fields = ['name', 'company__name'] # Search by branch or company name
@@ -139,7 +162,7 @@ class CompanyMembershipView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         company_id = self.kwargs['company_id']
-        return CompanyMembership.objects.filter(company_id=company_id)
+        return CompanyMembership.objects.filter(company_id=company_id).select_related('user', 'company', 'branch')
 
     def perform_create(self, serializer):
         company_id = self.kwargs['company_id']
@@ -171,16 +194,16 @@ class CompanyMembershipDetailView(generics.RetrieveUpdateDestroyAPIView):
                         message="Only DEVELOPER can assign SUPERVISOR role."
                     )
             
-            logger.info(f"Updating membership {serializer.instance.id}")
-            logger.info(f"Request data: {self.request.data}")
-            logger.info(f"Current instance state: {serializer.instance.__dict__}")
+            logger.info('Updating membership %s', serializer.instance.id)
+            logger.debug('Request data: %s', self.request.data)
+            logger.debug('Current instance state: %s', serializer.instance.__dict__)
             
             # Log branch information if it's being updated
             if 'branch' in self.request.data:
                 branch_id = self.request.data['branch']
                 try:
                     branch = Branch.objects.get(id=branch_id)
-                    logger.info(f"Branch being assigned: {branch.id}, {branch.name}, Company: {branch.company.id}")
+                    logger.info('Branch being assigned: %s, %s, Company: %s', branch.id, branch.name, branch.company.id)
                     
                     # Verify branch belongs to company
                     if branch.company_id != serializer.instance.company_id:
@@ -188,42 +211,46 @@ class CompanyMembershipDetailView(generics.RetrieveUpdateDestroyAPIView):
                             'branch': f'Branch {branch.name} does not belong to company {serializer.instance.company.name}'
                         })
                 except Branch.DoesNotExist:
-                    logger.error(f"Branch with ID {branch_id} not found")
+                    logger.error('Branch with ID %s not found', branch_id)
                     raise DRFValidationError({'branch': f'Branch with ID {branch_id} not found'})
                 except Exception as e:
-                    logger.error(f"Error fetching branch info: {str(e)}")
+                    logger.error('Error fetching branch info: %s', e)
                     raise
 
             # Save the instance
             instance = serializer.save()
-            logger.info(f"Successfully updated membership {instance.id}")
+            logger.info('Successfully updated membership %s', instance.id)
             return instance
             
         except DRFValidationError:
             raise
         except Exception as e:
-            logger.error(f"Error updating membership: {str(e)}")
-            logger.error(f"Error type: {type(e)}")
-            logger.error(f"Error args: {e.args}")
+            logger.error('Error updating membership: %s', e)
+            logger.error('Error type: %s', type(e))
+            logger.error('Error args: %s', e.args)
             raise
 
     def update(self, request, *args, **kwargs):
         try:
-            logger.info(f"Received PATCH request for membership {kwargs.get('membership_id')}")
-            logger.info(f"Request data: {request.data}")
+            logger.info('Received PATCH request for membership %s', kwargs.get('membership_id'))
+            logger.debug('Request data: %s', request.data)
             
             response = super().update(request, *args, **kwargs)
             logger.info("Update completed successfully")
             return response
             
         except Exception as e:
-            logger.error(f"Error in update: {str(e)}")
-            logger.error(f"Error type: {type(e)}")
-            logger.error(f"Error args: {e.args}")
+            logger.error('Error in update: %s', e)
+            logger.error('Error type: %s', type(e))
+            logger.error('Error args: %s', e.args)
             raise
 
 class ItemScanCodeView(APIView):
-    """Endpoint for scanning items by barcode or QR code."""
+    """
+    Endpoint for scanning items by barcode or QR code. Codes are resolved
+    and authorized by ``api.scan_index``; with ``?slim=1`` only the item and
+    branch ids are returned, without a query.
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
@@ -239,6 +266,20 @@ class ItemScanCodeView(APIView):
         user = request.user
         
         try:
+            if scan_type in ('barcode', 'qr') and isinstance(scan_value, str):
+                code = parse_code(scan_type, scan_value)
+                found = scan_index.resolve(user.pk, code) if code is not None else None
+                if found is not scan_index.UNINDEXED:
+                    if found is not None and request.query_params.get('slim') in ('1', 'true'):
+                        return Response({'id': found[0], 'branch': found[1]})
+                    item = Item.objects.filter(pk=found[0]).first() if found else None
+                    if item is None:
+                        return Response(
+                            {'error': f'Item not found with this {scan_type}'},
+                            status=status.HTTP_404_NOT_FOUND
+                        )
+                    return Response(ItemSerializer(item).data)
+
             if scan_type == 'barcode':
                 # Search by barcode number
                 items = Item.objects.filter(barcode_number=scan_value)
@@ -282,13 +323,14 @@ class ItemScanCodeView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class ItemListView(generics.ListCreateAPIView):
+class ItemListView(ConditionalListMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """Endpoint for listing or creating items within a user's accessible branches."""
     serializer_class = ItemSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ItemSearchFilter]
     search_fields = ['name', 'item_id', 'description']
     filterset_fields = ['barcode_number', 'branch__company']
+    validator_fields = ('updated_at', 'branch__updated_at', 'category__updated_at')
 
     def get_queryset(self):
         user = self.request.user
@@ -296,10 +338,10 @@ class ItemListView(generics.ListCreateAPIView):
         if user.company_memberships.filter(role__in=['SUPERVISOR', 'OWNER']).exists():
             company_ids = user.company_memberships.filter(role__in=['SUPERVISOR', 'OWNER']).values_list('company_id', flat=True)
             branch_ids = Branch.objects.filter(company_id__in=company_ids).values_list('id', flat=True)
-            return Item.objects.filter(branch_id__in=branch_ids)
+            return self.select_related_for_fieldset(Item.objects.filter(branch_id__in=branch_ids))
         # Otherwise, filter by accessible branches
         accessible_branches = user.company_memberships.values_list('branch_id', flat=True)
-        return Item.objects.filter(branch_id__in=accessible_branches)
+        return self.select_related_for_fieldset(Item.objects.filter(branch_id__in=accessible_branches))
 
     def perform_create(self, serializer):
         branch_id = self.request.data.get('branch')
@@ -338,16 +380,48 @@ class ItemListView(generics.ListCreateAPIView):
             notes='Item created'
         )
 
-class AllItemsListView(generics.ListAPIView):
+class AllItemsListView(SparseFieldsetMixin, generics.ListAPIView):
     """
     System-wide endpoint for DEVELOPER to list and filter all items.
     """
     serializer_class = ItemSerializer
     permission_classes = [permissions.IsAuthenticated, IsBossDeveloper]
-    queryset = Item.objects.select_related('branch', 'branch__company').all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ItemSearchFilter]
     filterset_fields = ['branch', 'branch__company'] # /api/all-items/?branch=1 or /?branch__company=1
-    search_fields = ['name', 'item_id', 'description', 'category']
+    search_fields = ['name', 'item_id', 'description', 'category__name']
+
+    def get_queryset(self):
+        return self.select_related_for_fieldset(Item.objects.all())
+
+class ItemExportView(StreamingExportMixin, ItemListView):
+    """CSV/XLSX download of ``ItemListView`` with the same filters and search."""
+    export_columns = ITEM_COLUMNS
+    export_name = 'items'
+
+class ItemForecastListView(generics.ListAPIView):
+    """
+    Consumption forecasts (``manage.py forecast_items``) for the caller's
+    items, soonest stockout first. Filters: ``?company=``, ``?branch=`` and
+    ``?needs_reorder=1`` (current stock at or below the reorder point).
+    """
+    serializer_class = ItemForecastSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = ItemForecast.objects.select_related('item__branch').filter(
+            item__branch__in=analytics.accessible_branches(self.request.user),
+        )
+        try:
+            if params.get('company'):
+                queryset = queryset.filter(item__branch__company_id=params['company'])
+            if params.get('branch'):
+                queryset = queryset.filter(item__branch_id=params['branch'])
+        except DjangoValidationError:
+            raise DRFValidationError({'detail': 'Invalid company or branch id.'})
+        if params.get('needs_reorder') in ('1', 'true'):
+            queryset = queryset.filter(item__stock_quantity__lte=F('reorder_point'))
+        return queryset.order_by(F('days_until_stockout').asc(nulls_last=True), 'item__name')
 
 class ItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ItemSerializer
@@ -391,7 +465,7 @@ class ItemDetailView(generics.RetrieveUpdateDestroyAPIView):
         )
         return super().destroy(request, *args, **kwargs)
 
-class TransactionListView(generics.ListCreateAPIView):
+class TransactionListView(SparseFieldsetMixin, generics.ListCreateAPIView):
     """Endpoint for listing or creating transactions."""
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -401,7 +475,6 @@ class TransactionListView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        print(f"[DEBUG] TransactionListView.get_queryset - User: {user.username}, Level: {user.global_user_level}")
         
         # Supervisors and Owners see all transactions in their companies
         supervisor_companies = CompanyMembership.objects.filter(
@@ -413,38 +486,31 @@ class TransactionListView(generics.ListCreateAPIView):
                 company_id__in=supervisor_companies
             ).values_list('id', flat=True)
             queryset = Transaction.objects.filter(branch_id__in=company_branches)
-            print(f"[DEBUG] Supervisor/Owner view - Found {queryset.count()} transactions")
+            logger.debug('Listing company-wide transactions for %s', user.pk, extra={'user': str(user.pk), 'scope': 'company'})
         else:
             # Otherwise, filter by accessible branches
             accessible_branches = CompanyMembership.objects.filter(user=user).values_list('branch_id', flat=True)
             queryset = Transaction.objects.filter(branch_id__in=accessible_branches)
-            print(f"[DEBUG] Regular user view - Found {queryset.count()} transactions")
+            logger.debug('Listing branch transactions for %s', user.pk, extra={'user': str(user.pk), 'scope': 'branch'})
         
-        # Add select_related to optimize queries
-        return queryset.select_related('user', 'item', 'item__category', 'branch')
+        # Join only the relations the requested fields read
+        return self.select_related_for_fieldset(queryset)
     
     def perform_create(self, serializer):
-        print("[DEBUG] TransactionListView.perform_create called")
         # Get the item and branch from the request data
         item_id = self.request.data.get('item')
         branch_id = self.request.data.get('branch')
         user = self.request.user
         
-        print(f"[DEBUG] Received item_id: {item_id}")
-        print(f"[DEBUG] Received branch_id: {branch_id}")
-        
         # Validate that the item exists and user has access to it
         try:
             item = Item.objects.get(id=item_id)
-            print(f"[DEBUG] Found item: {item.name} (stock: {item.stock_quantity})")
             
             # Check if user has access to the item's branch
             # For supervisors/owners, check if they supervise the company that owns the branch
             if user.company_memberships.filter(role__in=['SUPERVISOR', 'OWNER']).exists():
                 user_companies = user.company_memberships.filter(role__in=['SUPERVISOR', 'OWNER']).values_list('company_id', flat=True)
-                if item.branch.company_id in user_companies:
-                    print(f"[DEBUG] User is supervisor/owner of company {item.branch.company_id}")
-                else:
+                if item.branch.company_id not in user_companies:
                     raise Item.DoesNotExist("Item not accessible")
             else:
                 # For regular users, check direct branch membership
@@ -452,21 +518,18 @@ class TransactionListView(generics.ListCreateAPIView):
                 if item.branch_id not in user_branches:
                     raise Item.DoesNotExist("Item not accessible")
         except Item.DoesNotExist:
-            print("[DEBUG] Item not found or not accessible")
+            logger.debug('Transaction rejected: item %s not found or not accessible to %s', item_id, user.pk)
             raise serializers.ValidationError("Item not found or not accessible")
         
         # Validate that the branch exists and user has access to it
         try:
             branch = Branch.objects.get(id=branch_id)
-            print(f"[DEBUG] Found branch: {branch.name}")
             
             # Check if user has access to the branch
             # For supervisors/owners, check if they supervise the company that owns the branch
             if user.company_memberships.filter(role__in=['SUPERVISOR', 'OWNER']).exists():
                 user_companies = user.company_memberships.filter(role__in=['SUPERVISOR', 'OWNER']).values_list('company_id', flat=True)
-                if branch.company_id in user_companies:
-                    print(f"[DEBUG] User is supervisor/owner of company {branch.company_id}")
-                else:
+                if branch.company_id not in user_companies:
                     raise Branch.DoesNotExist("Branch not accessible")
             else:
                 # For regular users, check direct branch membership
@@ -474,14 +537,52 @@ class TransactionListView(generics.ListCreateAPIView):
                 if branch.id not in user_branches:
                     raise Branch.DoesNotExist("Branch not accessible")
         except Branch.DoesNotExist:
-            print("[DEBUG] Branch not found or not accessible")
+            logger.debug('Transaction rejected: branch %s not found or not accessible to %s', branch_id, user.pk)
             raise serializers.ValidationError("Branch not found or not accessible")
         
-        print("[DEBUG] About to save transaction...")
         # Save the transaction with the validated item and branch
         transaction = serializer.save(user=self.request.user, item=item, branch=branch)
-        print(f"[DEBUG] Transaction saved with ID: {transaction.id}")
-        print(f"[DEBUG] Transaction type: {transaction.transaction_type}")
+        logger.info('Transaction %s (%s) created by %s', transaction.id, transaction.transaction_type, user.pk,
+                    extra={'transaction': str(transaction.id), 'item': str(item.pk), 'user': str(user.pk)})
+
+class TransactionExportView(StreamingExportMixin, TransactionListView):
+    """CSV/XLSX download of ``TransactionListView`` with the same filters and search."""
+    export_columns = TRANSACTION_COLUMNS
+    export_name = 'transactions'
+
+class HoldingListView(generics.ListAPIView):
+    """
+    Who currently holds what in the caller's branches, oldest withdrawal
+    first. Filters: ``?user=``, ``?branch=``, ``?item=``.
+    """
+    serializer_class = HoldingSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HoldingCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['user', 'branch', 'item']
+
+    def get_queryset(self):
+        return Holding.objects.select_related('user', 'item', 'branch').filter(
+            branch__in=analytics.accessible_branches(self.request.user),
+        ).order_by('oldest_withdrawn_at', 'id')
+
+class OverdueHoldingListView(HoldingListView):
+    """Holdings past their due date in the caller's branches, most overdue first."""
+    pagination_class = OverdueCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().filter(due_at__lt=timezone.now()).order_by('due_at', 'id')
+
+class MyHoldingsView(generics.ListAPIView):
+    """Items the caller has withdrawn and not returned yet."""
+    serializer_class = HoldingSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HoldingCursorPagination
+
+    def get_queryset(self):
+        return Holding.objects.select_related('user', 'item', 'branch').filter(
+            user=self.request.user,
+        ).order_by('oldest_withdrawn_at', 'id')
 
 class CreateUserWithMembershipsSerializer(serializers.Serializer):
     username = serializers.CharField()
@@ -636,7 +737,7 @@ class QRLoginView(APIView):
 
 # --- Category Management Views ---
 
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(CachedResponseMixin, ConditionalListMixin, generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
 
@@ -686,7 +787,7 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Category.objects.all()
 
-class UserBranchesListView(generics.ListAPIView):
+class UserBranchesListView(CachedResponseMixin, ConditionalListMixin, generics.ListAPIView):
     """
     Endpoint for getting all branches that the current user has access to.
     For supervisors/owners, this returns all branches in their companies.
@@ -694,6 +795,9 @@ class UserBranchesListView(generics.ListAPIView):
     """
     serializer_class = BranchSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Membership changes touch Branch.updated_at (see signals), covering
+    # manager_name. Joining items makes the row count follow item deletions.
+    validator_fields = ('updated_at', 'company__updated_at', 'items__updated_at')
 
     def get_queryset(self):
         user = self.request.user
@@ -703,11 +807,11 @@ class UserBranchesListView(generics.ListAPIView):
             supervisor_companies = user.company_memberships.filter(
                 role__in=['SUPERVISOR', 'OWNER']
             ).values_list('company_id', flat=True)
-            return Branch.objects.filter(company_id__in=supervisor_companies)
+            return Branch.objects.with_stats().filter(company_id__in=supervisor_companies)
         
         # Regular users see only branches they are assigned to
         user_branches = user.company_memberships.values_list('branch_id', flat=True)
-        return Branch.objects.filter(id__in=user_branches)
+        return Branch.objects.with_stats().filter(id__in=user_branches)
 
 class ItemUpdateOriginalStockView(APIView):
     """Endpoint for updating the original stock quantity of an item."""
@@ -844,7 +948,7 @@ class TransactionReceiptView(RetrieveAPIView):
         """Return a detailed receipt for the transaction."""
         return self.retrieve(request, *args, **kwargs)
 
-class BranchStatisticsView(APIView):
+class BranchStatisticsView(CachedResponseMixin, APIView):
     """Endpoint for getting branch transaction statistics with time filtering."""
     permission_classes = [permissions.IsAuthenticated]
 
@@ -882,62 +986,191 @@ class BranchStatisticsView(APIView):
                 user_companies = Company.objects.filter(members__user=user)
                 branches = Branch.objects.filter(company__in=user_companies)
 
-        # Get transaction statistics for each branch
-        branch_stats = []
-        for branch in branches:
-            # Base transaction queryset for this branch
-            transactions = Transaction.objects.filter(branch=branch)
-            
-            # Apply date filter if specified
-            if start_date and end_date:
-                transactions = transactions.filter(timestamp__range=[start_date, end_date])
-            
-            # Calculate statistics
-            total_transactions = transactions.count()
-            withdrawals = transactions.filter(transaction_type='WITHDRAW').count()
-            returns = transactions.filter(transaction_type='RETURN').count()
-            
-            # Get unique users who made transactions
-            unique_users = transactions.values('user').distinct().count()
-            
-            # Get most active items (top 5)
-            top_items = transactions.values('item__name').annotate(
-                count=Count('id')
-            ).order_by('-count')[:5]
-            
-            branch_stats.append({
-                'branch_id': branch.id,
-                'branch_name': branch.name,
-                'company_name': branch.company.name,
-                'total_transactions': total_transactions,
-                'withdrawals': withdrawals,
-                'returns': returns,
-                'unique_users': unique_users,
-                'top_items': [
-                    {'item_name': item['item__name'], 'transaction_count': item['count']}
-                    for item in top_items
-                ],
-                'period': period,
-                'date_range': {
-                    'start': start_date.isoformat() if start_date else None,
-                    'end': end_date.isoformat() if end_date else None
-                }
-            })
-        
-        # Sort by total transactions (descending)
-        branch_stats.sort(key=lambda x: x['total_transactions'], reverse=True)
+        branch_stats, summary = branch_statistics(branches, start_date, end_date)
+        date_range = {
+            'start': start_date.isoformat() if start_date else None,
+            'end': end_date.isoformat() if end_date else None
+        }
+        for stat in branch_stats:
+            stat['period'] = period
+            stat['date_range'] = date_range
         
         return Response({
             'statistics': branch_stats,
             'period': period,
             'total_branches': len(branch_stats),
-            'summary': {
-                'total_transactions': sum(stat['total_transactions'] for stat in branch_stats),
-                'total_withdrawals': sum(stat['withdrawals'] for stat in branch_stats),
-                'total_returns': sum(stat['returns'] for stat in branch_stats),
-                'total_unique_users': len(set(
-                    user_id for stat in branch_stats 
-                    for user_id in range(stat['unique_users'])
-                ))
-            }
+            'summary': summary
         })
+
+
+class DashboardView(CachedResponseMixin, APIView):
+    """
+    Everything the company dashboard shows, in one response: branch
+    summaries, low-stock items, recent transactions and period totals for
+    ``?company=``, limited to the branches the caller can see.
+    ``?transactions=`` (default 10, max 50) and ``?low_stock=`` (default 20,
+    max 100) size the lists.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _limit(self, name, default, maximum):
+        try:
+            return max(0, min(int(self.request.query_params.get(name, default)), maximum))
+        except ValueError:
+            raise DRFValidationError({name: 'Must be an integer.'})
+
+    def get(self, request):
+        company_id = request.query_params.get('company')
+        if not company_id:
+            raise DRFValidationError({'company': 'This parameter is required.'})
+        companies = Company.objects.all()
+        if request.user.global_user_level != 'DEVELOPER':
+            companies = companies.filter(members__user=request.user)
+        try:
+            company = companies.filter(pk=company_id).values('id', 'name', 'time_zone').first()
+        except DjangoValidationError:
+            raise DRFValidationError({'company': 'Invalid id.'})
+        if company is None:
+            return Response({'detail': 'Company not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        branches = analytics.accessible_branches(request.user).filter(company_id=company_id)
+        return Response(dashboard.company_dashboard(
+            company, branches,
+            transactions=self._limit('transactions', 10, 50),
+            low_stock=self._limit('low_stock', 20, 100),
+        ))
+
+# --- Analytics ---
+
+class TransactionTimeSeriesView(APIView):
+    """
+    Transaction counts and quantities per time bucket, computed in the database.
+
+    Query parameters: ``start``/``end`` (ISO date or datetime, end exclusive;
+    defaults to the last 30 days), ``bucket`` (hour, day, week, month),
+    ``tz`` (defaults to the company's time zone when ``company`` is given),
+    ``group_by`` (branch, item, category, user, transaction_type) and the
+    ``company``/``branch`` filters. Ask for ``application/x-ndjson`` (or
+    ``?format=ndjson``) to stream one row per line instead of a JSON document.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+    def _parse_bound(self, name, tz):
+        raw = self.request.query_params.get(name)
+        if not raw:
+            return None
+        try:
+            value = parse_datetime(raw)
+            if value is None:
+                day = parse_date(raw)
+                value = datetime.combine(day, datetime.min.time()) if day else None
+        except ValueError:
+            value = None
+        if value is None:
+            raise DRFValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+        return value if timezone.is_aware(value) else timezone.make_aware(value, tz)
+
+    def _filtered_branches(self, company_id, branch_id):
+        branches = analytics.accessible_branches(self.request.user)
+        try:
+            if company_id:
+                branches = branches.filter(company_id=company_id)
+            if branch_id:
+                branches = branches.filter(id=branch_id)
+        except DjangoValidationError:
+            raise DRFValidationError({'company' if company_id else 'branch': 'Invalid id.'})
+        return branches
+
+    def get(self, request):
+        params = request.query_params
+        company_id, branch_id = params.get('company'), params.get('branch')
+        bucket = params.get('bucket', 'day')
+        group_by = params.get('group_by') or None
+        if bucket not in analytics.BUCKETS:
+            raise DRFValidationError({'bucket': f'Must be one of: {", ".join(analytics.BUCKETS)}.'})
+        if group_by is not None and group_by not in analytics.DIMENSIONS:
+            raise DRFValidationError({'group_by': f'Must be one of: {", ".join(analytics.DIMENSIONS)}.'})
+
+        branches = self._filtered_branches(company_id, branch_id)
+        tz_name = params.get('tz')
+        if not tz_name and company_id:
+            tz_name = Company.objects.filter(pk=company_id).values_list('time_zone', flat=True).first()
+        try:
+            tz = analytics.parse_time_zone(tz_name or settings.TIME_ZONE)
+        except ValueError as exc:
+            raise DRFValidationError({'tz': str(exc)})
+
+        end = self._parse_bound('end', tz) or timezone.now()
+        start = self._parse_bound('start', tz) or end - timedelta(days=30)
+        if start >= end:
+            raise DRFValidationError({'start': 'Must be before end.'})
+        if analytics.bucket_count(start, end, bucket) > analytics.MAX_BUCKETS:
+            raise DRFValidationError({'bucket': f'Range spans more than {analytics.MAX_BUCKETS} buckets; use a larger bucket.'})
+
+        rows = analytics.timeseries(branches, start, end, bucket=bucket, tz=tz, group_by=group_by)
+
+        def series(rows):
+            for row in rows:
+                value = row['bucket_start']
+                if not isinstance(value, datetime):
+                    value = timezone.make_aware(datetime.combine(value, datetime.min.time()), tz)
+                row['bucket_start'] = value.astimezone(tz).isoformat()
+                yield row
+
+        if request.accepted_renderer.format == 'ndjson':
+            encoder = JSONEncoder()
+            lines = (encoder.encode(row) + '\n' for row in series(rows.iterator(chunk_size=2000)))
+            return StreamingHttpResponse(lines, content_type=NDJSONRenderer.media_type)
+
+        return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'bucket': bucket,
+            'tz': tz.key,
+            'group_by': group_by,
+            'series': list(series(rows)),
+        })
+
+
+# --- Diagnostics ---
+
+class SQLTraceConfigSerializer(serializers.Serializer):
+    enabled = serializers.BooleanField(required=False)
+    sample_rate = serializers.FloatField(required=False, min_value=0, max_value=1)
+    slow_ms = serializers.FloatField(required=False, min_value=0)
+    explain = serializers.BooleanField(required=False)
+
+
+class SQLTraceView(APIView):
+    """
+    Staff-only access to the SQL trace ring buffer (shared by every worker
+    through the default cache). GET returns captures (``?since=<id>``,
+    ``?slow=1``), PATCH changes the tracing settings at runtime and DELETE
+    clears the buffer.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsBossDeveloper | permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            raise DRFValidationError({'since': 'Must be an integer.'})
+        slow_only = request.query_params.get('slow') in ('1', 'true')
+        tracing.config.refresh(force=True)
+        return Response({
+            'config': tracing.config.as_dict(),
+            'buffer_size': tracing.buffer.size,
+            'entries': tracing.buffer.entries(since=since, slow_only=slow_only),
+        })
+
+    def patch(self, request):
+        serializer = SQLTraceConfigSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tracing.config.update(**serializer.validated_data)
+        logger.info('SQL tracing set to %s by %s', tracing.config.as_dict(), request.user.pk)
+        return Response({'config': tracing.config.as_dict()})
+
+    def delete(self, request):
+        tracing.buffer.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
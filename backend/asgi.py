@@ -2,6 +2,10 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, except the Server-Sent Events feed
+(``/api/transactions/stream/``), which a Channels consumer serves so an open
+stream does not hold one of Django's per-request threads. WebSockets
+(``/ws/live/``) go to the Channels consumers in ``api.routing``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +17,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that loads models.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+from django.urls import re_path  # noqa: E402
+
+from api.consumers import JWTAuthMiddleware  # noqa: E402
+from api.routing import http_urlpatterns, websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': URLRouter(http_urlpatterns + [re_path(r'', django_asgi_app)]),
+    'websocket': AllowedHostsOriginValidator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns))),
+})
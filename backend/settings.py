@@ -48,14 +48,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # trigram/full-text lookups used by api.search
     'corsheaders',
     'rest_framework',  # if you're using DRF
     'rest_framework_simplejwt.token_blacklist',  # Required for token rotation
+    'channels',  # WebSocket live updates (api.consumers)
     'api',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',  # Per-view latency/query metrics; keep first
+    'api.tracing.SQLTraceMiddleware',  # Sampled/slow SQL capture, off unless enabled
+    'api.compression.CompressionMiddleware',  # brotli/gzip for large JSON responses
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,6 +95,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -179,8 +185,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',  # orjson when installed
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Response compression (api.compression)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -203,13 +217,117 @@ CORS_ALLOWED_ORIGINS = [
 ]
 CORS_ALLOW_CREDENTIALS = True
 
+# Request metrics (api.metrics). METRICS_DIR must be shared by all gunicorn
+# workers of one instance; without it each process reports only its own totals.
+# Snapshots of exited workers are dropped, as are ones not rewritten for
+# METRICS_STALE_AFTER seconds (0 disables; keep it above the longest idle spell).
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_STALE_AFTER = float(os.getenv('METRICS_STALE_AFTER', '3600'))
+
+# SQL tracing (api.tracing). These are start-up defaults; staff can change them
+# at runtime through /api/sql-trace/. The runtime config and the captures live
+# in the default cache, so they reach every worker only with REDIS_URL set.
+SQL_TRACE_ENABLED = os.getenv('SQL_TRACE_ENABLED', 'False') == 'True'
+SQL_TRACE_SAMPLE_RATE = float(os.getenv('SQL_TRACE_SAMPLE_RATE', '0'))
+SQL_TRACE_SLOW_MS = float(os.getenv('SQL_TRACE_SLOW_MS', '100'))
+SQL_TRACE_EXPLAIN = os.getenv('SQL_TRACE_EXPLAIN', 'False') == 'True'
+SQL_TRACE_BUFFER_SIZE = int(os.getenv('SQL_TRACE_BUFFER_SIZE', '500'))
+SQL_TRACE_CONFIG_REFRESH = float(os.getenv('SQL_TRACE_CONFIG_REFRESH', '1'))
+
+# Cache. Set REDIS_URL in production: the response cache (api.response_cache)
+# invalidates through the cache, so every worker must share one backend.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '60'))
+
+# Daily transaction rollups (api.models.TransactionDailyRollup). When False,
+# inserts skip the rollup and `manage.py rollup_transactions --days N` must run
+# periodically to catch up.
+TRANSACTION_ROLLUP_INLINE = os.getenv('TRANSACTION_ROLLUP_INLINE', 'True') == 'True'
+
+# Low-stock alerts (api.alerts). Status changes are queued on write and sent
+# to each company's alert_webhook_url by `manage.py dispatch_stock_alerts`.
+# An item does not alert for the same status twice within the cooldown.
+STOCK_ALERTS_ENABLED = os.getenv('STOCK_ALERTS_ENABLED', 'True') == 'True'
+STOCK_ALERT_COOLDOWN = int(os.getenv('STOCK_ALERT_COOLDOWN', '900'))
+STOCK_ALERT_RETRY_DELAY = int(os.getenv('STOCK_ALERT_RETRY_DELAY', '30'))  # doubles per failed attempt
+STOCK_ALERT_RETRY_MAX_DELAY = int(os.getenv('STOCK_ALERT_RETRY_MAX_DELAY', '3600'))
+
+# Transactional outbox (api.outbox). Item, transaction and membership changes
+# are logged in their own database transaction and delivered to the sinks by
+# `manage.py dispatch_outbox --loop`. The "live" sink publishes live updates
+# from that process, so it needs the Redis channel layer; without it (and
+# with OUTBOX_ENABLED False) live updates are sent by the writing request.
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'True' if os.getenv('REDIS_URL') else 'False') == 'True'
+OUTBOX_SINKS = {'cache': 'api.outbox.CacheInvalidationSink'}
+if os.getenv('REDIS_URL'):
+    OUTBOX_SINKS['live'] = 'api.outbox.ChannelLayerSink'
+OUTBOX_WEBHOOK_URL = os.getenv('OUTBOX_WEBHOOK_URL', '')
+OUTBOX_WEBHOOK_SECRET = os.getenv('OUTBOX_WEBHOOK_SECRET', '')
+if OUTBOX_WEBHOOK_URL:
+    OUTBOX_SINKS['webhook'] = 'api.outbox.WebhookSink'
+OUTBOX_COMMIT_GRACE = int(os.getenv('OUTBOX_COMMIT_GRACE', '10'))
+OUTBOX_RETENTION = int(os.getenv('OUTBOX_RETENTION', '86400'))
+
+# Live updates over WebSockets (api.realtime, /ws/live/). Set REDIS_URL when
+# running more than one ASGI process: the in-memory layer only reaches
+# clients connected to the process that made the change.
+if os.getenv('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('REDIS_URL')]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
+# Server-Sent Events transaction feed (api.feeds, /api/transactions/stream/).
+# Serve it with an ASGI server; under WSGI it degrades to long polling.
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', '2'))
+SSE_FALLBACK_INTERVAL = float(os.getenv('SSE_FALLBACK_INTERVAL', '30'))  # with a shared channel layer
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+SSE_COMMIT_SLACK = float(os.getenv('SSE_COMMIT_SLACK', '5'))
+
+# In-process scan code index (api.scan_index) behind the scan endpoints. Its
+# versions live in the default cache, which must be shared between workers, so
+# it is off unless REDIS_URL is set. Indexes and user scopes older than
+# SCAN_INDEX_MAX_AGE seconds are reloaded even when no change was signalled.
+SCAN_INDEX_ENABLED = os.getenv('SCAN_INDEX_ENABLED', 'True' if os.getenv('REDIS_URL') else 'False') == 'True'
+SCAN_INDEX_MAX_COMPANIES = int(os.getenv('SCAN_INDEX_MAX_COMPANIES', '1000'))
+SCAN_INDEX_MAX_AGE = int(os.getenv('SCAN_INDEX_MAX_AGE', '300'))
+
 # Logging configuration
+# Loggers write to a queue; a background listener thread formats records and
+# writes them to the console and a size-rotated log file. Levels are set per
+# logger from the environment, e.g. LOG_LEVEL_DB=DEBUG to log every query.
+def _log_level(name, default):
+    return os.getenv(f'LOG_LEVEL_{name}', default).upper()
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
+            '()': 'api.log_handlers.StructuredFormatter',
+            'format': '{levelname} {asctime} {name} {process:d} {thread:d} {message}',
             'style': '{',
         },
         'simple': {
@@ -224,36 +342,38 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'debug.log',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.getenv('LOG_FILE', BASE_DIR / 'debug.log'),
+            'maxBytes': int(os.getenv('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024)),
+            'backupCount': int(os.getenv('LOG_FILE_BACKUP_COUNT', 5)),
             'formatter': 'verbose',
+            'delay': True,
+        },
+        'queue': {
+            '()': 'api.log_handlers.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000)),
         },
     },
     'loggers': {
         '': {  # Root logger
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': _log_level('ROOT', 'INFO'),
         },
         'api': {  # App logger
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': _log_level('API', 'DEBUG' if DEBUG else 'INFO'),
             'propagate': False,
         },
         'django.db.backends': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
+            'level': _log_level('DB', 'WARNING'),
         },
         'django.request': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
+            'level': _log_level('REQUEST', 'WARNING'),
         },
     },
-}
\ No newline at end of file
+}